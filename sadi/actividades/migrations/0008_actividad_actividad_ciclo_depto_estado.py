@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actividades", "0007_remove_evidencia_ciclo_and_more"),
+        ("departamentos", "0002_initial"),
+        ("metas", "0008_resumencumplimiento"),
+        ("programas", "0005_alter_ciclo_estado_alter_ciclo_nombre_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="actividad",
+            index=models.Index(
+                fields=["ciclo", "departamento", "estado"],
+                name="actividad_ciclo_depto_estado",
+            ),
+        ),
+    ]
@@ -42,6 +42,16 @@ class Actividad(models.Model):
 
     history = HistoricalRecords()
 
+    class Meta:
+        indexes = [
+            # Actividades del ciclo, por departamento; los conteos por estado
+            # se resuelven con el índice
+            models.Index(
+                fields=["ciclo", "departamento", "estado"],
+                name="actividad_ciclo_depto_estado",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.descripcion} ({self.get_estado_display()})"
 
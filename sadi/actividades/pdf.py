@@ -0,0 +1,364 @@
+from html import escape
+from django.utils import formats, timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import (
+    Paragraph,
+    SimpleDocTemplate,
+    Spacer,
+    Table,
+    TableStyle,
+)
+
+# Mismos colores que la plantilla actividades/programa_trabajo_pdf.html
+AZUL_OSCURO = colors.HexColor("#2c3e50")
+GRIS_DEPARTAMENTO = colors.HexColor("#34495e")
+AZUL_META = colors.HexColor("#3498db")
+GRIS_BORDE = colors.HexColor("#bdc3c7")
+GRIS_LINEA = colors.HexColor("#ecf0f1")
+GRIS_TEXTO = colors.HexColor("#7f8c8d")
+
+# Color de fondo y de texto de la etiqueta de cada estado
+COLORES_ESTADO = {
+    "Cumplida": (colors.HexColor("#27ae60"), colors.white),
+    "En Proceso": (colors.HexColor("#f39c12"), AZUL_OSCURO),
+    "No Cumplida": (colors.HexColor("#e74c3c"), colors.white),
+}
+COLOR_ESTADO_OTRO = (colors.HexColor("#95a5a6"), colors.white)
+
+ESTILOS = {
+    "titulo": ParagraphStyle(
+        "titulo",
+        fontName="Helvetica-Bold",
+        fontSize=16,
+        leading=20,
+        alignment=TA_CENTER,
+        textColor=AZUL_OSCURO,
+        spaceAfter=10,
+    ),
+    "info": ParagraphStyle("info", fontName="Helvetica", fontSize=9, leading=12),
+    "info_derecha": ParagraphStyle(
+        "info_derecha",
+        fontName="Helvetica",
+        fontSize=9,
+        leading=12,
+        alignment=TA_RIGHT,
+    ),
+    "departamento": ParagraphStyle(
+        "departamento",
+        fontName="Helvetica-Bold",
+        fontSize=11,
+        leading=14,
+        textColor=colors.white,
+    ),
+    "meta": ParagraphStyle(
+        "meta",
+        fontName="Helvetica-Bold",
+        fontSize=10.5,
+        leading=13,
+        textColor=colors.white,
+    ),
+    "progreso": ParagraphStyle(
+        "progreso",
+        fontName="Helvetica-Bold",
+        fontSize=9,
+        leading=11,
+        alignment=TA_RIGHT,
+        textColor=colors.white,
+    ),
+    "resumen": ParagraphStyle(
+        "resumen", fontName="Helvetica-Bold", fontSize=9, leading=12
+    ),
+    "descripcion": ParagraphStyle(
+        "descripcion",
+        fontName="Helvetica-Bold",
+        fontSize=9,
+        leading=11,
+        textColor=AZUL_OSCURO,
+    ),
+    "responsable": ParagraphStyle(
+        "responsable",
+        fontName="Helvetica-Oblique",
+        fontSize=9,
+        leading=11,
+        textColor=GRIS_TEXTO,
+    ),
+    "estado": ParagraphStyle(
+        "estado",
+        fontName="Helvetica-Bold",
+        fontSize=8,
+        leading=10,
+        alignment=TA_CENTER,
+    ),
+    "fechas": ParagraphStyle("fechas", fontName="Helvetica", fontSize=8.5, leading=11),
+    "vacio": ParagraphStyle(
+        "vacio",
+        fontName="Helvetica-Oblique",
+        fontSize=9,
+        leading=12,
+        alignment=TA_CENTER,
+        textColor=GRIS_TEXTO,
+    ),
+    "pie": ParagraphStyle(
+        "pie",
+        fontName="Helvetica",
+        fontSize=8.5,
+        leading=11,
+        alignment=TA_CENTER,
+        textColor=GRIS_TEXTO,
+    ),
+}
+
+
+def texto(valor):
+    """Escapa un valor para usarlo dentro de un Paragraph."""
+    return escape(str(valor))
+
+
+def etiqueta(nombre, valor):
+    return f'<font color="#2c3e50"><b>{nombre}:</b></font> {texto(valor)}'
+
+
+def bloque_vacio(mensaje, ancho):
+    tabla = Table([[Paragraph(mensaje, ESTILOS["vacio"])]], colWidths=[ancho])
+    tabla.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, -1), GRIS_LINEA),
+                ("TOPPADDING", (0, 0), (-1, -1), 12),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
+            ]
+        )
+    )
+    return tabla
+
+
+def encabezado(context, generado, ancho):
+    """
+    Título y datos del reporte. El PDF compartido por ADMIN y APOYO no
+    muestra al usuario, solo el departamento del reporte.
+    """
+    izquierda = Paragraph(
+        etiqueta("Tipo de Reporte", "Programa de Trabajo")
+        + "<br/>"
+        + etiqueta("Fecha de Generación", generado),
+        ESTILOS["info"],
+    )
+    if context.get("compartido"):
+        datos = etiqueta("Departamento", context["departamento_reporte"])
+    else:
+        user = context["user"]
+        departamento = user.departamento.nombre if user.departamento else "N/A"
+        datos = (
+            etiqueta("Usuario", user.username)
+            + "<br/>"
+            + etiqueta("Departamento", departamento)
+            + "<br/>"
+            + etiqueta("Rol", user.role)
+        )
+    derecha = Paragraph(datos, ESTILOS["info_derecha"])
+    info = Table([[izquierda, derecha]], colWidths=[ancho / 2, ancho / 2])
+    info.setStyle(
+        TableStyle(
+            [
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("LEFTPADDING", (0, 0), (-1, -1), 0),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
+                ("LINEBELOW", (0, 0), (-1, -1), 2, AZUL_OSCURO),
+            ]
+        )
+    )
+    return [
+        Paragraph("INFORME DE PROGRAMA DE TRABAJO", ESTILOS["titulo"]),
+        info,
+        Spacer(1, 18),
+    ]
+
+
+def titulo_departamento(depto, ancho):
+    tabla = Table(
+        [[Paragraph(f"DEPARTAMENTO: {texto(depto.nombre)}", ESTILOS["departamento"])]],
+        colWidths=[ancho],
+    )
+    tabla.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, -1), GRIS_DEPARTAMENTO),
+                ("LEFTPADDING", (0, 0), (-1, -1), 12),
+                ("TOPPADDING", (0, 0), (-1, -1), 8),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+            ]
+        )
+    )
+    return tabla
+
+
+def fila_actividad(act, mostrar_responsable):
+    contenido = [Paragraph(texto(act.descripcion), ESTILOS["descripcion"])]
+    if mostrar_responsable and act.responsable:
+        contenido.append(
+            Paragraph(f"Responsable: {texto(act.responsable)}", ESTILOS["responsable"])
+        )
+
+    fondo, color_texto = COLORES_ESTADO.get(act.estado, COLOR_ESTADO_OTRO)
+    estado = Table(
+        [
+            [
+                Paragraph(
+                    f'<font color="{color_texto.hexval()}">'
+                    f"{texto(act.estado).upper()}</font>",
+                    ESTILOS["estado"],
+                )
+            ]
+        ]
+    )
+    estado.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, -1), fondo),
+                ("TOPPADDING", (0, 0), (-1, -1), 3),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 3),
+            ]
+        )
+    )
+
+    fechas = Paragraph(
+        f'<font color="#7f8c8d"><b>Inicio:</b></font> '
+        f"{texto(formats.date_format(act.fecha_inicio))}<br/>"
+        f'<font color="#7f8c8d"><b>Fin:</b></font> '
+        f"{texto(formats.date_format(act.fecha_fin))}",
+        ESTILOS["fechas"],
+    )
+    return [contenido, estado, fechas]
+
+
+def tarjeta_meta(meta, datos, ancho, mostrar_responsable, mostrar_resumen):
+    """Tarjeta de una meta: barra con el progreso y tabla de actividades."""
+    porcentaje = formats.localize(datos["porcentaje"])
+    cabecera = Table(
+        [
+            [
+                Paragraph(f"META: {texto(meta.nombre)}", ESTILOS["meta"]),
+                Paragraph(f"Progreso Total: {porcentaje}%", ESTILOS["progreso"]),
+            ]
+        ],
+        colWidths=[ancho * 0.7, ancho * 0.3],
+    )
+    cabecera.setStyle(
+        TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, -1), AZUL_META),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                ("LEFTPADDING", (0, 0), (-1, -1), 15),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 15),
+                ("TOPPADDING", (0, 0), (-1, -1), 10),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+            ]
+        )
+    )
+    elementos = [cabecera]
+
+    if mostrar_resumen:
+        elementos.append(
+            Paragraph(
+                f"Total de Actividades: {datos['total']}<br/>"
+                f"Actividades Completadas: {datos['completadas']} | "
+                f"{datos['completadas']}/{datos['total']} tareas completadas",
+                ESTILOS["resumen"],
+            )
+        )
+
+    if datos["actividades"]:
+        filas = [
+            fila_actividad(act, mostrar_responsable) for act in datos["actividades"]
+        ]
+        actividades = Table(
+            filas,
+            colWidths=[ancho * 0.6, ancho * 0.15, ancho * 0.25],
+        )
+        actividades.setStyle(
+            TableStyle(
+                [
+                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                    ("BOX", (0, 0), (-1, -1), 1, GRIS_BORDE),
+                    ("LINEBELOW", (0, 0), (-1, -1), 1, GRIS_LINEA),
+                    ("TOPPADDING", (0, 0), (-1, -1), 8),
+                    ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+                ]
+            )
+        )
+        elementos.append(actividades)
+    else:
+        elementos.append(
+            bloque_vacio("No hay actividades registradas para esta meta.", ancho)
+        )
+
+    # Sin anidar en otra tabla para que las metas con muchas actividades
+    # puedan partirse entre páginas
+    return elementos + [Spacer(1, 20)]
+
+
+def generar_programa_trabajo_reportlab(context, archivo):
+    """
+    Dibuja el Programa de Trabajo directamente con ReportLab a partir del
+    mismo contexto que la plantilla programa_trabajo_pdf.html, sin pasar por
+    la conversión HTML → PDF de xhtml2pdf.
+    """
+    doc = SimpleDocTemplate(
+        archivo,
+        pagesize=letter,
+        title="Informe de Programa de Trabajo",
+        leftMargin=2 * cm,
+        rightMargin=2 * cm,
+        topMargin=2 * cm,
+        bottomMargin=2 * cm,
+    )
+    ancho = doc.width
+    generado = timezone.localtime().strftime("%d/%m/%Y %H:%M")
+
+    elementos = encabezado(context, generado, ancho)
+
+    if context.get("actividades_por_depto"):
+        for depto, metas in context["actividades_por_depto"].items():
+            elementos.append(titulo_departamento(depto, ancho))
+            elementos.append(Spacer(1, 15))
+            if metas:
+                for meta, datos in metas.items():
+                    elementos.extend(tarjeta_meta(meta, datos, ancho, True, False))
+            else:
+                elementos.append(
+                    bloque_vacio(
+                        "No hay metas registradas en este departamento.", ancho
+                    )
+                )
+            elementos.append(Spacer(1, 25))
+
+    elif context.get("actividades_por_meta"):
+        for meta, datos in context["actividades_por_meta"].items():
+            elementos.extend(tarjeta_meta(meta, datos, ancho, False, True))
+
+    pie = Table(
+        [
+            [
+                Paragraph(
+                    f"Documento generado automáticamente - {generado}", ESTILOS["pie"]
+                )
+            ]
+        ],
+        colWidths=[ancho],
+    )
+    pie.setStyle(
+        TableStyle(
+            [
+                ("LINEABOVE", (0, 0), (-1, -1), 1, GRIS_BORDE),
+                ("TOPPADDING", (0, 0), (-1, -1), 15),
+            ]
+        )
+    )
+    elementos.extend([Spacer(1, 40), pie])
+
+    doc.build(elementos)
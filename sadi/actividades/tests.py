@@ -1,3 +1,112 @@
+import datetime as dt
+import io
+from types import SimpleNamespace
 from django.test import TestCase
+from pypdf import PdfReader
+from departamentos.models import Departamento
+from metas.models import Meta
+from objetivos.models import ObjetivoEstrategico
+from programas.models import Ciclo, ProgramaEstrategico
+from proyectos.models import Proyecto
+from usuarios.models import Usuario
+from .models import Actividad
+from .pdf import generar_programa_trabajo_reportlab
+from .views import contexto_programa_trabajo, generar_programa_trabajo
 
-# Create your tests here.
+
+class ProgramaTrabajoPdfTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        programa = ProgramaEstrategico.objects.create(
+            clave="P1",
+            nombre="Programa",
+            nombre_corto="PR",
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            duracion=1,
+        )
+        cls.ciclo = Ciclo.objects.create(
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            programa=programa,
+        )
+        objetivo = ObjetivoEstrategico.objects.create(
+            descripcion="Objetivo", programa=programa
+        )
+        proyecto = Proyecto.objects.create(
+            clave="P1", nombre="Proyecto", objetivo=objetivo
+        )
+        cls.departamento = Departamento.objects.create(nombre="Sistemas")
+        meta = Meta.objects.create(
+            nombre="Titulación",
+            proyecto=proyecto,
+            departamento=cls.departamento,
+            indicador="Indicador",
+            unidadMedida="Unidad",
+            metodoCalculo="Conteo",
+        )
+        cls.admin = Usuario.objects.create_user(
+            "admin_uno", "admin@sadi.mx", "x", role="ADMIN"
+        )
+        cls.docente = Usuario.objects.create_user(
+            "docente_uno",
+            "docente@sadi.mx",
+            "x",
+            role="DOCENTE",
+            departamento=cls.departamento,
+        )
+        Actividad.objects.create(
+            descripcion="Taller de tesis",
+            fecha_inicio=dt.date(2025, 2, 1),
+            fecha_fin=dt.date(2025, 3, 1),
+            meta=meta,
+            ciclo=cls.ciclo,
+            responsable=cls.docente,
+            departamento=cls.departamento,
+        )
+
+    def texto_pdf(self, contenido):
+        self.assertTrue(contenido.startswith(b"%PDF-"))
+        lector = PdfReader(io.BytesIO(contenido))
+        self.assertGreaterEqual(len(lector.pages), 1)
+        return "\n".join(pagina.extract_text() for pagina in lector.pages)
+
+    def generar(self, motor, solicitante, departamento="", responsable=None):
+        """PDF de un trabajo de reportes.trabajos con los parámetros dados."""
+        parametros = {"departamento": departamento, "ciclo": self.ciclo.id}
+        parametros["motor"] = motor
+        if responsable:
+            parametros["responsable"] = responsable.id
+        trabajo = SimpleNamespace(parametros=parametros, solicitante_id=solicitante.id)
+        archivo = io.BytesIO()
+        generar_programa_trabajo(trabajo, archivo)
+        return self.texto_pdf(archivo.getvalue())
+
+    def test_reportlab_genera_un_pdf_valido(self):
+        archivo = io.BytesIO()
+        generar_programa_trabajo_reportlab(
+            contexto_programa_trabajo(self.admin, self.ciclo.id, ""), archivo
+        )
+        texto = self.texto_pdf(archivo.getvalue())
+
+        self.assertIn("INFORME DE PROGRAMA DE TRABAJO", texto)
+        self.assertIn("DEPARTAMENTO: Sistemas", texto)
+        self.assertIn("META: Titulación", texto)
+        self.assertIn("Taller de tesis", texto)
+
+    def test_pdf_compartido_sin_datos_del_solicitante(self):
+        for motor in ("reportlab", "xhtml2pdf"):
+            with self.subTest(motor=motor):
+                texto = self.generar(motor, self.admin)
+                self.assertNotIn("admin_uno", texto)
+                self.assertIn("Departamento: Todos", texto)
+
+                texto = self.generar(motor, self.admin, str(self.departamento.id))
+                self.assertIn("Departamento: Sistemas", texto)
+
+    def test_pdf_del_docente_con_sus_datos(self):
+        for motor in ("reportlab", "xhtml2pdf"):
+            with self.subTest(motor=motor):
+                texto = self.generar(motor, self.docente, responsable=self.docente)
+                self.assertIn("Usuario: docente_uno", texto)
+                self.assertIn("Taller de tesis", texto)
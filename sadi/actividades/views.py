@@ -18,8 +18,12 @@ from usuarios.permissions import IsAdmin, IsApoyo, IsDocente, IsInvitado
 from usuarios.decorators import role_required
 from departamentos.models import Departamento
 from django.template.loader import render_to_string
-from django.http import HttpResponse
+from reportes.models import TrabajoReporte
+from reportes.views import solicitar_exportacion
 from xhtml2pdf import pisa
+from django.conf import settings
+from .pdf import generar_programa_trabajo_reportlab
+from collections import defaultdict
 import io
 
 
@@ -355,45 +359,66 @@ def obtener_contexto_programa_trabajo(request, departamento_seleccionado):
     Devuelve un contexto listo para usar en el template del Programa de Trabajo.
     Filtra actividades por departamento y ciclo.
     """
-    user = request.user
-    ciclo_seleccionado = request.session.get("ciclo_id")
+    return contexto_programa_trabajo(
+        request.user, request.session.get("ciclo_id"), departamento_seleccionado
+    )
+
+
+def resumir_actividades(actividades):
+    """Datos de una meta en el Programa de Trabajo a partir de sus actividades."""
+    total = len(actividades)
+    completadas = sum(1 for act in actividades if act.estado == "Cumplida")
+
+    if total > 0:
+        porcentaje = round((completadas / total) * 100, 1)
+        porcentaje_int = int(round((completadas / total) * 100))
+    else:
+        porcentaje = 0.0
+        porcentaje_int = 0
+
+    return {
+        "actividades": actividades,
+        "completadas": completadas,
+        "total": total,
+        "porcentaje": porcentaje,
+        "porcentaje_int": porcentaje_int,
+    }
+
+
+def contexto_programa_trabajo(user, ciclo_seleccionado, departamento_seleccionado):
+    """
+    Contexto del Programa de Trabajo para un usuario y ciclo, sin depender de
+    la petición (lo usa también el worker de reportes).
+
+    Las actividades se leen en una sola consulta y se agrupan por meta en
+    memoria, así el número de consultas no crece con departamentos ni metas.
+    """
     # ADMIN y APOYO
     if user.role in ["ADMIN", "APOYO"]:
         departamentos = Departamento.objects.all()
         if departamento_seleccionado:
             departamentos = departamentos.filter(id=departamento_seleccionado)
+        departamentos = list(departamentos)
 
-        actividades_por_depto = {}
-
-        for depto in departamentos:
-            metas = Meta.objects.filter(departamento=depto).prefetch_related(
-                "actividad_set"
+        metas = Meta.objects.filter(departamento__in=departamentos).order_by("id")
+        actividades = Actividad.objects.filter(
+            departamento__in=departamentos
+        ).select_related("responsable")
+        if ciclo_seleccionado:
+            actividades = actividades.filter(ciclo_id=ciclo_seleccionado)
+
+        # Actividades por (departamento, meta)
+        agrupadas = defaultdict(list)
+        for act in actividades.order_by("id"):
+            agrupadas[(act.departamento_id, act.meta_id)].append(act)
+
+        actividades_por_depto = {depto: {} for depto in departamentos}
+        deptos_por_id = {depto.id: depto for depto in departamentos}
+        for meta in metas:
+            depto = deptos_por_id[meta.departamento_id]
+            actividades_por_depto[depto][meta] = resumir_actividades(
+                agrupadas[(depto.id, meta.id)]
             )
-            actividades_por_depto[depto] = {}
-
-            for meta in metas:
-                # Filtramos las actividades por ciclo
-                actividades = meta.actividad_set.filter(departamento=depto)
-                if ciclo_seleccionado:
-                    actividades = actividades.filter(ciclo_id=ciclo_seleccionado)
-
-                total = actividades.count()
-                completadas = actividades.filter(estado="Cumplida").count()
-
-                if total > 0:
-                    porcentaje = round((completadas / total) * 100, 1)
-                    porcentaje_int = int(round((completadas / total) * 100))
-                else:
-                    porcentaje = 0.0
-                    porcentaje_int = 0
-
-                actividades_por_depto[depto][meta] = {
-                    "actividades": actividades,
-                    "completadas": completadas,
-                    "total": total,
-                    "porcentaje": porcentaje,
-                    "porcentaje_int": porcentaje_int,
-                }
 
         context = {
             "user": user,
@@ -422,29 +447,12 @@ def obtener_contexto_programa_trabajo(request, departamento_seleccionado):
                 actividades = actividades.filter(ciclo_id=ciclo_seleccionado)
 
         # Agrupar por meta
-        metas = Meta.objects.filter(
-            id__in=actividades.values_list("meta_id", flat=True)
-        )
+        agrupadas = defaultdict(list)
+        for act in actividades.select_related("meta").order_by("meta_id", "id"):
+            agrupadas[act.meta].append(act)
 
-        for meta in metas:
-            acts_meta = actividades.filter(meta=meta)
-            total = acts_meta.count()
-            completadas = acts_meta.filter(estado="Cumplida").count()
-
-            if total > 0:
-                porcentaje = round((completadas / total) * 100, 1)
-                porcentaje_int = int(round((completadas / total) * 100))
-            else:
-                porcentaje = 0.0
-                porcentaje_int = 0
-
-            actividades_por_meta[meta] = {
-                "actividades": acts_meta,
-                "completadas": completadas,
-                "total": total,
-                "porcentaje": porcentaje,
-                "porcentaje_int": porcentaje_int,
-            }
+        for meta, acts_meta in agrupadas.items():
+            actividades_por_meta[meta] = resumir_actividades(acts_meta)
 
         context = {
             "user": user,
@@ -465,17 +473,64 @@ def ProgramaTrabajo(request):
 
 @role_required("DOCENTE", "ADMIN", "APOYO")
 def programa_trabajo_pdf(request):
+    # El PDF se genera en segundo plano (ver reportes.trabajos) y se reutiliza
+    # mientras no cambien los datos
     departamento_seleccionado = request.GET.get("departamento", "")
-    context = obtener_contexto_programa_trabajo(request, departamento_seleccionado)
+    parametros = {
+        "departamento": departamento_seleccionado,
+        "ciclo": request.session.get("ciclo_id"),
+        "motor": motor_programa_trabajo(departamento_seleccionado),
+    }
+    if request.user.role not in ["ADMIN", "APOYO"]:
+        # El docente solo ve sus actividades: su PDF no se comparte
+        parametros["responsable"] = request.user.id
 
-    html = render_to_string("actividades/programa_trabajo_pdf.html", context)
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="programa_trabajo.pdf"'
+    return solicitar_exportacion(request, TrabajoReporte.PROGRAMA_TRABAJO, parametros)
 
-    pisa_status = pisa.CreatePDF(io.BytesIO(html.encode("UTF-8")), dest=response)
+
+def motor_programa_trabajo(departamento_seleccionado):
+    """Motor con el que se dibuja el PDF (ver PROGRAMA_TRABAJO_PDF_MOTOR)."""
+    motor = settings.PROGRAMA_TRABAJO_PDF_MOTOR
+    if motor == "auto":
+        return "xhtml2pdf" if departamento_seleccionado else "reportlab"
+    return motor
+
+
+def generar_programa_trabajo(trabajo, archivo):
+    """
+    Genera el PDF del Programa de Trabajo de un TrabajoReporte.
+
+    Para ADMIN y APOYO el documento es el mismo para todos (por departamento
+    y ciclo) y se descarga por cualquiera de ellos, así que el encabezado no
+    muestra al usuario sino el departamento del reporte.
+    """
+    parametros = trabajo.parametros
+    user = Usuario.objects.get(
+        id=parametros.get("responsable") or trabajo.solicitante_id
+    )
+    context = contexto_programa_trabajo(
+        user,
+        parametros.get("ciclo"),
+        parametros.get("departamento", ""),
+    )
+    context["compartido"] = not parametros.get("responsable")
+    if context["compartido"]:
+        departamentos = list(context.get("actividades_por_depto", {}))
+        context["departamento_reporte"] = (
+            departamentos[0].nombre
+            if parametros.get("departamento") and departamentos
+            else "Todos"
+        )
+
+    if parametros.get("motor") == "reportlab":
+        generar_programa_trabajo_reportlab(context, archivo)
+        return "programa_trabajo.pdf"
+
+    html = render_to_string("actividades/programa_trabajo_pdf.html", context)
+    pisa_status = pisa.CreatePDF(io.BytesIO(html.encode("UTF-8")), dest=archivo)
     if pisa_status.err:
-        return HttpResponse("Error al generar PDF <pre>" + html + "</pre>")
-    return response
+        raise ValueError(f"Error al generar PDF ({pisa_status.err} errores)")
+    return "programa_trabajo.pdf"
 
 
 # ===============================API===============================
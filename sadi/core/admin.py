@@ -1,3 +1,49 @@
+from django.conf import settings
 from django.contrib import admin
 
-# Register your models here.
+from .middleware import endpoints_mas_costosos
+from .models import MetricaSQL
+
+
+@admin.register(MetricaSQL)
+class MetricaSQLAdmin(admin.ModelAdmin):
+    """
+    Filas por endpoint y hora; arriba de la lista, los endpoints con más
+    consultas y más tiempo en la base de datos de las últimas ?horas=N horas.
+    """
+
+    list_display = (
+        "hora",
+        "endpoint",
+        "peticiones",
+        "consultas",
+        "consultas_max",
+        "tiempo_db_ms",
+        "peticiones_n_mas_1",
+    )
+    list_filter = ("hora",)
+    search_fields = ("endpoint",)
+    ordering = ("-hora", "-consultas")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            horas = max(1, int(request.GET.get("horas", settings.SQL_METRICAS_HORAS)))
+        except ValueError:
+            horas = settings.SQL_METRICAS_HORAS
+        # "horas" no es un filtro del modelo: se quita antes de armar la lista
+        if "horas" in request.GET:
+            request.GET = request.GET.copy()
+            del request.GET["horas"]
+        extra_context = {
+            **(extra_context or {}),
+            "horas": horas,
+            "por_consultas": endpoints_mas_costosos(horas, "consultas"),
+            "por_tiempo": endpoints_mas_costosos(horas, "tiempo_db_ms"),
+        }
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_DATOS_KEY = "sadi:datos:version"
+VERSION_SISTEMA_KEY = "sadi:sistema:version"
+VERSION_MODELO_KEY = "sadi:modelo:{label}:version"
+ESTADISTICAS_KEY = "sadi:cache:{nombre}:{tipo}"
+
+_NO_ENCONTRADO = object()
+
+
+def leer_version(key):
+    """
+    Valor actual de una clave de versión. Las entradas en caché llevan la
+    versión en su clave, así que al incrementarla quedan todas invalidadas de
+    una vez.
+    """
+    version = cache.get(key)
+    if version is None:
+        # Se parte de la hora actual para no reutilizar claves de una versión
+        # anterior si la caché se vació
+        cache.add(key, int(time.time()), None)
+        version = cache.get(key)
+    return version
+
+
+def incrementar_version(key):
+    """Invalida todas las entradas que dependen de la clave de versión."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time())
+        cache.set(key, version, None)
+        return version
+
+
+def version_datos():
+    """Versión de los datos de seguimiento (metas, avances, actividades...)."""
+    return leer_version(VERSION_DATOS_KEY)
+
+
+def incrementar_version_datos():
+    return incrementar_version(VERSION_DATOS_KEY)
+
+
+def version_sistema():
+    """
+    Versión de la configuración del sistema (programas, ciclos, objetivos,
+    proyectos, metas y ConfiguracionGlobal) que usan los context processors.
+    """
+    return leer_version(VERSION_SISTEMA_KEY)
+
+
+def incrementar_version_sistema():
+    return incrementar_version(VERSION_SISTEMA_KEY)
+
+
+def versiones_modelos(labels):
+    """
+    Versiones de varios modelos ("app.Modelo") en una sola lectura de la
+    caché. Cada una cambia al guardar o borrar un registro de su modelo.
+    """
+    keys = {label: VERSION_MODELO_KEY.format(label=label) for label in labels}
+    guardadas = cache.get_many(keys.values())
+    return tuple(
+        guardadas[key] if key in guardadas else leer_version(key)
+        for key in keys.values()
+    )
+
+
+def incrementar_version_modelo(label):
+    return incrementar_version(VERSION_MODELO_KEY.format(label=label))
+
+
+class EstadisticasCache:
+    """
+    Aciertos y fallos de las cachés en este proceso. Se suman a los
+    contadores de la caché compartida cada `intervalo` segundos: una
+    escritura por contador y volcado en lugar de una por petición (con
+    DatabaseCache, incr es una lectura más un UPDATE).
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.pendientes = Counter()
+        self.ultimo_volcado = time.monotonic()
+
+    def contar(self, nombre, tipo):
+        with self.lock:
+            self.pendientes[(nombre, tipo)] += 1
+            volcar = time.monotonic() - self.ultimo_volcado >= self.intervalo
+        if volcar:
+            self.volcar()
+
+    def volcar(self):
+        with self.lock:
+            pendientes, self.pendientes = self.pendientes, Counter()
+            self.ultimo_volcado = time.monotonic()
+        for (nombre, tipo), cantidad in pendientes.items():
+            key = ESTADISTICAS_KEY.format(nombre=nombre, tipo=tipo)
+            try:
+                cache.incr(key, cantidad)
+            except ValueError:
+                if not cache.add(key, cantidad, None):
+                    cache.incr(key, cantidad)
+
+
+estadisticas = EstadisticasCache(settings.CACHE_ESTADISTICAS_INTERVALO)
+
+
+def obtener_o_calcular(nombre, partes, calcular, timeout=None):
+    """
+    Devuelve el valor guardado para (nombre, versión de datos, *partes) o lo
+    calcula con calcular() y lo guarda. Registra aciertos y fallos.
+    """
+    key = ":".join(
+        ["sadi", nombre, f"v{version_datos()}", *(str(parte) for parte in partes)]
+    )
+    valor = cache.get(key, _NO_ENCONTRADO)
+    if valor is not _NO_ENCONTRADO:
+        estadisticas.contar(nombre, "hits")
+        logger.debug(f"Caché {nombre}: acierto {key}")
+        return valor
+
+    estadisticas.contar(nombre, "misses")
+    inicio = time.perf_counter()
+    valor = calcular()
+    logger.debug(
+        f"Caché {nombre}: fallo {key} "
+        f"({(time.perf_counter() - inicio) * 1000:.1f} ms)"
+    )
+    cache.set(key, valor, timeout)
+    return valor
+
+
+def estadisticas_cache(nombre):
+    """
+    Aciertos, fallos y tasa de aciertos de una caché: los ya volcados por
+    todos los procesos más los pendientes de este.
+    """
+    estadisticas.volcar()
+    hits = cache.get(ESTADISTICAS_KEY.format(nombre=nombre, tipo="hits"), 0)
+    misses = cache.get(ESTADISTICAS_KEY.format(nombre=nombre, tipo="misses"), 0)
+    total = hits + misses
+    return {
+        "cache": nombre,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 3) if total else 0,
+        "version_datos": version_datos(),
+    }
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends que guardan la caché en la memoria de cada proceso
+CACHES_POR_PROCESO = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def cache_compartida(app_configs, **kwargs):
+    """
+    Las versiones de core/cache.py solo invalidan los datos en caché de todos
+    los workers si la caché es compartida.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend not in CACHES_POR_PROCESO:
+        return []
+    return [
+        Warning(
+            f"La caché por defecto ({backend}) no se comparte entre procesos: "
+            "los cambios hechos en un worker no invalidan el dashboard, el "
+            "estado del sistema, los reportes ni las respuestas del asistente "
+            "de los demás.",
+            hint="Usa DatabaseCache (el valor por defecto) o RedisCache en "
+            "CACHE_BACKEND.",
+            id="core.W001",
+        )
+    ]
@@ -0,0 +1,67 @@
+import threading
+from django.db import connections
+
+
+class EstadisticasConexiones:
+    """
+    Conexiones que abre este proceso (backend core.db): cuántas y cuánto
+    tardan. Sin pool cada una es una conexión nueva a PostgreSQL; con pool es
+    la espera para sacar una conexión del pool (checkout).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.conexiones = 0
+        self.errores = 0
+        self.tiempo_ms = 0.0
+        self.tiempo_max_ms = 0.0
+
+    def registrar(self, tiempo_ms, error=False):
+        with self.lock:
+            if error:
+                self.errores += 1
+                return
+            self.conexiones += 1
+            self.tiempo_ms += tiempo_ms
+            self.tiempo_max_ms = max(self.tiempo_max_ms, tiempo_ms)
+
+    def estadisticas(self):
+        with self.lock:
+            return {
+                "conexiones": self.conexiones,
+                "errores": self.errores,
+                "tiempo_total_ms": round(self.tiempo_ms, 1),
+                "tiempo_promedio_ms": (
+                    round(self.tiempo_ms / self.conexiones, 2) if self.conexiones else 0
+                ),
+                "tiempo_max_ms": round(self.tiempo_max_ms, 2),
+            }
+
+
+estadisticas_conexiones = EstadisticasConexiones()
+
+
+def estado_conexiones(alias="default"):
+    """
+    Modo de las conexiones, lo medido en este proceso y, con pool, las
+    estadísticas de psycopg_pool (tamaño, disponibles, peticiones en espera y
+    tiempo de espera acumulado).
+    """
+    conexion = connections[alias]
+    pool = getattr(conexion, "pool", None)
+    if pool is not None:
+        modo = "pool"
+    elif conexion.settings_dict["CONN_MAX_AGE"] != 0:
+        modo = "persistentes"
+    else:
+        modo = "por_peticion"
+    return {
+        "modo": modo,
+        "conn_max_age": conexion.settings_dict["CONN_MAX_AGE"],
+        "health_checks": conexion.settings_dict["CONN_HEALTH_CHECKS"],
+        "conexiones": estadisticas_conexiones.estadisticas(),
+        "pool": pool.get_stats() if pool is not None else None,
+    }
@@ -1,20 +1,85 @@
+import time
+from django.conf import settings
 from programas.models import ProgramaEstrategico, Ciclo
 from objetivos.models import ObjetivoEstrategico
 from proyectos.models import Proyecto
 from metas.models import Meta
 
+from .cache import version_sistema
 from .models import ConfiguracionGlobal
 
+# Estado global calculado en este proceso: (versión del sistema, hora, valores).
+# Durante ESTADO_SISTEMA_TIMEOUT segundos se reutiliza sin consultas (ni a la
+# base de datos ni a la caché). Pasado ese tiempo se lee la versión de la
+# caché compartida y solo se recalcula si otro proceso la cambió. Los cambios
+# hechos en este proceso lo invalidan de inmediato (core.signals).
+ESTADO_GLOBAL = {}
 
-# Context processor para obtener el estado de captura global METAS(VARIABLE B)
-def estado_captura(request):
+ESTADO_VACIO = {
+    "hay_programas": False,
+    "hay_ciclos": False,
+    "hay_objetivos": False,
+    "hay_proyectos": False,
+    "hay_metas": False,
+}
+
+
+def calcular_estado_global():
     cfg = ConfiguracionGlobal.objects.first()
 
     # Si por algún motivo no existe, lo creamos (evita crashes)
     if cfg is None:
         cfg = ConfiguracionGlobal.objects.create(captura_activa=True)
 
-    return {"captura_activa": cfg.captura_activa}
+    # Ids como texto: el ciclo de la sesión puede guardarse como int o str
+    ciclos = {str(ciclo_id) for ciclo_id in Ciclo.objects.values_list("id", flat=True)}
+
+    return {
+        "captura_activa": cfg.captura_activa,
+        "hay_programas": ProgramaEstrategico.objects.exists(),
+        "hay_ciclos": bool(ciclos),
+        "hay_objetivos": ObjetivoEstrategico.objects.exists(),
+        "hay_proyectos": Proyecto.objects.exists(),
+        "hay_metas": Meta.objects.exists(),
+        "ciclos": ciclos,
+    }
+
+
+def estado_global():
+    """
+    Estado global del sistema sin consultas mientras no pase
+    ESTADO_SISTEMA_TIMEOUT y, después, mientras no cambie la versión del
+    sistema.
+    """
+    ahora = time.monotonic()
+    guardado = ESTADO_GLOBAL.get("estado")
+    if guardado and ahora - guardado[1] < settings.ESTADO_SISTEMA_TIMEOUT:
+        return guardado[2]
+
+    # La versión se lee antes de calcular: si los datos cambian mientras se
+    # calcula, la siguiente lectura ve una versión nueva y recalcula
+    version = version_sistema()
+    if guardado and guardado[0] == version:
+        valores = guardado[2]
+    else:
+        valores = calcular_estado_global()
+    ESTADO_GLOBAL["estado"] = (version, ahora, valores)
+    return valores
+
+
+def estado_peticion(request):
+    """
+    Estado global de la petición: los dos context processors lo comparten
+    para obtenerlo una sola vez.
+    """
+    if not hasattr(request, "_estado_global"):
+        request._estado_global = estado_global()
+    return request._estado_global
+
+
+# Context processor para obtener el estado de captura global METAS(VARIABLE B)
+def estado_captura(request):
+    return {"captura_activa": estado_peticion(request)["captura_activa"]}
 
 
 def estado_sistema(request):
@@ -23,29 +88,18 @@ def estado_sistema(request):
     del sistema. Se usa en base.html para filtrar accesos y botones.
     """
     try:
+        actual = estado_peticion(request)
+
         # Obtener ciclo actual de sesión
         ciclo_id = request.session.get("ciclo_id")
-        ciclo_activo = Ciclo.objects.filter(id=ciclo_id).exists() if ciclo_id else False
+        ciclo_activo = str(ciclo_id) in actual["ciclos"] if ciclo_id else False
 
         # Estado general del sistema
-        estado = {
-            "hay_programas": ProgramaEstrategico.objects.exists(),
-            "hay_ciclos": Ciclo.objects.exists(),
-            "hay_objetivos": ObjetivoEstrategico.objects.exists(),
-            "hay_proyectos": Proyecto.objects.exists(),
-            "hay_metas": Meta.objects.exists(),
-            "ciclo_activo": ciclo_activo,
-        }
+        estado = {clave: actual[clave] for clave in ESTADO_VACIO}
+        estado["ciclo_activo"] = ciclo_activo
 
     except Exception:
         # Si hay error de migración o DB vacía, evitar que el sistema se rompa
-        estado = {
-            "hay_programas": False,
-            "hay_ciclos": False,
-            "hay_objetivos": False,
-            "hay_proyectos": False,
-            "hay_metas": False,
-            "ciclo_activo": False,
-        }
+        estado = {**ESTADO_VACIO, "ciclo_activo": False}
 
     return {"estado_sistema": estado}
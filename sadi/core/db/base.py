@@ -0,0 +1,20 @@
+import time
+from django.db.backends.postgresql import base
+from core.conexiones import estadisticas_conexiones
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Backend de PostgreSQL de Django que mide cada conexión: el tiempo de
+    conectarse o, con pool, de esperar una conexión del pool.
+    """
+
+    def get_new_connection(self, conn_params):
+        inicio = time.perf_counter()
+        try:
+            conexion = super().get_new_connection(conn_params)
+        except Exception:
+            estadisticas_conexiones.registrar(0, error=True)
+            raise
+        estadisticas_conexiones.registrar((time.perf_counter() - inicio) * 1000)
+        return conexion
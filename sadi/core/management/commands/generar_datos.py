@@ -0,0 +1,481 @@
+import csv
+import datetime as dt
+import io
+import itertools
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+from simple_history.utils import bulk_create_with_history, get_history_manager_for_model
+from actividades.models import Actividad
+from core.cache import (
+    incrementar_version_datos,
+    incrementar_version_modelo,
+    incrementar_version_sistema,
+)
+from departamentos.models import Departamento
+from metas.models import AvanceMeta, Meta, MetaCiclo
+from metas.resumenes import reconstruir_resumenes
+from objetivos.models import ObjetivoEstrategico
+from programas.models import Ciclo, ProgramaEstrategico
+from proyectos.models import Proyecto
+from riesgos.models import Mitigacion, Riesgo
+from usuarios.models import Usuario
+
+# Modelos que se crean sin señales (bulk_create): al terminar se invalidan
+# sus versiones en la caché
+MODELOS_GENERADOS = [
+    ProgramaEstrategico,
+    Ciclo,
+    ObjetivoEstrategico,
+    Proyecto,
+    Departamento,
+    Usuario,
+    Meta,
+    MetaCiclo,
+    AvanceMeta,
+    Actividad,
+    Riesgo,
+    Mitigacion,
+]
+
+AREAS = [
+    "Ciencias Básicas",
+    "Ingeniería",
+    "Ciencias Sociales",
+    "Humanidades",
+    "Ciencias de la Salud",
+    "Económico Administrativas",
+    "Artes",
+    "Ciencias Agropecuarias",
+    "Educación",
+    "Posgrado",
+]
+UNIDADES = ["Porcentaje", "Documentos", "Estudiantes", "Eventos", "Artículos"]
+
+
+def lotes(objetos, tamano):
+    """Parte un iterable en listas de `tamano` elementos."""
+    iterador = iter(objetos)
+    while lote := list(itertools.islice(iterador, tamano)):
+        yield lote
+
+
+def repartir(total, partes):
+    """Cantidad que toca a cada una de `partes` para sumar `total`."""
+    base, resto = divmod(total, partes)
+    return [base + (i < resto) for i in range(partes)]
+
+
+def filas_csv(objetos, campos):
+    """
+    Los objetos como CSV para COPY ... FROM STDIN (FORMAT csv): los valores
+    se preparan como los guardaría el ORM y None queda vacío (NULL).
+    """
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    for objeto in objetos:
+        escritor.writerow(
+            [
+                campo.get_db_prep_save(getattr(objeto, campo.attname), connection)
+                for campo in campos
+            ]
+        )
+    salida.seek(0)
+    return salida
+
+
+def copiar(modelo, objetos, incluir_pk=True):
+    """Inserta los objetos con COPY (solo PostgreSQL con psycopg2)."""
+    campos = [
+        campo
+        for campo in modelo._meta.concrete_fields
+        if incluir_pk or not campo.primary_key
+    ]
+    columnas = ", ".join(connection.ops.quote_name(c.column) for c in campos)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(modelo._meta.db_table)} ({columnas}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            filas_csv(objetos, campos),
+        )
+
+
+def soporta_copy():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        return hasattr(cursor.cursor, "copy_expert")
+
+
+class Generador:
+    """
+    Genera la jerarquía completa de datos de prueba. Todo sale de un
+    random.Random y un Faker con la misma semilla, así que dos corridas con
+    la misma semilla y los mismos tamaños sobre una base vacía producen los
+    mismos datos.
+    """
+
+    def __init__(self, opciones, escribir):
+        self.opciones = opciones
+        self.escribir = escribir
+        self.semilla = opciones["semilla"]
+        self.azar = random.Random(self.semilla)
+        self.faker = Faker("es_MX")
+        self.faker.seed_instance(self.semilla)
+        self.lote = opciones["lote"]
+        self.historial = not opciones["sin_historial"]
+        # Fecha fija de los registros del historial
+        self.fecha_historial = timezone.make_aware(dt.datetime(2020, 1, 1))
+        self.prefijo = f"S{self.semilla}"
+        self.usar_copy = soporta_copy()
+
+    def crear(self, modelo, objetos):
+        """bulk_create por lotes, con su historial; devuelve los objetos con pk."""
+        inicio = time.perf_counter()
+        creados = []
+        for lote in lotes(objetos, self.lote):
+            if self.historial:
+                creados += bulk_create_with_history(
+                    lote,
+                    modelo,
+                    batch_size=self.lote,
+                    default_date=self.fecha_historial,
+                )
+            else:
+                creados += modelo.objects.bulk_create(lote, batch_size=self.lote)
+        self.escribir(
+            f"{modelo._meta.object_name}: {len(creados)} "
+            f"({time.perf_counter() - inicio:.1f} s)"
+        )
+        return creados
+
+    def generar(self):
+        o = self.opciones
+        if ProgramaEstrategico.objects.filter(
+            clave__startswith=f"{self.prefijo}-"
+        ).exists():
+            raise CommandError(
+                f"Ya hay datos generados con la semilla {self.semilla}; "
+                "usa otra semilla o una base vacía"
+            )
+
+        programas = self.crear(
+            ProgramaEstrategico,
+            (
+                ProgramaEstrategico(
+                    clave=f"{self.prefijo}-P{i + 1}",
+                    nombre=f"Programa Estratégico {self.faker.catch_phrase()}"[:200],
+                    nombre_corto=f"PE{i + 1}",
+                    fecha_inicio=dt.date(2020, 1, 1),
+                    fecha_fin=dt.date(2020 + o["ciclos"] - 1, 12, 31),
+                    duracion=Decimal(o["ciclos"]),
+                )
+                for i in range(o["programas"])
+            ),
+        )
+        ciclos = self.crear(
+            Ciclo,
+            (
+                Ciclo(
+                    programa=programa,
+                    # Nombre con el formato de Ciclo.save()
+                    nombre=f"{programa.nombre_corto} - {anio}-01-01 - {anio}-12-31",
+                    estado="Activo" if j == o["ciclos"] - 1 else "Inactivo",
+                    fecha_inicio=dt.date(anio, 1, 1),
+                    fecha_fin=dt.date(anio, 12, 31),
+                    duracion=1,
+                )
+                for programa in programas
+                for j, anio in enumerate(range(2020, 2020 + o["ciclos"]))
+            ),
+        )
+        objetivos = self.crear(
+            ObjetivoEstrategico,
+            (
+                ObjetivoEstrategico(
+                    clave=f"{programa.clave}-OBJ{j + 1}",
+                    descripcion=self.faker.sentence(nb_words=10),
+                    programa=programa,
+                )
+                for programa in programas
+                for j in range(o["objetivos"])
+            ),
+        )
+        proyectos = self.crear(
+            Proyecto,
+            (
+                Proyecto(
+                    clave=f"{objetivo.clave}-PRY{j + 1}",
+                    nombre=self.faker.sentence(nb_words=8),
+                    objetivo=objetivo,
+                )
+                for objetivo in objetivos
+                for j in range(o["proyectos"])
+            ),
+        )
+        departamentos = self.crear(
+            Departamento,
+            (
+                # El nombre es único: lleva el prefijo de la semilla
+                Departamento(
+                    nombre=f"{self.prefijo} {AREAS[i % len(AREAS)]} {i // len(AREAS) + 1}"
+                )
+                for i in range(o["departamentos"])
+            ),
+        )
+        # Un responsable por departamento (Usuario.departamento es uno a uno)
+        responsables = self.crear(
+            Usuario,
+            (
+                Usuario(
+                    username=f"{self.prefijo.lower()}_docente{i + 1}",
+                    first_name=self.faker.first_name(),
+                    last_name=self.faker.last_name(),
+                    email=f"{self.prefijo.lower()}_docente{i + 1}@sadi.test",
+                    password="!",  # Sin contraseña utilizable
+                    role="DOCENTE",
+                    departamento=departamento,
+                )
+                for i, departamento in enumerate(departamentos)
+            ),
+        )
+        responsable_de = {r.departamento_id: r for r in responsables}
+
+        metas = self.crear(
+            Meta,
+            (
+                Meta(
+                    clave=f"{proyectos[i % len(proyectos)].clave}-META{i + 1}",
+                    nombre=self.faker.sentence(nb_words=6)[:250],
+                    enunciado=self.faker.paragraph(nb_sentences=2),
+                    proyecto=proyectos[i % len(proyectos)],
+                    departamento=departamentos[self.azar.randrange(len(departamentos))],
+                    indicador=self.faker.sentence(nb_words=8),
+                    unidadMedida=self.azar.choice(UNIDADES),
+                    metodoCalculo="Suma de avances",
+                    acumulable=self.azar.random() < 0.3,
+                    porcentages=self.azar.random() < 0.2,
+                    activa=True,
+                )
+                for i in range(o["metas"])
+            ),
+        )
+        # Valores ya normalizados como los deja MetaCiclo.save() (fracción si
+        # la meta es porcentual)
+        metas_ciclo = self.crear(
+            MetaCiclo,
+            (
+                MetaCiclo(
+                    meta=meta,
+                    ciclo=ciclo,
+                    lineaBase=Decimal(0),
+                    metaCumplir=(
+                        Decimal(self.azar.randint(50, 100)) / 100
+                        if meta.porcentages
+                        else Decimal(self.azar.randint(5, 200))
+                    ),
+                )
+                for meta in metas
+                for ciclo in ciclos
+                if ciclo.programa_id == meta.proyecto.objetivo.programa_id
+            ),
+        )
+        self.generar_avances(metas_ciclo)
+
+        estados = [estado for estado, _ in Actividad.ESTADOS]
+        actividades = self.crear(
+            Actividad,
+            (
+                Actividad(
+                    nombre=self.faker.sentence(nb_words=5)[:255],
+                    descripcion=self.faker.paragraph(nb_sentences=2),
+                    estado=self.azar.choice(estados),
+                    fecha_inicio=mc.ciclo.fecha_inicio,
+                    fecha_fin=mc.ciclo.fecha_fin,
+                    editable=mc.ciclo.estado == "Activo",
+                    meta=mc.meta,
+                    ciclo=mc.ciclo,
+                    departamento=mc.meta.departamento,
+                    responsable=responsable_de[mc.meta.departamento_id],
+                )
+                for mc in metas_ciclo
+                for _ in range(o["actividades"])
+            ),
+        )
+        riesgos = []
+        for actividad in actividades:
+            if self.azar.random() < o["riesgos"]:
+                probabilidad = self.azar.randint(1, 10)
+                impacto = self.azar.randint(1, 10)
+                riesgos.append(
+                    Riesgo(
+                        enunciado=self.faker.sentence(nb_words=8)[:200],
+                        probabilidad=probabilidad,
+                        impacto=impacto,
+                        riesgo=probabilidad * impacto,
+                        actividad=actividad,
+                    )
+                )
+        riesgos = self.crear(Riesgo, riesgos)
+        self.crear(
+            Mitigacion,
+            (
+                Mitigacion(
+                    accion=self.faker.sentence(nb_words=10)[:250],
+                    fecha_accion=riesgo.actividad.fecha_inicio
+                    + dt.timedelta(days=self.azar.randrange(365)),
+                    responsable=riesgo.actividad.responsable,
+                    riesgo=riesgo,
+                )
+                for riesgo in riesgos
+                for _ in range(o["mitigaciones"])
+            ),
+        )
+        return ciclos
+
+    def avances(self, metas_ciclo):
+        """Los avances de cada MetaCiclo, repartidos entre los meses del ciclo."""
+        for mc, cantidad in zip(
+            metas_ciclo, repartir(self.opciones["avances"], len(metas_ciclo))
+        ):
+            maximo = mc.metaCumplir / max(cantidad, 1)
+            for _ in range(cantidad):
+                yield AvanceMeta(
+                    metaCumplir=mc.meta,
+                    ciclo=mc.ciclo,
+                    departamento_id=mc.meta.departamento_id,
+                    avance=(maximo * Decimal(self.azar.random())).quantize(
+                        Decimal("0.0001")
+                    ),
+                    fecha_registro=mc.ciclo.fecha_inicio
+                    + dt.timedelta(days=self.azar.randrange(365)),
+                )
+
+    def generar_avances(self, metas_ciclo):
+        if not metas_ciclo:
+            return
+        if not self.usar_copy:
+            self.crear(AvanceMeta, self.avances(metas_ciclo))
+            return
+
+        # PostgreSQL: COPY por lotes, con los ids tomados de la secuencia
+        inicio = time.perf_counter()
+        historial = get_history_manager_for_model(AvanceMeta)
+        tabla = AvanceMeta._meta.db_table
+        total = 0
+        for lote in lotes(self.avances(metas_ciclo), self.lote):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                    "FROM generate_series(1, %s)",
+                    [tabla, len(lote)],
+                )
+                for avance, (pk,) in zip(lote, cursor.fetchall()):
+                    avance.pk = pk
+            copiar(AvanceMeta, lote)
+            if self.historial:
+                copiar(
+                    historial.model,
+                    [
+                        historial.model(
+                            history_date=self.fecha_historial,
+                            history_type="+",
+                            **{
+                                campo.attname: getattr(avance, campo.attname)
+                                for campo in AvanceMeta._meta.concrete_fields
+                            },
+                        )
+                        for avance in lote
+                    ],
+                    incluir_pk=False,
+                )
+            total += len(lote)
+        self.escribir(
+            f"AvanceMeta: {total} con COPY ({time.perf_counter() - inicio:.1f} s)"
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos con la jerarquía completa (programas, ciclos, "
+        "objetivos, proyectos, metas, metas por ciclo, avances, actividades, "
+        "riesgos, mitigaciones y su historial) para pruebas de carga y "
+        "benchmarks. Con la misma semilla los datos son los mismos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--programas", type=int, default=1)
+        parser.add_argument(
+            "--ciclos", type=int, default=5, help="Ciclos (anuales) por programa"
+        )
+        parser.add_argument(
+            "--objetivos", type=int, default=5, help="Objetivos por programa"
+        )
+        parser.add_argument(
+            "--proyectos", type=int, default=4, help="Proyectos por objetivo"
+        )
+        parser.add_argument("--departamentos", type=int, default=50)
+        parser.add_argument("--metas", type=int, default=5000)
+        parser.add_argument(
+            "--avances",
+            type=int,
+            default=1_000_000,
+            help="Avances en total, repartidos entre las metas de cada ciclo",
+        )
+        parser.add_argument(
+            "--actividades", type=int, default=2, help="Actividades por meta y ciclo"
+        )
+        parser.add_argument(
+            "--riesgos",
+            type=float,
+            default=0.2,
+            help="Fracción de las actividades que tienen un riesgo",
+        )
+        parser.add_argument(
+            "--mitigaciones", type=int, default=2, help="Mitigaciones por riesgo"
+        )
+        parser.add_argument(
+            "--lote", type=int, default=5000, help="Filas por inserción"
+        )
+        parser.add_argument(
+            "--sin-historial",
+            action="store_true",
+            help="No crea los registros del historial (simple_history)",
+        )
+        parser.add_argument(
+            "--sin-resumenes",
+            action="store_true",
+            help="No reconstruye los resúmenes de cumplimiento al terminar",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["programas"], options["ciclos"], options["departamentos"]) < 1:
+            raise CommandError("Se necesita al menos un programa, ciclo y departamento")
+        if options["metas"] and min(options["objetivos"], options["proyectos"]) < 1:
+            raise CommandError("Las metas necesitan al menos un objetivo y un proyecto")
+
+        inicio = time.perf_counter()
+        generador = Generador(options, self.stdout.write)
+        with transaction.atomic():
+            ciclos = generador.generar()
+
+        # bulk_create no envía señales: se reconstruye lo que mantienen
+        if not options["sin_resumenes"]:
+            for ciclo in ciclos:
+                reconstruir_resumenes(ciclo)
+        incrementar_version_datos()
+        incrementar_version_sistema()
+        for modelo in MODELOS_GENERADOS:
+            incrementar_version_modelo(modelo._meta.label)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Datos generados con la semilla {options['semilla']} en "
+                f"{time.perf_counter() - inicio:.1f} s"
+            )
+        )
@@ -0,0 +1,103 @@
+import json
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Módulos del stack del modelo que un worker web no debe cargar al arrancar
+MODULOS_PESADOS = ("torch", "transformers")
+
+# Se ejecuta en un proceso nuevo para medir el arranque en frío, igual que un
+# worker de gunicorn: django.setup() y la carga de todas las URLs (que importa
+# las vistas de todas las apps)
+SCRIPT_ARRANQUE = """
+import json, resource, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+print(json.dumps({
+    "setup": setup - inicio,
+    "urls": urls - setup,
+    "total": urls - inicio,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modulos": len(sys.modules),
+    "pesados": [m for m in %r if m in sys.modules],
+}))
+""" % (MODULOS_PESADOS,)
+
+
+def medir_arranque():
+    """Arranca Django en un proceso nuevo y devuelve sus tiempos y memoria."""
+    resultado = subprocess.run(
+        [sys.executable, "-c", SCRIPT_ARRANQUE],
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el arranque en frío de un worker web (django.setup() y carga de "
+        "URLs): tiempo, memoria RSS y si se importaron torch/transformers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=3,
+            help="Número de arranques a medir (se reporta la mediana)",
+        )
+        parser.add_argument(
+            "--max-segundos",
+            type=float,
+            help="Falla si la mediana del arranque supera estos segundos",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime el resultado en JSON"
+        )
+
+    def handle(self, *args, **options):
+        mediciones = [medir_arranque() for _ in range(max(1, options["repeticiones"]))]
+
+        resumen = {
+            "repeticiones": len(mediciones),
+            "setup_s": round(statistics.median(m["setup"] for m in mediciones), 3),
+            "urls_s": round(statistics.median(m["urls"] for m in mediciones), 3),
+            "total_s": round(statistics.median(m["total"] for m in mediciones), 3),
+            "rss_mb": round(max(m["rss_mb"] for m in mediciones), 1),
+            "modulos": mediciones[-1]["modulos"],
+            "pesados": sorted({p for m in mediciones for p in m["pesados"]}),
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resumen))
+        else:
+            self.stdout.write(
+                f"Arranque ({resumen['repeticiones']} repeticiones, mediana): "
+                f"django.setup() {resumen['setup_s']} s, "
+                f"URLs {resumen['urls_s']} s, total {resumen['total_s']} s"
+            )
+            self.stdout.write(
+                f"Memoria RSS: {resumen['rss_mb']} MB, "
+                f"{resumen['modulos']} módulos importados"
+            )
+
+        if resumen["pesados"]:
+            raise CommandError(
+                f"El arranque importa {', '.join(resumen['pesados'])}; "
+                "deben cargarse solo al usar el servicio MCP"
+            )
+        if options["max_segundos"] and resumen["total_s"] > options["max_segundos"]:
+            raise CommandError(
+                f"El arranque tarda {resumen['total_s']} s "
+                f"(máximo {options['max_segundos']} s)"
+            )
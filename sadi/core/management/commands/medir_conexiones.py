@@ -0,0 +1,130 @@
+import copy
+import importlib.util
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+from .medir_endpoints import percentil
+
+# Modos que se comparan: sin reutilizar (como antes), conexiones
+# persistentes verificadas y pool de psycopg 3
+MODOS = ["por_peticion", "persistentes", "pool"]
+
+
+def pool_disponible():
+    """El pool de Django requiere PostgreSQL con psycopg 3 y psycopg_pool."""
+    return connections[DEFAULT_DB_ALIAS].vendor == "postgresql" and all(
+        importlib.util.find_spec(modulo) for modulo in ("psycopg", "psycopg_pool")
+    )
+
+
+def conexion_de_prueba(modo):
+    """Conexión aparte con la configuración de `default` en el modo indicado."""
+    ajustes = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+    opciones = {k: v for k, v in ajustes["OPTIONS"].items() if k != "pool"}
+    ajustes["CONN_HEALTH_CHECKS"] = True
+    ajustes["CONN_MAX_AGE"] = 600 if modo == "persistentes" else 0
+    if modo == "pool":
+        opciones["pool"] = {"min_size": 1, "max_size": 2}
+    ajustes["OPTIONS"] = opciones
+    return load_backend(ajustes["ENGINE"]).DatabaseWrapper(ajustes, f"medicion_{modo}")
+
+
+def medir_modo(modo, peticiones, consultas):
+    """
+    Simula `peticiones` peticiones (con el ciclo de request_started /
+    request_finished de Django) de `consultas` consultas cada una. Devuelve
+    la latencia p50/p95 por petición y las conexiones abiertas.
+    """
+    conexion = conexion_de_prueba(modo)
+    abiertas = []
+
+    def al_conectar(sender, connection, **kwargs):
+        if connection is conexion:
+            abiertas.append(connection)
+
+    connection_created.connect(al_conectar)
+    tiempos = []
+    try:
+        for _ in range(peticiones):
+            inicio = time.perf_counter()
+            conexion.close_if_unusable_or_obsolete()
+            for _ in range(consultas):
+                with conexion.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            conexion.close_if_unusable_or_obsolete()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        pool = conexion.pool.get_stats() if modo == "pool" else None
+    finally:
+        connection_created.disconnect(al_conectar)
+        conexion.close()
+        if modo == "pool":
+            conexion.close_pool()
+
+    return {
+        "modo": modo,
+        "peticiones": peticiones,
+        "p50_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": round(percentil(tiempos, 95), 3),
+        # Con pool cuenta las veces que se sacó una conexión del pool
+        "conexiones": len(abiertas),
+        "pool": pool,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el costo de conexión a la base de datos por petición: una "
+        "conexión nueva en cada petición, conexiones persistentes con health "
+        "checks y, con psycopg 3, el pool de conexiones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--peticiones", type=int, default=200, help="Peticiones por modo"
+        )
+        parser.add_argument(
+            "--consultas",
+            type=int,
+            default=3,
+            help="Consultas por petición (SELECT 1)",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime el resultado en JSON"
+        )
+
+    def handle(self, *args, **options):
+        modos = [m for m in MODOS if m != "pool" or pool_disponible()]
+        resultados = [
+            medir_modo(modo, max(1, options["peticiones"]), options["consultas"])
+            for modo in modos
+        ]
+        base = resultados[0]
+        for r in resultados:
+            r["ahorro_ms"] = round(base["p50_ms"] - r["p50_ms"], 3)
+            r["reduccion"] = (
+                round(1 - r["p50_ms"] / base["p50_ms"], 3) if base["p50_ms"] else 0
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados))
+            return
+
+        self.stdout.write(
+            f"{connections[DEFAULT_DB_ALIAS].vendor}: {options['peticiones']} "
+            f"peticiones de {options['consultas']} consultas por modo"
+        )
+        if "pool" not in modos:
+            self.stdout.write("pool: requiere PostgreSQL y psycopg[pool], se omite")
+        self.stdout.write(
+            f"{'modo':<14}{'p50 ms':>9}{'p95 ms':>9}{'conexiones':>12}{'reducción':>11}"
+        )
+        for r in resultados:
+            self.stdout.write(
+                f"{r['modo']:<14}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}"
+                f"{r['conexiones']:>12}{r['reduccion']:>11.1%}"
+            )
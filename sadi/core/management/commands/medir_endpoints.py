@@ -0,0 +1,328 @@
+import json
+import math
+import os
+import statistics
+import time
+import tracemalloc
+from fnmatch import fnmatch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from actividades.models import Actividad
+from metas.models import AvanceMeta, Meta, MetaCiclo
+from reportes.models import TrabajoReporte
+from usuarios.models import Usuario
+
+BASELINE = os.path.join(settings.BASE_DIR, "benchmarks", "endpoints.json")
+
+# Páginas: (nombre, nombre de la URL, parámetros GET, rol del usuario)
+PAGINAS = [
+    ("dashboard", "dashboard", {}, "ADMIN"),
+    ("tabla_seguimiento", "tabla_seguimiento", {}, "ADMIN"),
+    ("gestion_metas", "gestion_metas", {}, "ADMIN"),
+    ("gestion_actividades", "gestion_actividades", {}, "ADMIN"),
+    ("programa_trabajo", "programa_trabajo", {}, "ADMIN"),
+    ("programa_trabajo_pdf", "programa_trabajo_pdf", {}, "ADMIN"),
+    ("reportes", "reportes", {}, "ADMIN"),
+]
+# Reportes: cada uno se mide también con ?exportar. Las exportaciones que son
+# trabajos de reportes (y el PDF del programa de trabajo) se generan en la
+# petición y se descartan antes de cada una para medir la generación y no la
+# redirección al trabajo ya terminado
+REPORTES = [
+    ("reporte_metas_departamento", "ADMIN"),
+    ("reporte_programas", "ADMIN"),
+    ("reporte_avances_metas", "ADMIN"),
+    ("reporte_riesgos", "ADMIN"),
+    ("reporte_docente", "DOCENTE"),
+]
+# Listados de los ViewSets de DRF (basename de cada router)
+API = [
+    "metas",
+    "avances-meta",
+    "metas-comprometidas",
+    "actividad",
+    "evidencia",
+    "solicitud_reapertura",
+    "departamento",
+    "objetivos",
+    "programas",
+    "ciclos",
+    "proyectos",
+    "riesgos",
+    "mitigaciones",
+    "usuarios",
+]
+
+
+def endpoints():
+    """[(nombre, url con sus parámetros, rol)] de todo lo que se mide."""
+    lista = [(nombre, url, parametros, rol) for nombre, url, parametros, rol in PAGINAS]
+    for url, rol in REPORTES:
+        lista.append((url, url, {}, rol))
+        lista.append((f"{url}_exportar", url, {"exportar": 1}, rol))
+    for basename in API:
+        lista.append((f"api_{basename}", f"{basename}-list", {}, "ADMIN"))
+    return [
+        (
+            nombre,
+            reverse(url) + (f"?{urlencode(parametros)}" if parametros else ""),
+            rol,
+        )
+        for nombre, url, parametros, rol in lista
+    ]
+
+
+def genera_trabajo(nombre):
+    """True si el endpoint crea (o reutiliza) un TrabajoReporte."""
+    return nombre.endswith("_exportar") or nombre == "programa_trabajo_pdf"
+
+
+def descartar_trabajos(desde):
+    """
+    Borra los trabajos de reportes para que la siguiente petición genere el
+    suyo. Las filas vuelven con el rollback de la medición; los archivos
+    generados desde `desde` no, así que se eliminan aquí.
+    """
+    generados = TrabajoReporte.objects.filter(fecha_creacion__gte=desde).exclude(
+        archivo=""
+    )
+    for trabajo in generados:
+        trabajo.archivo.delete(save=False)
+    TrabajoReporte.objects.all().delete()
+
+
+def percentil(valores, p):
+    """Percentil p (rango más cercano) de los valores."""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def pedir(cliente, url):
+    respuesta = cliente.get(url)
+    # Las respuestas por streaming (exportaciones) se generan al leerlas
+    if respuesta.streaming:
+        b"".join(respuesta.streaming_content)
+    return respuesta
+
+
+def medir_endpoint(cliente, url, repeticiones, preparar=None):
+    """
+    Latencia p50/p95 (ms) de `repeticiones` peticiones después de una de
+    calentamiento, consultas SQL por petición y pico de memoria asignada
+    (tracemalloc, en una petición aparte para no afectar los tiempos).
+    `preparar` se llama antes de cada petición, fuera de la medición.
+    """
+    preparar = preparar or (lambda: None)
+    preparar()
+    respuesta = pedir(cliente, url)
+    tiempos = []
+    consultas = 0
+    for _ in range(repeticiones):
+        preparar()
+        # El registro de consultas tiene un máximo: se vacía en cada petición
+        reset_queries()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            pedir(cliente, url)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas = max(consultas, len(capturadas))
+
+    preparar()
+    tracemalloc.start()
+    try:
+        pedir(cliente, url)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "url": url,
+        "estado": respuesta.status_code,
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(percentil(tiempos, 95), 2),
+        "consultas": consultas,
+        "memoria_pico_kb": round(pico / 1024, 1),
+    }
+
+
+def comparar(base, actual, umbral, umbral_consultas=0, minimo_ms=2.0):
+    """
+    Regresiones de `actual` respecto a `base` ({nombre: métricas}): latencia o
+    memoria más de `umbral` (fracción) por encima de la base, o más de
+    `umbral_consultas` consultas adicionales. Las diferencias de latencia
+    menores a `minimo_ms` se consideran ruido.
+    """
+    regresiones = []
+    for nombre, metricas in actual.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            continue
+        for campo in ("p50_ms", "p95_ms", "memoria_pico_kb"):
+            limite = anterior[campo] * (1 + umbral)
+            if campo.endswith("_ms"):
+                limite = max(limite, anterior[campo] + minimo_ms)
+            if metricas[campo] > limite:
+                regresiones.append((nombre, campo, anterior[campo], metricas[campo]))
+        if metricas["consultas"] > anterior["consultas"] + umbral_consultas:
+            regresiones.append(
+                (nombre, "consultas", anterior["consultas"], metricas["consultas"])
+            )
+    return regresiones
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide con el cliente de pruebas de Django las páginas principales, los "
+        "reportes (con y sin exportar) y las APIs sobre los datos de la base "
+        "(ver generar_datos): latencia p50/p95, consultas y pico de memoria. "
+        "Guarda el resultado como línea base o lo compara con la guardada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=20,
+            help="Peticiones medidas por endpoint",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=BASELINE,
+            help="Archivo JSON con la línea base",
+        )
+        parser.add_argument(
+            "--actualizar",
+            action="store_true",
+            help="Guarda el resultado como nueva línea base en lugar de compararlo",
+        )
+        parser.add_argument(
+            "--umbral",
+            type=float,
+            default=0.2,
+            help="Aumento (fracción) de latencia o memoria que es una regresión",
+        )
+        parser.add_argument(
+            "--umbral-consultas",
+            type=int,
+            default=0,
+            help="Consultas adicionales permitidas por endpoint",
+        )
+        parser.add_argument(
+            "--solo",
+            action="append",
+            help="Mide solo los endpoints cuyo nombre coincide (admite *)",
+        )
+
+    def usuarios(self):
+        """Usuario de cada rol: el ADMIN se crea (se descarta al terminar)."""
+        docente = (
+            Usuario.objects.filter(role="DOCENTE", departamento__isnull=False)
+            .order_by("id")
+            .first()
+        )
+        admin = Usuario.objects.create_user(
+            username="medir_endpoints",
+            email="medir_endpoints@sadi.test",
+            password=None,
+            role="ADMIN",
+        )
+        return {"ADMIN": admin, "DOCENTE": docente}
+
+    def handle(self, *args, **options):
+        if not MetaCiclo.objects.exists():
+            raise CommandError(
+                "No hay datos que medir; genéralos antes con generar_datos"
+            )
+
+        lista = [
+            e
+            for e in endpoints()
+            if not options["solo"] or any(fnmatch(e[0], p) for p in options["solo"])
+        ]
+        resultados = {}
+        inicio = timezone.now()
+        # Todo (usuarios, sesiones, trabajos de reportes) se revierte al terminar
+        with transaction.atomic(), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            REPORTES_EN_SEGUNDO_PLANO=False,
+        ):
+            self.stdout.write(
+                f"{'endpoint':<36}{'HTTP':>4}{'p50 ms':>10}{'p95 ms':>10}"
+                f"{'SQL':>6}{'memoria KB':>11}"
+            )
+            usuarios = self.usuarios()
+            clientes = {}
+            for rol, usuario in usuarios.items():
+                if usuario is not None:
+                    clientes[rol] = Client()
+                    clientes[rol].force_login(usuario)
+            for nombre, url, rol in lista:
+                if rol not in clientes:
+                    self.stdout.write(f"{nombre}: sin usuario {rol}, se omite")
+                    continue
+                resultados[nombre] = medir_endpoint(
+                    clientes[rol],
+                    url,
+                    max(1, options["repeticiones"]),
+                    (
+                        (lambda: descartar_trabajos(inicio))
+                        if genera_trabajo(nombre)
+                        else None
+                    ),
+                )
+                r = resultados[nombre]
+                self.stdout.write(
+                    f"{nombre:<36}{r['estado']:>4}{r['p50_ms']:>10.1f}"
+                    f"{r['p95_ms']:>10.1f}{r['consultas']:>6}{r['memoria_pico_kb']:>11.0f}"
+                )
+            descartar_trabajos(inicio)
+            transaction.set_rollback(True)
+
+        datos = {
+            "fecha": timezone.now().isoformat(),
+            "base_de_datos": connection.vendor,
+            "repeticiones": options["repeticiones"],
+            "datos": {
+                "metas": Meta.objects.count(),
+                "avances": AvanceMeta.objects.count(),
+                "actividades": Actividad.objects.count(),
+            },
+            "endpoints": resultados,
+        }
+        ruta = options["baseline"]
+        if options["actualizar"] or not os.path.exists(ruta):
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+            with open(ruta, "w", encoding="utf-8") as archivo:
+                json.dump(datos, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {ruta}"))
+            return
+
+        with open(ruta, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        if base["datos"] != datos["datos"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Los datos no son los de la línea base: {base['datos']} "
+                    f"contra {datos['datos']}"
+                )
+            )
+        regresiones = comparar(
+            base["endpoints"],
+            resultados,
+            options["umbral"],
+            options["umbral_consultas"],
+        )
+        if regresiones:
+            for nombre, campo, anterior, actual in regresiones:
+                self.stderr.write(f"{nombre}: {campo} {anterior} -> {actual}")
+            raise CommandError(
+                f"{len(regresiones)} regresiones respecto a {ruta} "
+                f"(umbral {options['umbral']:.0%})"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Sin regresiones respecto a {ruta}"))
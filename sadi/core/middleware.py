@@ -0,0 +1,218 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger("core.sql")
+
+# Listas de parámetros de IN (...) y literales que quedan en el SQL: dos
+# consultas con la misma huella solo difieren en sus valores
+LISTA_PARAMETROS = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def huella(sql):
+    """Forma de la consulta, sin los valores."""
+    sql = LISTA_PARAMETROS.sub("(%s, ...)", sql)
+    return " ".join(LITERAL.sub("?", sql).split())
+
+
+class RegistroConsultas:
+    """Envoltura de execute() (connection.execute_wrapper) que mide cada consulta."""
+
+    def __init__(self):
+        self.consultas = Counter()
+        self.tiempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.consultas[sql] += 1
+
+    def repetidas(self, umbral):
+        """[(huella, veces)] de las formas de SQL ejecutadas más de `umbral` veces."""
+        por_huella = Counter()
+        for sql, veces in self.consultas.items():
+            por_huella[huella(sql)] += veces
+        return [
+            (sql, veces) for sql, veces in por_huella.most_common() if veces > umbral
+        ]
+
+
+class AcumuladorSQL:
+    """
+    Suma las métricas de las peticiones de este proceso por (hora, endpoint)
+    y las vuelca a MetricaSQL cada `intervalo` segundos: una escritura por
+    endpoint y volcado en lugar de una por petición.
+    """
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.lock = threading.Lock()
+        self.pendientes = {}
+        self.ultimo_volcado = time.monotonic()
+
+    def registrar(self, endpoint, consultas, tiempo_db_ms, tiempo_total_ms, repetidas):
+        hora = timezone.now().replace(minute=0, second=0, microsecond=0)
+        with self.lock:
+            fila = self.pendientes.setdefault(
+                (hora, endpoint),
+                {
+                    "peticiones": 0,
+                    "consultas": 0,
+                    "consultas_max": 0,
+                    "tiempo_db_ms": 0.0,
+                    "tiempo_total_ms": 0.0,
+                    "peticiones_n_mas_1": 0,
+                    "consulta_repetida": "",
+                },
+            )
+            fila["peticiones"] += 1
+            fila["consultas"] += consultas
+            fila["consultas_max"] = max(fila["consultas_max"], consultas)
+            fila["tiempo_db_ms"] += tiempo_db_ms
+            fila["tiempo_total_ms"] += tiempo_total_ms
+            if repetidas:
+                fila["peticiones_n_mas_1"] += 1
+                fila["consulta_repetida"] = repetidas[0][0]
+            volcar = time.monotonic() - self.ultimo_volcado >= self.intervalo
+            if volcar:
+                pendientes, self.pendientes = self.pendientes, {}
+                self.ultimo_volcado = time.monotonic()
+        if volcar:
+            self.volcar(pendientes)
+
+    def volcar(self, pendientes):
+        from .models import MetricaSQL
+
+        for (hora, endpoint), fila in pendientes.items():
+            cambios = {
+                "peticiones": F("peticiones") + fila["peticiones"],
+                "consultas": F("consultas") + fila["consultas"],
+                "consultas_max": Greatest("consultas_max", fila["consultas_max"]),
+                "tiempo_db_ms": F("tiempo_db_ms") + fila["tiempo_db_ms"],
+                "tiempo_total_ms": F("tiempo_total_ms") + fila["tiempo_total_ms"],
+                "peticiones_n_mas_1": F("peticiones_n_mas_1")
+                + fila["peticiones_n_mas_1"],
+            }
+            if fila["consulta_repetida"]:
+                cambios["consulta_repetida"] = fila["consulta_repetida"]
+            filas = MetricaSQL.objects.filter(hora=hora, endpoint=endpoint)
+            try:
+                if not filas.update(**cambios):
+                    try:
+                        MetricaSQL.objects.create(hora=hora, endpoint=endpoint, **fila)
+                    except IntegrityError:
+                        # Otro proceso creó la fila al mismo tiempo
+                        filas.update(**cambios)
+            except DatabaseError as e:
+                logger.warning(f"No se pudieron guardar las métricas SQL: {e}")
+                return
+
+
+acumulador = AcumuladorSQL(settings.SQL_METRICAS_INTERVALO)
+
+
+def endpoints_mas_costosos(horas, orden="consultas", limite=10):
+    """
+    Endpoints de las últimas `horas` horas ordenados por total de consultas
+    o de tiempo en la base de datos ("tiempo_db_ms"), con sus promedios.
+    """
+    from .models import MetricaSQL
+
+    desde = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(
+        hours=horas - 1
+    )
+    filas = (
+        MetricaSQL.objects.filter(hora__gte=desde)
+        .values("endpoint")
+        .annotate(
+            peticiones=Sum("peticiones"),
+            consultas=Sum("consultas"),
+            consultas_max=Max("consultas_max"),
+            tiempo_db_ms=Sum("tiempo_db_ms"),
+            tiempo_total_ms=Sum("tiempo_total_ms"),
+            peticiones_n_mas_1=Sum("peticiones_n_mas_1"),
+        )
+        .order_by(f"-{orden}")[:limite]
+    )
+    return [
+        {
+            **fila,
+            "consultas_promedio": round(fila["consultas"] / fila["peticiones"], 1),
+            "tiempo_db_promedio_ms": round(
+                fila["tiempo_db_ms"] / fila["peticiones"], 1
+            ),
+        }
+        for fila in filas
+    ]
+
+
+class InstrumentacionSQLMiddleware:
+    """
+    Mide las consultas SQL de cada petición: cantidad, tiempo total en la
+    base de datos y formas de SQL repetidas (posible N+1 si una se repite más
+    de SQL_N_MAS_1_UMBRAL veces). Escribe una línea JSON por petición en el
+    logger "core.sql" y acumula las métricas por endpoint (ver MetricaSQL).
+    Las consultas de las respuestas por streaming que se hacen al enviar el
+    contenido no se cuentan.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activa = settings.SQL_INSTRUMENTACION
+        self.umbral = settings.SQL_N_MAS_1_UMBRAL
+
+    def __call__(self, request):
+        if not self.activa:
+            return self.get_response(request)
+
+        registro = RegistroConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(registro))
+            response = self.get_response(request)
+        tiempo_total_ms = (time.perf_counter() - inicio) * 1000
+
+        coincidencia = getattr(request, "resolver_match", None)
+        vista = coincidencia.view_name if coincidencia else "<sin ruta>"
+        endpoint = f"{request.method} {vista}"
+        consultas = sum(registro.consultas.values())
+        tiempo_db_ms = registro.tiempo * 1000
+        repetidas = registro.repetidas(self.umbral)
+
+        nivel = logging.WARNING if repetidas else logging.INFO
+        logger.log(
+            nivel,
+            json.dumps(
+                {
+                    "endpoint": endpoint,
+                    "ruta": request.path,
+                    "status": response.status_code,
+                    "consultas": consultas,
+                    "tiempo_db_ms": round(tiempo_db_ms, 1),
+                    "tiempo_total_ms": round(tiempo_total_ms, 1),
+                    "n_mas_1": [
+                        {"sql": sql[:300], "veces": veces} for sql, veces in repetidas
+                    ],
+                },
+                ensure_ascii=False,
+            ),
+        )
+        acumulador.registrar(
+            endpoint, consultas, tiempo_db_ms, tiempo_total_ms, repetidas
+        )
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricaSQL",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hora", models.DateTimeField()),
+                ("endpoint", models.CharField(max_length=200)),
+                ("peticiones", models.PositiveIntegerField(default=0)),
+                ("consultas", models.PositiveIntegerField(default=0)),
+                ("consultas_max", models.PositiveIntegerField(default=0)),
+                ("tiempo_db_ms", models.FloatField(default=0)),
+                ("tiempo_total_ms", models.FloatField(default=0)),
+                ("peticiones_n_mas_1", models.PositiveIntegerField(default=0)),
+                ("consulta_repetida", models.TextField(blank=True, default="")),
+            ],
+            options={
+                "verbose_name": "métrica SQL",
+                "verbose_name_plural": "métricas SQL",
+                "unique_together": {("hora", "endpoint")},
+            },
+        ),
+    ]
@@ -6,3 +6,31 @@ class ConfiguracionGlobal(models.Model):
 
     def __str__(self):
         return "Configuración Global"
+
+
+class MetricaSQL(models.Model):
+    """
+    Consultas SQL por endpoint y por hora, acumuladas por
+    core.middleware.InstrumentacionSQLMiddleware.
+    """
+
+    hora = models.DateTimeField()
+    # "GET app:vista" (nombre de la URL) o "GET <sin ruta>"
+    endpoint = models.CharField(max_length=200)
+    peticiones = models.PositiveIntegerField(default=0)
+    consultas = models.PositiveIntegerField(default=0)
+    consultas_max = models.PositiveIntegerField(default=0)
+    tiempo_db_ms = models.FloatField(default=0)
+    tiempo_total_ms = models.FloatField(default=0)
+    # Peticiones en las que una misma forma de SQL se repitió más veces que
+    # SQL_N_MAS_1_UMBRAL, y la última de esas consultas
+    peticiones_n_mas_1 = models.PositiveIntegerField(default=0)
+    consulta_repetida = models.TextField(blank=True, default="")
+
+    class Meta:
+        unique_together = ("hora", "endpoint")
+        verbose_name = "métrica SQL"
+        verbose_name_plural = "métricas SQL"
+
+    def __str__(self):
+        return f"{self.endpoint} ({self.hora:%Y-%m-%d %H:00})"
@@ -0,0 +1,55 @@
+# signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from actividades.models import Actividad
+from metas.models import AvanceMeta, Meta, MetaCiclo
+from objetivos.models import ObjetivoEstrategico
+from programas.models import Ciclo, ProgramaEstrategico
+from proyectos.models import Proyecto
+from .cache import incrementar_version_datos, incrementar_version_sistema
+from .context_processors import ESTADO_GLOBAL
+from .models import ConfiguracionGlobal
+
+# Modelos cuyos cambios invalidan los datos en caché (dashboard, etc.)
+MODELOS_VERSIONADOS = (AvanceMeta, MetaCiclo, Actividad, Meta, Proyecto, Ciclo)
+
+# Modelos de los que dependen los context processors (estado del sistema y
+# de la captura)
+MODELOS_SISTEMA = (
+    ProgramaEstrategico,
+    Ciclo,
+    ObjetivoEstrategico,
+    Proyecto,
+    Meta,
+    ConfiguracionGlobal,
+)
+
+
+def invalidar_cache_datos(sender, raw=False, **kwargs):
+    if raw:
+        return
+    # Se incrementa al confirmar la transacción para que ninguna petición
+    # guarde en caché datos que todavía no son visibles
+    transaction.on_commit(incrementar_version_datos)
+
+
+def actualizar_estado_sistema():
+    incrementar_version_sistema()
+    # Este proceso recalcula en la siguiente petición; los demás, al leer la
+    # versión (cada ESTADO_SISTEMA_TIMEOUT segundos)
+    ESTADO_GLOBAL.clear()
+
+
+def invalidar_estado_sistema(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(actualizar_estado_sistema)
+
+
+for modelo in MODELOS_VERSIONADOS:
+    post_save.connect(invalidar_cache_datos, sender=modelo)
+    post_delete.connect(invalidar_cache_datos, sender=modelo)
+
+for modelo in MODELOS_SISTEMA:
+    post_save.connect(invalidar_estado_sistema, sender=modelo)
+    post_delete.connect(invalidar_estado_sistema, sender=modelo)
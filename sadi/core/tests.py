@@ -1,3 +1,729 @@
-from django.test import TestCase
+import datetime as dt
+import json
+import os
+import re
+import tempfile
+from io import StringIO
+from unittest import mock
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from actividades.models import Actividad
+from departamentos.models import Departamento
+from metas.models import AvanceMeta, Meta, MetaCiclo, ResumenCumplimiento
+from metas.utils import consulta_progreso
+from objetivos.models import ObjetivoEstrategico
+from programas.models import Ciclo, ProgramaEstrategico
+from proyectos.models import Proyecto
+from reportes.models import TrabajoReporte
+from reportes.views import consulta_metas_departamento, generar_metas_departamento
+from riesgos.models import Mitigacion, Riesgo
+from usuarios.models import Usuario
+from .cache import (
+    estadisticas,
+    estadisticas_cache,
+    incrementar_version_datos,
+    incrementar_version_sistema,
+    version_datos,
+)
+from .checks import CACHES_POR_PROCESO, cache_compartida
+from .conexiones import estadisticas_conexiones
+from .context_processors import ESTADO_GLOBAL, estado_captura, estado_sistema
+from .management.commands.medir_arranque import medir_arranque
+from .management.commands.medir_endpoints import comparar
+from .middleware import InstrumentacionSQLMiddleware, acumulador, huella
+from .models import ConfiguracionGlobal, MetricaSQL
 
-# Create your tests here.
+
+class ContextProcessorsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ESTADO_GLOBAL.clear()
+        self.session = {}
+
+    def contexto(self):
+        request = RequestFactory().get("/")
+        request.session = self.session
+        return {**estado_sistema(request), **estado_captura(request)}
+
+    def test_sin_consultas_con_estado_en_cache(self):
+        self.contexto()
+        # Ni siquiera la lectura de la versión en la caché compartida
+        with self.assertNumQueries(0):
+            contexto = self.contexto()
+        self.assertTrue(contexto["captura_activa"])
+        self.assertFalse(contexto["estado_sistema"]["hay_ciclos"])
+
+    def test_pasado_el_intervalo_solo_lee_la_version(self):
+        self.contexto()
+        with override_settings(ESTADO_SISTEMA_TIMEOUT=0), CaptureQueriesContext(
+            connection
+        ) as consultas:
+            self.contexto()
+        self.assertEqual(len(consultas), 1)
+        self.assertIn(settings.CACHES["default"]["LOCATION"], consultas[0]["sql"])
+
+    def test_cambios_invalidan_el_estado(self):
+        self.contexto()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            programa = ProgramaEstrategico.objects.create(
+                clave="P1",
+                nombre="Programa",
+                nombre_corto="PR",
+                fecha_inicio=dt.date(2025, 1, 1),
+                fecha_fin=dt.date(2025, 12, 31),
+                duracion=1,
+            )
+            ciclo = Ciclo.objects.create(
+                fecha_inicio=dt.date(2025, 1, 1),
+                fecha_fin=dt.date(2025, 12, 31),
+                programa=programa,
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            cfg = ConfiguracionGlobal.objects.get()
+            cfg.captura_activa = False
+            cfg.save()
+
+        self.session["ciclo_id"] = ciclo.id
+        contexto = self.contexto()
+        self.assertFalse(contexto["captura_activa"])
+        self.assertTrue(contexto["estado_sistema"]["hay_programas"])
+        self.assertTrue(contexto["estado_sistema"]["ciclo_activo"])
+
+    def test_cambio_en_otro_proceso(self):
+        self.assertFalse(self.contexto()["estado_sistema"]["hay_programas"])
+        # Sin ejecutar los on_commit: este proceso no se entera del cambio...
+        ProgramaEstrategico.objects.create(
+            clave="P1",
+            nombre="Programa",
+            nombre_corto="PR",
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            duracion=1,
+        )
+        self.assertFalse(self.contexto()["estado_sistema"]["hay_programas"])
+        # ...el proceso que lo hizo incrementa la versión compartida y este la
+        # lee al terminar el intervalo de ESTADO_SISTEMA_TIMEOUT
+        incrementar_version_sistema()
+        self.assertFalse(self.contexto()["estado_sistema"]["hay_programas"])
+        with override_settings(ESTADO_SISTEMA_TIMEOUT=0):
+            self.assertTrue(self.contexto()["estado_sistema"]["hay_programas"])
+
+
+class CacheDatosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        estadisticas.reiniciar()
+        programa = ProgramaEstrategico.objects.create(
+            clave="P1",
+            nombre="Programa",
+            nombre_corto="PR",
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            duracion=1,
+        )
+        self.ciclo = Ciclo.objects.create(
+            programa=programa,
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+        )
+        objetivo = ObjetivoEstrategico.objects.create(
+            descripcion="Objetivo", programa=programa
+        )
+        proyecto = Proyecto.objects.create(
+            clave="PY1", nombre="Proyecto", objetivo=objetivo
+        )
+        self.departamento = Departamento.objects.create(nombre="Física")
+        self.meta = Meta.objects.create(
+            clave="M1",
+            proyecto=proyecto,
+            departamento=self.departamento,
+            indicador="Indicador",
+            unidadMedida="Porcentaje",
+            metodoCalculo="Suma",
+        )
+        self.admin = Usuario.objects.create_user("admin", role="ADMIN")
+        self.client.force_login(self.admin)
+
+    def crear_actividad(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Actividad.objects.create(
+                nombre="Taller",
+                descripcion="Taller",
+                fecha_inicio=dt.date(2025, 2, 1),
+                fecha_fin=dt.date(2025, 3, 1),
+                meta=self.meta,
+                ciclo=self.ciclo,
+                responsable=self.admin,
+                departamento=self.departamento,
+            )
+
+    def test_guardar_incrementa_la_version(self):
+        version = version_datos()
+        self.crear_actividad()
+        self.assertGreater(version_datos(), version)
+
+    def test_dashboard_se_recalcula_al_cambiar_los_datos(self):
+        self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+        respuesta = self.client.get(reverse("dashboard"))
+        self.assertEqual(respuesta.context["total_actividades"], 0)
+        self.assertEqual(
+            (
+                estadisticas_cache("dashboard")["hits"],
+                estadisticas_cache("dashboard")["misses"],
+            ),
+            (1, 1),
+        )
+
+        self.crear_actividad()
+        respuesta = self.client.get(reverse("dashboard"))
+        self.assertEqual(respuesta.context["total_actividades"], 1)
+        self.assertEqual(estadisticas_cache("dashboard")["misses"], 2)
+
+    def test_acierto_sin_escrituras_en_la_cache(self):
+        self.client.get(reverse("dashboard"))
+        self.client.get(reverse("dashboard"))
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse("dashboard"))
+
+        tabla = settings.CACHES["default"]["LOCATION"]
+        escrituras = [
+            c["sql"]
+            for c in consultas
+            if tabla in c["sql"] and not c["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(escrituras, [])
+        # Los aciertos de este proceso se suman al consultar las estadísticas
+        self.assertEqual(estadisticas_cache("dashboard")["hits"], 2)
+
+    def crear_metas(self, cantidad):
+        """Metas con avances, cada una en su proyecto (los resúmenes crecen)."""
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(cantidad):
+                proyecto = Proyecto.objects.create(
+                    clave=f"PX{Proyecto.objects.count()}",
+                    nombre="Proyecto",
+                    objetivo=self.meta.proyecto.objetivo,
+                )
+                meta = Meta.objects.create(
+                    clave=f"MX{Meta.objects.count()}",
+                    proyecto=proyecto,
+                    departamento=self.departamento,
+                    indicador="Indicador",
+                    unidadMedida="Porcentaje",
+                    metodoCalculo="Suma",
+                    acumulable=i % 2 == 0,
+                )
+                MetaCiclo.objects.create(
+                    meta=meta, ciclo=self.ciclo, metaCumplir=Decimal("10")
+                )
+                for mes in range(1, 4):
+                    AvanceMeta.objects.create(
+                        metaCumplir=meta,
+                        ciclo=self.ciclo,
+                        avance=Decimal(mes),
+                        fecha_registro=dt.date(2025, mes, 10),
+                    )
+
+    def consultas_dashboard(self):
+        """Consultas del dashboard calculado (sin usar la caché)."""
+        incrementar_version_datos()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+        return len(consultas)
+
+    def test_consultas_del_dashboard_no_crecen_con_las_metas(self):
+        self.crear_metas(1)
+        # La primera petición crea la configuración y la sesión
+        self.consultas_dashboard()
+        base = self.consultas_dashboard()
+
+        self.crear_metas(10)
+        # Las metas nuevas cambian el estado del sistema: se recalcula una vez
+        self.consultas_dashboard()
+        incrementar_version_datos()
+        with self.assertNumQueries(base):
+            respuesta = self.client.get(reverse("dashboard"))
+        self.assertEqual(respuesta.context["total_metas"], 11)
+        self.assertEqual(respuesta.context["total_proyectos"], 11)
+
+
+class CacheCompartidaCheckTests(SimpleTestCase):
+    def test_avisa_con_cache_por_proceso(self):
+        locmem = {"default": {"BACKEND": CACHES_POR_PROCESO[0]}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([a.id for a in cache_compartida(None)], ["core.W001"])
+        with override_settings(DEBUG=True, CACHES=locmem):
+            self.assertEqual(cache_compartida(None), [])
+        # La caché por defecto (DatabaseCache) se comparte
+        with override_settings(DEBUG=False):
+            self.assertEqual(cache_compartida(None), [])
+
+
+class ArranqueTests(SimpleTestCase):
+    def test_arranque_sin_stack_del_modelo(self):
+        # torch y transformers solo se cargan al usar el servicio MCP
+        self.assertEqual(medir_arranque()["pesados"], [])
+
+
+class PlanesConsultaTests(TestCase):
+    """
+    EXPLAIN de las consultas más frecuentes de core, metas, reportes y
+    actividades con un volumen de datos realista: ninguna debe recorrer
+    completa una tabla grande, y las que tienen un índice compuesto pensado
+    para ellas deben usarlo.
+    """
+
+    TABLAS_GRANDES = [
+        "metas_avancemeta",
+        "metas_metaciclo",
+        "metas_meta",
+        "actividades_actividad",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        programa = ProgramaEstrategico.objects.create(
+            clave="P1",
+            nombre="Programa",
+            nombre_corto="PR",
+            fecha_inicio=dt.date(2020, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            duracion=6,
+        )
+        cls.ciclos = [
+            Ciclo.objects.create(
+                programa=programa,
+                fecha_inicio=dt.date(anio, 1, 1),
+                fecha_fin=dt.date(anio, 12, 31),
+            )
+            for anio in range(2020, 2026)
+        ]
+        objetivo = ObjetivoEstrategico.objects.create(
+            descripcion="Objetivo", programa=programa
+        )
+        proyecto = Proyecto.objects.create(
+            clave="PY1", nombre="Proyecto", objetivo=objetivo
+        )
+        cls.departamentos = [
+            Departamento.objects.create(nombre=f"Departamento {i}") for i in range(12)
+        ]
+        responsables = [
+            Usuario.objects.create_user(
+                f"docente{i}", role="DOCENTE", departamento=departamento
+            )
+            for i, departamento in enumerate(cls.departamentos)
+        ]
+
+        # 20 metas por departamento, con su MetaCiclo, 2 actividades y 4
+        # avances en cada ciclo (~10 000 filas)
+        metas = Meta.objects.bulk_create(
+            Meta(
+                clave=f"M{i}",
+                nombre=f"Meta {i}",
+                proyecto=proyecto,
+                departamento=cls.departamentos[i % 12],
+                indicador="Indicador",
+                unidadMedida="Porcentaje",
+                metodoCalculo="Suma",
+            )
+            for i in range(240)
+        )
+        MetaCiclo.objects.bulk_create(
+            MetaCiclo(meta=meta, ciclo=ciclo, metaCumplir=Decimal(10))
+            for meta in metas
+            for ciclo in cls.ciclos
+        )
+        estados = [estado for estado, _ in Actividad.ESTADOS]
+        Actividad.objects.bulk_create(
+            Actividad(
+                nombre=f"Actividad {meta.id}-{ciclo.id}-{j}",
+                descripcion="Descripción",
+                estado=estados[(meta.id + j) % len(estados)],
+                fecha_inicio=ciclo.fecha_inicio,
+                fecha_fin=ciclo.fecha_fin,
+                meta=meta,
+                ciclo=ciclo,
+                departamento=meta.departamento,
+                responsable=responsables[meta.departamento_id % 12],
+            )
+            for meta in metas
+            for ciclo in cls.ciclos
+            for j in range(2)
+        )
+        AvanceMeta.objects.bulk_create(
+            AvanceMeta(
+                metaCumplir=meta,
+                ciclo=ciclo,
+                departamento=meta.departamento,
+                avance=Decimal(j),
+                fecha_registro=ciclo.fecha_inicio.replace(month=j * 3 + 1),
+            )
+            for meta in metas
+            for ciclo in cls.ciclos
+            for j in range(4)
+        )
+        cls.meta = metas[0]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # Con tablas de este tamaño PostgreSQL puede preferir el recorrido
+            # secuencial aunque exista el índice: lo que se comprueba es que
+            # haya un índice utilizable
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def recorridos_secuenciales(self, plan):
+        """Tablas grandes que el plan recorre completas."""
+        if connection.vendor == "postgresql":
+            tablas = re.findall(r"Seq Scan on (\w+)", plan)
+        else:
+            # SQLite: "SCAN tabla" sin índice; con índice es "SEARCH ..." o
+            # "SCAN tabla USING [COVERING] INDEX ..."
+            tablas = re.findall(r"SCAN (\w+)(?! USING (?:COVERING )?INDEX)\b", plan)
+        return [tabla for tabla in tablas if tabla in self.TABLAS_GRANDES]
+
+    def assertSinRecorridoSecuencial(self, queryset, indice=None):
+        plan = queryset.explain()
+        self.assertEqual(self.recorridos_secuenciales(plan), [], plan)
+        if indice:
+            self.assertIn(indice, plan)
+
+    def test_core(self):
+        ciclo, departamento = self.ciclos[-1], self.departamentos[0]
+        conteos = {
+            "cumplidas": Count("id", filter=Q(estado="Cumplida")),
+            "activas": Count("id", filter=Q(estado="Activa")),
+        }
+        # Tablero: contadores de actividades del ciclo (global y por departamento)
+        for actividades in [
+            Actividad.objects.filter(ciclo=ciclo),
+            Actividad.objects.filter(departamento=departamento, ciclo=ciclo),
+        ]:
+            self.assertSinRecorridoSecuencial(
+                actividades.values("ciclo").annotate(**conteos),
+                "actividad_ciclo_depto_estado",
+            )
+
+    def test_metas(self):
+        ciclo, departamento = self.ciclos[-1], self.departamentos[0]
+        # Avances de una meta en el ciclo, del más reciente al más antiguo
+        self.assertSinRecorridoSecuencial(
+            AvanceMeta.objects.filter(metaCumplir=self.meta, ciclo=ciclo).order_by(
+                "-fecha_registro"
+            ),
+            "avancemeta_meta_ciclo_fecha",
+        )
+        self.assertSinRecorridoSecuencial(
+            MetaCiclo.objects.filter(meta=self.meta, ciclo=ciclo)
+        )
+        # Progreso del ciclo (suma y último avance por subconsulta)
+        self.assertSinRecorridoSecuencial(
+            consulta_progreso(ciclo), "avancemeta_meta_ciclo_fecha"
+        )
+        self.assertSinRecorridoSecuencial(
+            consulta_progreso(ciclo, departamento=departamento)
+        )
+
+    def test_reportes(self):
+        ciclo, departamento = self.ciclos[-1], self.departamentos[0]
+        self.assertSinRecorridoSecuencial(
+            consulta_metas_departamento(departamento.id, ciclo.id)
+        )
+        # Consultas de los Prefetch de los reportes por ciclo
+        metas = list(Meta.objects.filter(departamento=departamento))
+        self.assertSinRecorridoSecuencial(
+            AvanceMeta.objects.filter(ciclo=ciclo, metaCumplir__in=metas).order_by(
+                "fecha_registro"
+            ),
+            "avancemeta_meta_ciclo_fecha",
+        )
+        self.assertSinRecorridoSecuencial(
+            MetaCiclo.objects.filter(ciclo=ciclo, meta__in=metas),
+        )
+        self.assertSinRecorridoSecuencial(
+            Actividad.objects.filter(ciclo=ciclo, meta__in=metas).select_related(
+                "responsable"
+            )
+        )
+
+    def test_actividades(self):
+        ciclo, departamento = self.ciclos[-1], self.departamentos[0]
+        self.assertSinRecorridoSecuencial(
+            Actividad.objects.filter(departamento=departamento, ciclo=ciclo),
+            "actividad_ciclo_depto_estado",
+        )
+        self.assertSinRecorridoSecuencial(
+            Actividad.objects.filter(meta=self.meta, ciclo=ciclo)
+        )
+
+
+class InstrumentacionSQLTests(TestCase):
+    def vista_n_mas_1(self, request):
+        for anio in range(2020, 2027):
+            Ciclo.objects.filter(fecha_inicio__year=anio).first()
+        return HttpResponse("ok")
+
+    def test_huella(self):
+        self.assertEqual(
+            huella('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "x" = \'a\''),
+            huella('SELECT * FROM "t" WHERE "id" IN (%s) AND "x" = \'b\''),
+        )
+
+    @mock.patch.object(acumulador, "intervalo", 0)
+    def test_detecta_n_mas_1_y_acumula(self):
+        middleware = InstrumentacionSQLMiddleware(self.vista_n_mas_1)
+        request = RequestFactory().get("/ciclos/")
+        request.resolver_match = mock.Mock(view_name="ciclos")
+
+        with self.assertLogs("core.sql", "WARNING") as logs:
+            middleware(request)
+        linea = json.loads(logs.records[0].getMessage())
+        self.assertEqual(linea["endpoint"], "GET ciclos")
+        self.assertEqual(linea["consultas"], 7)
+        self.assertEqual(linea["n_mas_1"][0]["veces"], 7)
+
+        middleware(request)
+        metrica = MetricaSQL.objects.get(endpoint="GET ciclos")
+        self.assertEqual(
+            (metrica.peticiones, metrica.consultas, metrica.peticiones_n_mas_1),
+            (2, 14, 2),
+        )
+        self.assertIn('"programas_ciclo"', metrica.consulta_repetida)
+
+    def test_pagina_admin(self):
+        MetricaSQL.objects.create(
+            hora=timezone.now().replace(minute=0, second=0, microsecond=0),
+            endpoint="GET metas:lista",
+            peticiones=4,
+            consultas=120,
+            tiempo_db_ms=80,
+        )
+        self.client.force_login(
+            Usuario.objects.create_superuser("admin", "admin@sadi.mx", "x")
+        )
+        respuesta = self.client.get(
+            reverse("admin:core_metricasql_changelist"), {"horas": 2}
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            respuesta.context["por_consultas"][0]["consultas_promedio"], 30
+        )
+
+
+class GenerarDatosTests(TestCase):
+    opciones = [
+        "--departamentos=3",
+        "--ciclos=2",
+        "--objetivos=2",
+        "--proyectos=2",
+        "--metas=10",
+        "--avances=100",
+        "--riesgos=0.5",
+    ]
+
+    def generar(self, semilla):
+        call_command(
+            "generar_datos", f"--semilla={semilla}", *self.opciones, stdout=StringIO()
+        )
+        return list(
+            AvanceMeta.objects.filter(metaCumplir__clave__startswith=f"S{semilla}-")
+            .order_by("id")
+            .values_list(
+                "metaCumplir__clave", "ciclo__nombre", "avance", "fecha_registro"
+            )
+        )
+
+    def test_jerarquia_e_historial(self):
+        avances = self.generar(1)
+        self.assertEqual(len(avances), 100)
+        self.assertEqual(Meta.objects.count(), 10)
+        self.assertEqual(MetaCiclo.objects.count(), 20)
+        self.assertEqual(Actividad.objects.count(), 40)
+        self.assertEqual(AvanceMeta.history.count(), 100)
+        # Los campos que calcula save() quedan como si se hubiera llamado
+        self.assertEqual(
+            Ciclo.objects.get(fecha_inicio=dt.date(2020, 1, 1)).nombre,
+            "PE1 - 2020-01-01 - 2020-12-31",
+        )
+        self.assertFalse(
+            Riesgo.objects.exclude(riesgo=F("probabilidad") * F("impacto")).exists()
+        )
+        self.assertTrue(ResumenCumplimiento.objects.exists())
+        with self.assertRaises(CommandError):
+            self.generar(1)
+
+    def test_determinista(self):
+        avances = self.generar(5)
+        AvanceMeta.objects.all().delete()
+        Mitigacion.objects.all().delete()
+        Riesgo.objects.all().delete()
+        Actividad.objects.all().delete()
+        Usuario.objects.all().delete()
+        for modelo in [
+            MetaCiclo,
+            Meta,
+            Departamento,
+            Proyecto,
+            ObjetivoEstrategico,
+            Ciclo,
+            ProgramaEstrategico,
+        ]:
+            modelo.objects.all().delete()
+        self.assertEqual(self.generar(5), avances)
+
+
+class MedirEndpointsTests(TestCase):
+    def test_comparar(self):
+        base = {
+            "dashboard": {
+                "p50_ms": 10,
+                "p95_ms": 20,
+                "consultas": 3,
+                "memoria_pico_kb": 100,
+            }
+        }
+        igual = {"dashboard": dict(base["dashboard"], p50_ms=11.5)}
+        self.assertEqual(comparar(base, igual, 0.2), [])
+        peor = {"dashboard": dict(base["dashboard"], p95_ms=30, consultas=4)}
+        self.assertEqual(
+            comparar(base, peor, 0.2),
+            [("dashboard", "p95_ms", 20, 30), ("dashboard", "consultas", 3, 4)],
+        )
+        self.assertEqual(comparar(base, peor, 0.6, umbral_consultas=1), [])
+
+    def test_linea_base(self):
+        call_command(
+            "generar_datos",
+            "--departamentos=2",
+            "--ciclos=1",
+            "--metas=4",
+            "--avances=20",
+            stdout=StringIO(),
+        )
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ruta = os.path.join(directorio.name, "endpoints.json")
+        opciones = [
+            "--repeticiones=2",
+            f"--baseline={ruta}",
+            "--solo=dashboard",
+            "--solo=reporte_riesgos*",
+            "--solo=api_ciclos",
+        ]
+        usuarios = Usuario.objects.count()
+        call_command("medir_endpoints", *opciones, stdout=StringIO())
+        # El usuario de la medición no se queda en la base
+        self.assertEqual(Usuario.objects.count(), usuarios)
+
+        with open(ruta, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        self.assertEqual(
+            sorted(base["endpoints"]),
+            ["api_ciclos", "dashboard", "reporte_riesgos", "reporte_riesgos_exportar"],
+        )
+        self.assertEqual(base["endpoints"]["dashboard"]["estado"], 200)
+
+        # Con una consulta menos en la base, la siguiente corrida es una regresión
+        base["endpoints"]["api_ciclos"]["consultas"] -= 1
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump(base, archivo)
+        with self.assertRaisesMessage(CommandError, "regresiones"):
+            call_command(
+                "medir_endpoints",
+                *opciones,
+                "--umbral=100",
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+
+    def test_exportacion_genera_en_cada_peticion(self):
+        call_command(
+            "generar_datos",
+            "--departamentos=1",
+            "--ciclos=1",
+            "--metas=2",
+            "--avances=4",
+            stdout=StringIO(),
+        )
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ruta = os.path.join(media.name, "endpoints.json")
+
+        with override_settings(
+            MEDIA_ROOT=media.name, REPORTES_EN_SEGUNDO_PLANO=True
+        ), mock.patch(
+            "reportes.views.generar_metas_departamento",
+            wraps=generar_metas_departamento,
+        ) as generar:
+            call_command(
+                "medir_endpoints",
+                "--repeticiones=3",
+                f"--baseline={ruta}",
+                "--solo=reporte_metas_departamento_exportar",
+                stdout=StringIO(),
+            )
+
+        # Calentamiento, repeticiones y la petición de memoria: cada una
+        # genera el reporte en lugar de reutilizar el trabajo terminado
+        self.assertEqual(generar.call_count, 5)
+        self.assertFalse(TrabajoReporte.objects.exists())
+        trabajos = os.path.join(media.name, "reportes", "trabajos")
+        self.assertEqual(os.listdir(trabajos) if os.path.isdir(trabajos) else [], [])
+
+
+class ConexionesTests(TestCase):
+    def test_backend_mide_conexiones(self):
+        from core.db.base import DatabaseWrapper
+
+        ajustes = dict(connection.settings_dict, ENGINE="core.db", OPTIONS={})
+        conexion = DatabaseWrapper(ajustes, alias="medicion")
+        estadisticas_conexiones.reiniciar()
+        self.addCleanup(estadisticas_conexiones.reiniciar)
+        with mock.patch(
+            "django.db.backends.postgresql.base.DatabaseWrapper.get_new_connection",
+            return_value=object(),
+        ):
+            conexion.get_new_connection({})
+            conexion.get_new_connection({})
+        with mock.patch(
+            "django.db.backends.postgresql.base.DatabaseWrapper.get_new_connection",
+            side_effect=OSError,
+        ):
+            with self.assertRaises(OSError):
+                conexion.get_new_connection({})
+        estadisticas = estadisticas_conexiones.estadisticas()
+        self.assertEqual(estadisticas["conexiones"], 2)
+        self.assertEqual(estadisticas["errores"], 1)
+
+    def test_medir_conexiones(self):
+        salida = StringIO()
+        call_command("medir_conexiones", "--peticiones=5", "--json", stdout=salida)
+        resultados = {r["modo"]: r for r in json.loads(salida.getvalue())}
+        # (La base de pruebas de SQLite en memoria nunca se cierra, así que
+        # aquí "por_peticion" también reutiliza su conexión)
+        self.assertEqual(sorted(resultados), ["persistentes", "por_peticion"])
+        self.assertEqual(resultados["persistentes"]["peticiones"], 5)
+        self.assertEqual(resultados["persistentes"]["conexiones"], 1)
+        self.assertEqual(resultados["por_peticion"]["reduccion"], 0)
+
+    def test_estado_conexiones(self):
+        self.client.force_login(
+            Usuario.objects.create_user("admin", "admin@sadi.mx", "x", role="ADMIN")
+        )
+        respuesta = self.client.get(reverse("estado_conexiones"))
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertIsNone(datos["pool"])
+        self.assertIn("tiempo_promedio_ms", datos["conexiones"])
@@ -1,7 +1,18 @@
 from django.urls import path
-from .views import dashboard, cambiar_ciclo_flecha
+from .views import (
+    dashboard,
+    cambiar_ciclo_flecha,
+    estadisticas_cache_dashboard,
+    estado_conexiones_db,
+)
 
 urlpatterns = [
     path("", dashboard, name="dashboard"),
     path("cambiar_ciclo_flecha/", cambiar_ciclo_flecha, name="cambiar_ciclo_flecha"),
+    path(
+        "dashboard/cache/",
+        estadisticas_cache_dashboard,
+        name="estadisticas_cache_dashboard",
+    ),
+    path("conexiones/", estado_conexiones_db, name="estado_conexiones"),
 ]
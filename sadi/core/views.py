@@ -2,11 +2,13 @@ import plotly.express as px
 import plotly.io as pio
 from django.db.models import Count, Q
 import logging
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render
-from metas.models import Meta, MetaCiclo, AvanceMeta
+from core.cache import estadisticas_cache, obtener_o_calcular
+from core.conexiones import estado_conexiones
+from metas.models import ResumenCumplimiento
 from proyectos.models import Proyecto
-from django.db.models import Sum
-from decimal import Decimal
 from objetivos.models import ObjetivoEstrategico
 from actividades.models import Actividad
 from usuarios.decorators import role_required
@@ -26,69 +28,6 @@ def dashboard(request):
     es_admin = usuario.role == "ADMIN"
     es_apoyo = usuario.role == "APOYO"
 
-    # ===================== FUNCIONES AUXILIARES =====================
-    def safe_aggregate(queryset, aggregate_dict, default_value=0):
-        """Maneja errores en agregaciones"""
-        try:
-            result = queryset.aggregate(**aggregate_dict)
-            return {k: v or default_value for k, v in result.items()}
-        except Exception as e:
-            logger.error(f"Error en agregación: {e}")
-            return {k: default_value for k in aggregate_dict.keys()}
-
-    def safe_porcentaje(cumplidas, total):
-        """Calcula porcentaje manejando casos edge"""
-        try:
-            if total == 0:
-                return 0
-            return round((cumplidas / total) * 100, 1)
-        except Exception as e:
-            logger.warning(f"Error calculando porcentaje: {e}")
-            return 0
-
-    def safe_count(queryset):
-        """Cuenta elementos manejando errores"""
-        try:
-            return queryset.count()
-        except Exception as e:
-            logger.error(f"Error contando queryset: {e}")
-            return 0
-
-    def calcular_avance_meta(meta, ciclo):
-        """Calcula el avance real de una meta en un ciclo específico"""
-        try:
-            avances = AvanceMeta.objects.filter(metaCumplir=meta, ciclo=ciclo).order_by(
-                "fecha_registro"
-            )
-
-            if not avances.exists():
-                return Decimal("0")
-
-            if meta.acumulable:
-                # Acumulable: toma el último valor
-                return avances.last().avance or Decimal("0")
-            else:
-                # Incremental: suma todos los avances
-                return avances.aggregate(total=Sum("avance"))["total"] or Decimal("0")
-        except Exception as e:
-            logger.error(f"Error calculando avance para meta {meta.id}: {e}")
-            return Decimal("0")
-
-    def meta_esta_cumplida(meta, ciclo):
-        """Determina si una meta está cumplida basado en su avance vs meta a cumplir"""
-        try:
-            meta_ciclo = MetaCiclo.objects.filter(meta=meta, ciclo=ciclo).first()
-            if not meta_ciclo:
-                return False
-
-            avance_real = calcular_avance_meta(meta, ciclo)
-            meta_cumplir = meta_ciclo.metaCumplir or Decimal("0")
-
-            return avance_real >= meta_cumplir
-        except Exception as e:
-            logger.error(f"Error verificando cumplimiento de meta {meta.id}: {e}")
-            return False
-
     # ===================== CICLO ACTUAL O SELECCIONADO =====================
     ciclo_id = request.session.get("ciclo_id")
     ciclos_disponibles = Ciclo.objects.all().order_by("-fecha_inicio")
@@ -123,7 +62,6 @@ def dashboard(request):
             actividades_qs = Actividad.objects.filter(
                 departamento=departamento_filtro, ciclo=ciclo_actual
             )
-            metas_qs = Meta.objects.filter(departamento=departamento_filtro)
             proyectos_qs = Proyecto.objects.filter(
                 meta__departamento=departamento_filtro
             ).distinct()
@@ -134,7 +72,6 @@ def dashboard(request):
         else:
             # ADMIN e INVITADO: todos los departamentos
             actividades_qs = Actividad.objects.filter(ciclo=ciclo_actual)
-            metas_qs = Meta.objects.all()
             proyectos_qs = Proyecto.objects.all()
             objetivos_qs = ObjetivoEstrategico.objects.all()
             departamento_filtro = None
@@ -143,6 +80,83 @@ def dashboard(request):
         logger.error(f"Error cargando datos: {e}")
         return render(request, "core/error.html", {"error": "Error cargando datos"})
 
+    # ===================== DATOS EN CACHÉ =====================
+    # Contadores y gráficos se reutilizan mientras no cambie la versión de
+    # los datos (ver core/signals.py)
+    alcance = "departamento" if departamento_filtro else "global"
+    datos = obtener_o_calcular(
+        "dashboard",
+        (
+            ciclo_actual.id,
+            alcance,
+            departamento_filtro.id if departamento_filtro else "todos",
+        ),
+        lambda: calcular_datos_dashboard(
+            ciclo_actual,
+            departamento_filtro,
+            actividades_qs,
+            proyectos_qs,
+            objetivos_qs,
+        ),
+        timeout=settings.DASHBOARD_CACHE_TIMEOUT,
+    )
+
+    # ===================== CONTEXTO FINAL CORREGIDO =====================
+    context = {
+        **datos,
+        # Información del rol y ciclo
+        "es_docente": es_docente,
+        "es_admin": es_admin,
+        "es_apoyo": es_apoyo,
+        "filtro_aplicado": "Departamento" if es_docente or es_apoyo else "Global",
+        "departamento_usuario": (
+            getattr(usuario.departamento, "nombre", "No asignado")
+            if es_docente or es_apoyo
+            else None
+        ),
+        "ciclo_actual": ciclo_actual,
+        "ciclos_disponibles": ciclos_disponibles,
+    }
+
+    return render(request, "core/dashboard.html", context)
+
+
+def calcular_datos_dashboard(
+    ciclo_actual, departamento_filtro, actividades_qs, proyectos_qs, objetivos_qs
+):
+    """
+    Calcula los contadores y gráficos del dashboard para un ciclo y alcance
+    """
+    logger = logging.getLogger(__name__)
+
+    # ===================== FUNCIONES AUXILIARES =====================
+    def safe_aggregate(queryset, aggregate_dict, default_value=0):
+        """Maneja errores en agregaciones"""
+        try:
+            result = queryset.aggregate(**aggregate_dict)
+            return {k: v or default_value for k, v in result.items()}
+        except Exception as e:
+            logger.error(f"Error en agregación: {e}")
+            return {k: default_value for k in aggregate_dict.keys()}
+
+    def safe_porcentaje(cumplidas, total):
+        """Calcula porcentaje manejando casos edge"""
+        try:
+            if total == 0:
+                return 0
+            return round((cumplidas / total) * 100, 1)
+        except Exception as e:
+            logger.warning(f"Error calculando porcentaje: {e}")
+            return 0
+
+    def safe_count(queryset):
+        """Cuenta elementos manejando errores"""
+        try:
+            return queryset.count()
+        except Exception as e:
+            logger.error(f"Error contando queryset: {e}")
+            return 0
+
     # ===================== CONTADORES DE ACTIVIDADES CORREGIDOS =====================
     actividades_stats = safe_aggregate(
         actividades_qs,
@@ -163,122 +177,68 @@ def dashboard(request):
     actividades_en_progreso_total = actividades_en_proceso + actividades_activas
     porcentaje_actividades = safe_porcentaje(actividades_cumplidas, total_actividades)
 
-    # ===================== CONTADORES DE METAS CORREGIDOS =====================
+    # ===================== RESÚMENES DE CUMPLIMIENTO =====================
+    # Una sola consulta a los resúmenes persistidos del ciclo: las metas del
+    # departamento (o de todos) y los proyectos/objetivos visibles, evaluados
+    # con todas sus metas del ciclo.
     try:
-        metas_con_ciclo = []
-        metas_cumplidas_count = 0
-
-        for meta in metas_qs:
-            # Verificar si la meta tiene ciclo actual
-            if MetaCiclo.objects.filter(meta=meta, ciclo=ciclo_actual).exists():
-                metas_con_ciclo.append(meta)
-
-                # Verificar si la meta está cumplida
-                if meta_esta_cumplida(meta, ciclo_actual):
-                    metas_cumplidas_count += 1
-
-        total_metas = len(metas_con_ciclo)
-        metas_no_cumplidas = total_metas - metas_cumplidas_count
-        porcentaje_metas = safe_porcentaje(metas_cumplidas_count, total_metas)
-
-    except Exception as e:
-        logger.error(f"Error procesando metas: {e}")
-        total_metas = metas_cumplidas_count = metas_no_cumplidas = porcentaje_metas = 0
-
-    # ===================== CONTADORES DE PROYECTOS CORREGIDOS =====================
-    try:
-        proyectos_con_metas = []
-        proyectos_cumplidos_count = 0
-
-        for proyecto in proyectos_qs:
-            # Obtener todas las metas del proyecto en este ciclo
-            metas_proyecto = proyecto.meta_set.filter(
-                metas_ciclo__ciclo=ciclo_actual
-            ).distinct()
-
-            if metas_proyecto.exists():
-                proyectos_con_metas.append(proyecto)
-
-                # Un proyecto está cumplido si TODAS sus metas están cumplidas
-                proyecto_cumplido = True
-                metas_en_proyecto_count = 0
-
-                for meta in metas_proyecto:
-                    if MetaCiclo.objects.filter(meta=meta, ciclo=ciclo_actual).exists():
-                        metas_en_proyecto_count += 1
-                        if not meta_esta_cumplida(meta, ciclo_actual):
-                            proyecto_cumplido = False
-                            break  # No need to check further if one meta is not cumplida
-
-                # Solo considerar proyectos que tengan al menos una meta en el ciclo
-                if metas_en_proyecto_count > 0 and proyecto_cumplido:
-                    proyectos_cumplidos_count += 1
-
-        total_proyectos = len(proyectos_con_metas)
-        proyectos_no_cumplidos = total_proyectos - proyectos_cumplidos_count
-        porcentaje_proyectos = safe_porcentaje(
-            proyectos_cumplidos_count, total_proyectos
+        resumenes = list(
+            ResumenCumplimiento.objects.filter(ciclo=ciclo_actual).filter(
+                Q(
+                    nivel=ResumenCumplimiento.NIVEL_PROYECTO,
+                    departamento=departamento_filtro,
+                )
+                | Q(
+                    nivel=ResumenCumplimiento.NIVEL_PROYECTO,
+                    departamento__isnull=True,
+                    entidad_id__in=proyectos_qs.values("id"),
+                )
+                | Q(
+                    nivel=ResumenCumplimiento.NIVEL_OBJETIVO,
+                    departamento__isnull=True,
+                    entidad_id__in=objetivos_qs.values("id"),
+                )
+            )
         )
-
     except Exception as e:
-        logger.error(f"Error procesando proyectos: {e}")
-        total_proyectos = proyectos_cumplidos_count = proyectos_no_cumplidos = (
-            porcentaje_proyectos
-        ) = 0
-
-    # ===================== CONTADORES DE OBJETIVOS CORREGIDOS =====================
-    try:
-        objetivos_con_proyectos = []
-        objetivos_cumplidos_count = 0
+        logger.error(f"Error cargando resúmenes de cumplimiento: {e}")
+        resumenes = []
+
+    departamento_filtro_id = departamento_filtro.id if departamento_filtro else None
+    resumenes_metas = [
+        r
+        for r in resumenes
+        if r.nivel == ResumenCumplimiento.NIVEL_PROYECTO
+        and r.departamento_id == departamento_filtro_id
+    ]
+    resumenes_proyectos = [
+        r
+        for r in resumenes
+        if r.nivel == ResumenCumplimiento.NIVEL_PROYECTO and r.departamento_id is None
+    ]
+    resumenes_objetivos = [
+        r for r in resumenes if r.nivel == ResumenCumplimiento.NIVEL_OBJETIVO
+    ]
 
-        for objetivo in objetivos_qs:
-            # Obtener todos los proyectos del objetivo que tengan metas en este ciclo
-            proyectos_objetivo = objetivo.proyecto_set.filter(
-                meta__metas_ciclo__ciclo=ciclo_actual
-            ).distinct()
+    # ===================== CONTADORES DE METAS CORREGIDOS =====================
+    total_metas = sum(r.total for r in resumenes_metas)
+    metas_cumplidas_count = sum(r.cumplidos for r in resumenes_metas)
+    metas_no_cumplidas = total_metas - metas_cumplidas_count
+    porcentaje_metas = safe_porcentaje(metas_cumplidas_count, total_metas)
 
-            if proyectos_objetivo.exists():
-                objetivos_con_proyectos.append(objetivo)
-
-                # Un objetivo está cumplido si TODOS sus proyectos están cumplidos
-                objetivo_cumplido = True
-                proyectos_en_objetivo_count = 0
-
-                for proyecto in proyectos_objetivo:
-                    # Verificar si el proyecto tiene metas en este ciclo
-                    metas_proyecto = proyecto.meta_set.filter(
-                        metas_ciclo__ciclo=ciclo_actual
-                    ).distinct()
-
-                    if metas_proyecto.exists():
-                        proyectos_en_objetivo_count += 1
-
-                        # Verificar si el proyecto está cumplido
-                        proyecto_cumplido = True
-                        for meta in metas_proyecto:
-                            if not meta_esta_cumplida(meta, ciclo_actual):
-                                proyecto_cumplido = False
-                                break
-
-                        if not proyecto_cumplido:
-                            objetivo_cumplido = False
-                            break  # No need to check further if one project is not cumplido
-
-                # Solo considerar objetivos que tengan al menos un proyecto con metas en el ciclo
-                if proyectos_en_objetivo_count > 0 and objetivo_cumplido:
-                    objetivos_cumplidos_count += 1
-
-        total_objetivos = len(objetivos_con_proyectos)
-        objetivos_no_cumplidos = total_objetivos - objetivos_cumplidos_count
-        porcentaje_objetivos = safe_porcentaje(
-            objetivos_cumplidos_count, total_objetivos
-        )
+    # ===================== CONTADORES DE PROYECTOS CORREGIDOS =====================
+    # Un proyecto está cumplido si TODAS sus metas del ciclo están cumplidas
+    total_proyectos = len(resumenes_proyectos)
+    proyectos_cumplidos_count = sum(1 for r in resumenes_proyectos if r.cumplido)
+    proyectos_no_cumplidos = total_proyectos - proyectos_cumplidos_count
+    porcentaje_proyectos = safe_porcentaje(proyectos_cumplidos_count, total_proyectos)
 
-    except Exception as e:
-        logger.error(f"Error procesando objetivos: {e}")
-        total_objetivos = objetivos_cumplidos_count = objetivos_no_cumplidos = (
-            porcentaje_objetivos
-        ) = 0
+    # ===================== CONTADORES DE OBJETIVOS CORREGIDOS =====================
+    # Un objetivo está cumplido si TODOS sus proyectos del ciclo están cumplidos
+    total_objetivos = len(resumenes_objetivos)
+    objetivos_cumplidos_count = sum(1 for r in resumenes_objetivos if r.cumplido)
+    objetivos_no_cumplidos = total_objetivos - objetivos_cumplidos_count
+    porcentaje_objetivos = safe_porcentaje(objetivos_cumplidos_count, total_objetivos)
 
     # ===================== GRÁFICOS CORREGIDOS =====================
     try:
@@ -418,8 +378,7 @@ def dashboard(request):
             grafico_objetivos_html
         ) = grafico_progreso_html = "<p>Error cargando gráfico</p>"
 
-    # ===================== CONTEXTO FINAL CORREGIDO =====================
-    context = {
+    return {
         # Actividades - Contadores CORREGIDOS
         "total_actividades": total_actividades,
         "actividades_cumplidas": actividades_cumplidas,
@@ -449,21 +408,19 @@ def dashboard(request):
         "grafico_proyectos_html": grafico_proyectos_html,
         "grafico_objetivos_html": grafico_objetivos_html,
         "grafico_progreso_html": grafico_progreso_html,
-        # Información del rol y ciclo
-        "es_docente": es_docente,
-        "es_admin": es_admin,
-        "es_apoyo": es_apoyo,
-        "filtro_aplicado": "Departamento" if es_docente or es_apoyo else "Global",
-        "departamento_usuario": (
-            getattr(usuario.departamento, "nombre", "No asignado")
-            if es_docente or es_apoyo
-            else None
-        ),
-        "ciclo_actual": ciclo_actual,
-        "ciclos_disponibles": ciclos_disponibles,
     }
 
-    return render(request, "core/dashboard.html", context)
+
+@role_required("ADMIN")
+def estadisticas_cache_dashboard(request):
+    """Aciertos y fallos de la caché del dashboard"""
+    return JsonResponse(estadisticas_cache("dashboard"))
+
+
+@role_required("ADMIN")
+def estado_conexiones_db(request):
+    """Modo y métricas de las conexiones a la base de datos de este proceso"""
+    return JsonResponse(estado_conexiones())
 
 
 def get_empty_context():
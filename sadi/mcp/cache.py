@@ -0,0 +1,128 @@
+# mcp/cache.py
+# Caché de respuestas del asistente: la misma pregunta (normalizada) con la
+# misma intención, el mismo alcance del usuario y los mismos datos devuelve la
+# respuesta guardada sin consultar la base de datos ni generar con el modelo
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from core.cache import versiones_modelos
+
+logger = logging.getLogger(__name__)
+
+# Intenciones en el orden en que se evalúan: (nombre, palabras clave, modelos
+# que se leen para armar el contexto). Guardar o borrar un registro de esos
+# modelos invalida las respuestas de la intención (ver mcp/signals.py)
+INTENCIONES = [
+    ('proyectos', ['proyecto', 'project'], ['proyectos.Proyecto', 'objetivos.ObjetivoEstrategico']),
+    ('actividades', ['actividad', 'activity', 'tarea'], ['actividades.Actividad']),
+    ('ciclos', ['ciclo', 'ciclos'], ['programas.Ciclo', 'programas.ProgramaEstrategico']),
+    ('metas', ['meta', 'metas', 'objetivo'], ['metas.Meta', 'proyectos.Proyecto']),
+    ('programas', ['programa', 'programas', 'estrategico'], ['programas.ProgramaEstrategico']),
+    ('departamentos', ['departamento', 'departamentos', 'área', 'area'], ['departamentos.Departamento']),
+    ('riesgos', ['riesgo', 'riesgos', 'mitigacion'], ['riesgos.Riesgo', 'metas.Meta']),
+    ('avances', ['avance', 'progreso', 'cumplimiento'], ['metas.AvanceMeta', 'metas.Meta', 'departamentos.Departamento']),
+]
+
+MODELOS_INTENCION = {nombre: modelos for nombre, _, modelos in INTENCIONES}
+# Las preguntas generales toman contexto de cualquier modelo (mcp/indice.py)
+MODELOS_INTENCION['general'] = sorted({label for _, _, modelos in INTENCIONES for label in modelos})
+
+
+def detectar_intencion(prompt):
+    """Intención de la pregunta según sus palabras clave ("general" si ninguna)."""
+    prompt_lower = prompt.lower()
+    for nombre, palabras, _ in INTENCIONES:
+        if any(palabra in prompt_lower for palabra in palabras):
+            return nombre
+    return 'general'
+
+
+def normalizar_prompt(prompt):
+    """Minúsculas, sin acentos, sin signos de puntuación y sin espacios extra."""
+    texto = unicodedata.normalize('NFKD', prompt.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^\w\s]', ' ', texto)
+    return ' '.join(texto.split())
+
+
+def alcance_usuario(user):
+    """
+    Usuarios que ven los mismos datos comparten respuestas. El contexto
+    depende del rol y del departamento del usuario.
+    """
+    return f"{getattr(user, 'role', '')}:{getattr(user, 'departamento_id', None) or '-'}"
+
+
+def clave_respuesta(prompt, user):
+    """
+    (pregunta normalizada, intención, alcance, versiones de los modelos de la
+    intención). Se calcula antes de consultar los datos: si cambian mientras
+    se genera, la respuesta queda guardada con la versión anterior.
+    """
+    intencion = detectar_intencion(prompt)
+    return (
+        normalizar_prompt(prompt),
+        intencion,
+        alcance_usuario(user),
+        versiones_modelos(MODELOS_INTENCION.get(intencion, [])),
+    )
+
+
+class CacheRespuestas:
+    """
+    LRU en memoria del proceso con caducidad: guarda hasta `capacidad`
+    respuestas durante `ttl` segundos. Las claves llevan las versiones de los
+    modelos, que se leen de la caché compartida en cada pregunta: un cambio
+    hecho en cualquier worker deja de encontrar las respuestas anteriores en
+    todos (las entradas viejas solo ocupan lugar hasta salir del LRU).
+    """
+
+    def __init__(self, capacidad, ttl):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None or time.monotonic() - entrada[0] > self.ttl:
+                if entrada is not None:
+                    del self.entradas[clave]
+                self.fallos += 1
+                return None
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave, valor):
+        if self.capacidad <= 0:
+            return
+        with self.lock:
+            self.entradas[clave] = (time.monotonic(), valor)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.capacidad:
+                self.entradas.popitem(last=False)
+
+    def estadisticas(self):
+        with self.lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self.entradas),
+                'capacidad': self.capacidad,
+                'ttl': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / total, 3) if total else 0,
+            }
+
+
+respuestas_cache = CacheRespuestas(
+    settings.MCP_CONFIG['RESPONSE_CACHE_SIZE'], settings.MCP_CONFIG['RESPONSE_CACHE_TTL']
+)
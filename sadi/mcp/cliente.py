@@ -0,0 +1,102 @@
+# mcp/cliente.py
+# Cliente del servidor de inferencia (python manage.py servidor_mcp)
+import json
+import logging
+import urllib.error
+import urllib.request
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ServidorOcupado(Exception):
+    """La cola del servidor de inferencia está llena (503)."""
+
+
+class ServidorNoDisponible(Exception):
+    """El servidor de inferencia no respondió o respondió con error."""
+
+
+def url_servidor(ruta):
+    return f"{settings.MCP_CONFIG['SERVER_URL'].rstrip('/')}/{ruta}"
+
+
+def abrir(ruta, datos):
+    """POST al servidor de inferencia; traduce los errores HTTP y de red."""
+    peticion = urllib.request.Request(
+        url_servidor(ruta),
+        data=json.dumps(datos).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+    )
+    # Margen sobre el timeout del servidor para recibir su propio 504
+    timeout = settings.MCP_CONFIG['TIMEOUT'] + 5
+
+    try:
+        return urllib.request.urlopen(peticion, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        try:
+            error = json.loads(e.read()).get('error', '')
+        except ValueError:
+            error = ''
+        if e.code == 503:
+            raise ServidorOcupado(error) from e
+        raise ServidorNoDisponible(f'{e.code} {error}') from e
+    except (urllib.error.URLError, OSError) as e:
+        raise ServidorNoDisponible(str(e)) from e
+
+
+def generar_respuesta(prompt, db_context=''):
+    """
+    Genera la respuesta del asistente en el servidor de inferencia. Si
+    MCP_CONFIG["SERVER_URL"] está vacío, el modelo se usa en este proceso.
+    """
+    if not settings.MCP_CONFIG['SERVER_URL']:
+        from .mcp_service import mcp_service
+
+        return mcp_service.generate_contextual_response(prompt, db_context)
+
+    with abrir('generar', {'prompt': prompt, 'db_context': db_context}) as respuesta:
+        try:
+            return json.loads(respuesta.read())['response']
+        except OSError as e:
+            raise ServidorNoDisponible(str(e)) from e
+
+
+def generar_flujo(prompt, db_context=''):
+    """
+    Inicia la generación por streaming y devuelve un generador de eventos
+    (tipo, texto): "token" por cada fragmento y "fin" con la respuesta final.
+    Lanza ServidorOcupado o ServidorNoDisponible al conectar. Al cerrar el
+    generador se cierra la conexión y el servidor cancela la generación.
+    """
+    if not settings.MCP_CONFIG['SERVER_URL']:
+        from .mcp_service import mcp_service
+
+        return mcp_service.stream_contextual_response(prompt, db_context)
+
+    return leer_eventos(abrir('generar/flujo', {'prompt': prompt, 'db_context': db_context}))
+
+
+def leer_eventos(respuesta):
+    with respuesta:
+        tipo = None
+        try:
+            for linea in respuesta:
+                linea = linea.decode('utf-8').rstrip('\n')
+                if linea.startswith('event: '):
+                    tipo = linea[len('event: '):]
+                elif linea.startswith('data: '):
+                    yield tipo, json.loads(linea[len('data: '):])['texto']
+        except OSError as e:
+            raise ServidorNoDisponible(str(e)) from e
+
+
+def estado_servidor():
+    """Cola, contadores y métricas de lotes del servidor de inferencia."""
+    if not settings.MCP_CONFIG['SERVER_URL']:
+        raise ServidorNoDisponible('MCP_CONFIG["SERVER_URL"] no está configurado')
+    try:
+        with urllib.request.urlopen(url_servidor('estado'), timeout=5) as respuesta:
+            return json.loads(respuesta.read())
+    except (urllib.error.URLError, OSError) as e:
+        raise ServidorNoDisponible(str(e)) from e
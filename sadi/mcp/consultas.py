@@ -0,0 +1,411 @@
+# mcp/consultas.py
+# Ruta rápida del asistente: las preguntas que se responden contando o
+# listando registros ("¿cuántas actividades cumplidas hay?", "riesgos
+# críticos del ciclo") se interpretan en entidad + filtro + operación + ciclo
+# + departamento y se responden con consultas agregadas del ORM y un texto
+# fijo, sin pasar por el modelo de lenguaje. Las preguntas abiertas, o con
+# palabras que el intérprete no entiende, siguen yendo al modelo
+import logging
+import re
+import threading
+import time
+from collections import deque
+from django.apps import apps
+from django.db.models import Count, Q
+from django.utils import formats
+from .cache import normalizar_prompt
+from .servidor import percentiles
+
+logger = logging.getLogger(__name__)
+
+# Elementos que se muestran al listar
+LIMITE_LISTA = 10
+
+
+def fecha(valor):
+    return formats.date_format(valor, 'd/m/Y') if valor else 'sin fecha'
+
+
+def nivel_riesgo(valor):
+    """Mismos rangos que el reporte de riesgos (reportes.views.evaluar_riesgos)"""
+    if valor <= 25:
+        return 'bajo'
+    if valor <= 50:
+        return 'medio'
+    if valor <= 90:
+        return 'alto'
+    return 'crítico'
+
+
+ESTADOS_ACTIVIDAD = [
+    (r'\b(no cumplidas?|incumplidas?)\b', 'No Cumplida', ('no cumplida', 'no cumplidas')),
+    (r'\bcumplidas?\b', 'Cumplida', ('cumplida', 'cumplidas')),
+    (r'\ben (proceso|progreso|curso)\b', 'En Proceso', ('en proceso', 'en proceso')),
+    (r'\b(activas?|pendientes?|abiertas?)\b', 'Activa', ('activa', 'activas')),
+]
+
+NIVELES_RIESGO = [
+    (r'\b(criticos?|graves?)\b', 'critico', Q(riesgo__gt=90), ('crítico', 'críticos')),
+    (r'\baltos?\b', 'alto', Q(riesgo__gt=50, riesgo__lte=90), ('alto', 'altos')),
+    (r'\bmedios?\b', 'medio', Q(riesgo__gt=25, riesgo__lte=50), ('medio', 'medios')),
+    (r'\bbajos?\b', 'bajo', Q(riesgo__lte=25), ('bajo', 'bajos')),
+]
+
+# Entidades que entiende la ruta rápida. Cada filtro es (patrón, nombre,
+# condición, (etiqueta singular, etiqueta plural)); el desglose de los
+# conteos sin filtro usa los mismos filtros
+ENTIDADES = {
+    'actividades': {
+        'patron': r'\b(actividad|actividades|tareas?)\b',
+        'modelo': 'actividades.Actividad',
+        'nombre': ('actividad', 'actividades'),
+        'filtros': [
+            (patron, estado, Q(estado=estado), etiquetas)
+            for patron, estado, etiquetas in ESTADOS_ACTIVIDAD
+        ],
+        'ciclo': 'ciclo',
+        'departamento': 'departamento',
+        'propias': 'responsable',
+        'orden': ('fecha_fin', 'id'),
+        'texto': lambda a: f"{a.nombre or a.descripcion[:80]} — {a.estado} — vence {fecha(a.fecha_fin)}",
+    },
+    'metas': {
+        'patron': r'\bmetas?\b',
+        'modelo': 'metas.Meta',
+        'nombre': ('meta', 'metas'),
+        'filtros': [
+            (r'\binactivas?\b', 'inactiva', Q(activa=False), ('inactiva', 'inactivas')),
+            (r'\bactivas?\b', 'activa', Q(activa=True), ('activa', 'activas')),
+        ],
+        'ciclo': 'metas_ciclo__ciclo',
+        'departamento': 'departamento',
+        'orden': ('clave', 'id'),
+        'texto': lambda m: f"{m.clave or 'Sin clave'} — {m.nombre or m.indicador[:80]}",
+    },
+    'riesgos': {
+        'patron': r'\briesgos?\b',
+        'modelo': 'riesgos.Riesgo',
+        'nombre': ('riesgo', 'riesgos'),
+        'filtros': NIVELES_RIESGO,
+        'ciclo': 'actividad__ciclo',
+        'departamento': 'actividad__departamento',
+        'propias': 'actividad__responsable',
+        'orden': ('-riesgo', 'id'),
+        'texto': lambda r: f"{r.enunciado} — nivel {r.riesgo} ({nivel_riesgo(r.riesgo)})",
+    },
+    'proyectos': {
+        'patron': r'\bproyectos?\b',
+        'modelo': 'proyectos.Proyecto',
+        'nombre': ('proyecto', 'proyectos'),
+        'filtros': [],
+        'departamento': 'meta__departamento',
+        'orden': ('clave', 'id'),
+        'texto': lambda p: f"{p.clave} — {p.nombre}",
+    },
+    'ciclos': {
+        'patron': r'\bciclos?\b',
+        'modelo': 'programas.Ciclo',
+        'nombre': ('ciclo', 'ciclos'),
+        'filtros': [
+            (r'\binactivos?\b', 'Inactivo', Q(estado='Inactivo'), ('inactivo', 'inactivos')),
+            (r'\b(activos?|vigentes?|actuales?)\b', 'Activo', Q(estado='Activo'), ('activo', 'activos')),
+            (r'\ben proceso\b', 'En proceso', Q(estado='En proceso'), ('en proceso', 'en proceso')),
+        ],
+        'orden': ('-fecha_inicio', 'id'),
+        'texto': lambda c: f"{c.nombre or c.id} — {c.estado} ({fecha(c.fecha_inicio)} a {fecha(c.fecha_fin)})",
+    },
+    'programas': {
+        'patron': r'\bprogramas?( estrategicos?)?\b',
+        'modelo': 'programas.ProgramaEstrategico',
+        'nombre': ('programa estratégico', 'programas estratégicos'),
+        'filtros': [
+            (r'\binactivos?\b', 'inactivo', Q(estado=False), ('inactivo', 'inactivos')),
+            (r'\b(activos?|vigentes?)\b', 'activo', Q(estado=True), ('activo', 'activos')),
+        ],
+        'orden': ('clave', 'id'),
+        'texto': lambda p: f"{p.clave} — {p.nombre}",
+    },
+    'departamentos': {
+        'patron': r'\bdepartamentos?\b',
+        'modelo': 'departamentos.Departamento',
+        'nombre': ('departamento', 'departamentos'),
+        'filtros': [],
+        'orden': ('nombre',),
+        'texto': lambda d: d.nombre,
+    },
+}
+
+PATRON_CONTAR = r'\b(cuant[oa]s?|numero|total|cantidad|conteo)\b'
+PATRON_LISTAR = r'\b(lista|listar|listado|muestra|muestrame|mostrar|dame|cuales|que|hay|ver)\b'
+# Preguntas abiertas: siempre las responde el modelo
+PATRON_ABIERTA = (
+    r'\b(por que|porque|como|explica|explicame|analiza|recomienda|recomiendas|sugiere|'
+    r'sugieres|resume|resumen|compara|opinas|deberia|mejorar|ayudame|significa)\b'
+)
+PATRON_CICLO_ACTUAL = r'\b((este|el|del|en el) ciclo( (actual|activo|vigente))?|ciclo (actual|activo|vigente))\b'
+PATRON_CICLO_ANIO = r'\b(del |en el )?ciclo (\d{4})\b'
+PATRON_MI_DEPARTAMENTO = r'\b(de |en )?mi departamento\b'
+PATRON_PROPIAS = r'\b(mis|a mi cargo|asignad[oa]s a mi)\b'
+
+# Palabras que pueden quedar en una pregunta entendida sin cambiar su sentido
+PALABRAS_VACIAS = set(
+    'a al de del el la las los lo en y o con por para hay son es estan existen tiene mis '
+    'tienen tengo tenemos que cual cuales me mi se un una unos unas todos todas todo '
+    'registrados registradas registrado registrada sistema sadi favor actualmente '
+    'ahora hoy actual actuales nivel estado'.split()
+)
+
+
+class Consulta:
+    """Pregunta interpretada: entidad, operación y filtros."""
+
+    def __init__(self, entidad, operacion, filtro=None, ciclo=None, departamento=None, propias=False):
+        self.entidad = entidad
+        self.operacion = operacion
+        self.filtro = filtro
+        # None, 'actual' o un año ("ciclo 2025")
+        self.ciclo = ciclo
+        # None, 'mio' o el id del departamento mencionado
+        self.departamento = departamento
+        self.propias = propias
+
+    def __repr__(self):
+        return (
+            f'Consulta({self.entidad}, {self.operacion}, filtro={self.filtro}, ciclo={self.ciclo}, '
+            f'departamento={self.departamento}, propias={self.propias})'
+        )
+
+
+def quitar(texto, patron):
+    """Busca el patrón; devuelve (coincidencia, texto sin lo encontrado)."""
+    encontrado = re.search(patron, texto)
+    if not encontrado:
+        return None, texto
+    return encontrado, texto[:encontrado.start()] + ' ' + texto[encontrado.end():]
+
+
+def interpretar(prompt, departamentos=()):
+    """
+    Interpreta la pregunta o devuelve None si debe responderla el modelo.
+    `departamentos` son pares (id, nombre) para reconocer departamentos por
+    su nombre.
+    """
+    texto = normalizar_prompt(prompt)
+    if not texto or re.search(PATRON_ABIERTA, texto):
+        return None
+
+    # La entidad es la primera que se menciona ("metas del proyecto..."); el
+    # ciclo y el departamento solo si no se menciona otra, porque en
+    # "actividades del ciclo" o "metas de mi departamento" son filtros
+    menciones = [
+        (nombre in ('ciclos', 'departamentos'), encontrado.start(), nombre)
+        for nombre, entidad in ENTIDADES.items()
+        for encontrado in [re.search(entidad['patron'], texto)]
+        if encontrado
+    ]
+    if not menciones:
+        return None
+    entidad = min(menciones)[2]
+    definicion = ENTIDADES[entidad]
+    _, resto = quitar(texto, definicion['patron'])
+
+    contar, resto = quitar(resto, PATRON_CONTAR)
+    listar, resto = quitar(resto, PATRON_LISTAR)
+
+    filtro = None
+    for patron, nombre, _, _ in definicion['filtros']:
+        encontrado, resto = quitar(resto, patron)
+        if encontrado:
+            filtro = nombre
+            break
+
+    ciclo = None
+    if 'ciclo' in definicion:
+        anio, resto = quitar(resto, PATRON_CICLO_ANIO)
+        if anio:
+            ciclo = anio.group(2)
+        else:
+            actual, resto = quitar(resto, PATRON_CICLO_ACTUAL)
+            ciclo = 'actual' if actual else None
+
+    departamento = None
+    if 'departamento' in definicion:
+        mio, resto = quitar(resto, PATRON_MI_DEPARTAMENTO)
+        if mio:
+            departamento = 'mio'
+        else:
+            for depto_id, nombre in departamentos:
+                encontrado, resto_sin_nombre = quitar(resto, rf'\b{re.escape(normalizar_prompt(nombre))}\b')
+                if encontrado:
+                    departamento, resto = depto_id, resto_sin_nombre
+                    _, resto = quitar(resto, r'\bdepartamento\b')
+                    break
+
+    propias = False
+    if 'propias' in definicion:
+        encontrado, resto = quitar(resto, PATRON_PROPIAS)
+        propias = bool(encontrado)
+
+    # Cualquier otra palabra (un nombre de proyecto, una fecha...) puede
+    # cambiar la pregunta: mejor que responda el modelo
+    if any(palabra not in PALABRAS_VACIAS for palabra in resto.split()):
+        return None
+
+    if contar:
+        operacion = 'contar'
+    elif listar or filtro or ciclo or departamento or propias:
+        operacion = 'listar'
+    else:
+        return None
+    return Consulta(entidad, operacion, filtro, ciclo, departamento, propias)
+
+
+def resolver_ciclo(consulta, request):
+    """Ciclo de la consulta: el de la sesión o el activo más reciente, o por año."""
+    Ciclo = apps.get_model('programas.Ciclo')
+    if consulta.ciclo == 'actual':
+        ciclo_id = request.session.get('ciclo_id') if hasattr(request, 'session') else None
+        if ciclo_id:
+            ciclo = Ciclo.objects.filter(id=ciclo_id).first()
+            if ciclo:
+                return ciclo
+        return Ciclo.objects.filter(estado='Activo').order_by('-fecha_inicio').first()
+    return (
+        Ciclo.objects.filter(Q(nombre__contains=consulta.ciclo) | Q(fecha_inicio__year=consulta.ciclo))
+        .order_by('-fecha_inicio')
+        .first()
+    )
+
+
+def responder(consulta, request):
+    """Responde la consulta con el ORM y un texto fijo en español."""
+    definicion = ENTIDADES[consulta.entidad]
+    modelo = apps.get_model(definicion['modelo'])
+    singular, plural = definicion['nombre']
+    condiciones = Q()
+    alcance = ''
+    # Filtrar por una relación a muchos puede repetir registros
+    distinto = False
+
+    etiquetas = (singular, plural)
+    for _, nombre, condicion, etiquetas_filtro in definicion['filtros']:
+        if nombre == consulta.filtro:
+            condiciones &= condicion
+            etiquetas = (f'{singular} {etiquetas_filtro[0]}', f'{plural} {etiquetas_filtro[1]}')
+
+    if consulta.ciclo:
+        ciclo = resolver_ciclo(consulta, request)
+        if ciclo is None:
+            return 'No encontré un ciclo activo.' if consulta.ciclo == 'actual' else f'No encontré el ciclo {consulta.ciclo}.'
+        condiciones &= Q(**{definicion['ciclo']: ciclo})
+        distinto |= '__' in definicion['ciclo']
+        alcance += f' en el ciclo {ciclo.nombre or ciclo.id}'
+
+    if consulta.departamento:
+        Departamento = apps.get_model('departamentos.Departamento')
+        if consulta.departamento == 'mio':
+            departamento = getattr(request.user, 'departamento', None)
+            if departamento is None:
+                return 'No tienes un departamento asignado.'
+        else:
+            departamento = Departamento.objects.get(id=consulta.departamento)
+        condiciones &= Q(**{definicion['departamento']: departamento})
+        distinto |= '__' in definicion['departamento']
+        alcance += f' del departamento {departamento.nombre}'
+
+    if consulta.propias:
+        condiciones &= Q(**{definicion['propias']: request.user})
+        alcance += ' a tu cargo'
+
+    consulta_base = modelo.objects.filter(condiciones)
+
+    if consulta.operacion == 'contar':
+        # Total y desglose en una sola consulta agregada
+        desglose = {} if consulta.filtro else {
+            f'filtro_{i}': Count('id', distinct=True, filter=condicion)
+            for i, (_, _, condicion, _) in enumerate(definicion['filtros'])
+        }
+        totales = consulta_base.aggregate(total=Count('id', distinct=True), **desglose)
+        total = totales['total']
+        respuesta = f"📊 Hay {total} {etiquetas[0] if total == 1 else etiquetas[1]}{alcance}."
+        if total and desglose:
+            respuesta += '\n\n' + '\n'.join(
+                f"• {etiquetas_filtro[1].capitalize()}: {totales[f'filtro_{i}']}"
+                for i, (_, _, _, etiquetas_filtro) in enumerate(definicion['filtros'])
+            )
+        return respuesta
+
+    # Listar: total y los primeros LIMITE_LISTA
+    if distinto:
+        consulta_base = consulta_base.distinct()
+    total = consulta_base.count()
+    if not total:
+        return f"No hay {etiquetas[1]}{alcance}."
+    elementos = list(consulta_base.order_by(*definicion['orden'])[:LIMITE_LISTA])
+    lineas = [f"{i}. {definicion['texto'](elemento)}" for i, elemento in enumerate(elementos, 1)]
+    if total > len(elementos):
+        lineas.append(f"… y {total - len(elementos)} más.")
+    return f"📋 {etiquetas[1].capitalize()}{alcance}: {total}\n\n" + '\n'.join(lineas)
+
+
+class MetricasRutaRapida:
+    """Preguntas atendidas por la ruta rápida y su latencia."""
+
+    MUESTRAS = 500
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.preguntas = 0
+        self.aciertos = 0
+        self.duraciones = deque(maxlen=self.MUESTRAS)
+
+    def registrar(self, acierto, segundos):
+        with self.lock:
+            self.preguntas += 1
+            if acierto:
+                self.aciertos += 1
+                self.duraciones.append(segundos)
+
+    def estadisticas(self):
+        with self.lock:
+            return {
+                'preguntas': self.preguntas,
+                'aciertos': self.aciertos,
+                'tasa_aciertos': round(self.aciertos / self.preguntas, 3) if self.preguntas else 0,
+                'latencia_ms': percentiles(list(self.duraciones)),
+            }
+
+
+metricas_ruta_rapida = MetricasRutaRapida()
+
+
+def responder_rapido(prompt, request):
+    """
+    Respuesta de la ruta rápida, o None si la pregunta debe responderla el
+    modelo. Registra la tasa de aciertos y la latencia.
+    """
+    inicio = time.perf_counter()
+    Departamento = apps.get_model('departamentos.Departamento')
+    texto = normalizar_prompt(prompt)
+    # Los nombres de departamento solo se consultan si pueden aparecer
+    departamentos = Departamento.objects.values_list('id', 'nombre') if 'departamento' in texto or 'area' in texto else ()
+    consulta = interpretar(prompt, departamentos)
+    respuesta = None
+    if consulta:
+        try:
+            respuesta = responder(consulta, request)
+        except Exception:
+            # Un error de la ruta rápida no debe dejar sin respuesta: responde el modelo
+            logger.exception(f"Error en la ruta rápida con {consulta!r}")
+
+    segundos = time.perf_counter() - inicio
+    metricas_ruta_rapida.registrar(respuesta is not None, segundos)
+    estadisticas = metricas_ruta_rapida.estadisticas()
+    if respuesta is not None:
+        logger.info(
+            f"⚡ Ruta rápida {consulta!r} en {segundos * 1000:.1f} ms "
+            f"(tasa de aciertos {estadisticas['tasa_aciertos']:.0%})"
+        )
+    else:
+        logger.info(f"Ruta rápida: pregunta abierta (tasa de aciertos {estadisticas['tasa_aciertos']:.0%})")
+    return respuesta
@@ -0,0 +1,92 @@
+# mcp/contexto.py
+# Contexto con presupuesto de tokens: el contexto de la base de datos se parte
+# en fragmentos (un registro cada uno), se ordenan por relevancia para la
+# pregunta y se incluyen los que caben en el presupuesto, contados con el
+# tokenizador del modelo. Así el prompt nunca excede la ventana del modelo y
+# el tiempo de generación no depende del tamaño de las tablas
+import re
+from .indice import terminos
+
+# Los registros del contexto empiezan con "1. ", "2. ", ... (ver
+# get_real_database_context y contexto_relevante); las líneas siguientes
+# (sangradas o en blanco) pertenecen al mismo registro
+INICIO_REGISTRO = re.compile(r'^\d+\.\s')
+
+
+def fragmentos(db_context):
+    """
+    (encabezado, [registros]): el encabezado son las líneas anteriores al
+    primer registro ("PROYECTOS REGISTRADOS:"). Un contexto sin registros
+    numerados es un solo fragmento.
+    """
+    encabezado = []
+    registros = []
+    for linea in db_context.splitlines():
+        if INICIO_REGISTRO.match(linea):
+            registros.append([linea])
+        elif registros:
+            registros[-1].append(linea)
+        else:
+            encabezado.append(linea)
+    if not registros:
+        return '', [db_context.strip()] if db_context.strip() else []
+    return '\n'.join(encabezado).strip(), ['\n'.join(lineas).strip() for lineas in registros]
+
+
+def contar_tokens(tokenizer, textos):
+    """Tokens de cada texto (sin los tokens especiales), en una sola llamada."""
+    if not textos:
+        return []
+    return [len(ids) for ids in tokenizer(list(textos), add_special_tokens=False)['input_ids']]
+
+
+def recortar(tokenizer, texto, tokens):
+    """Los primeros `tokens` tokens del texto."""
+    ids = tokenizer(texto, add_special_tokens=False)['input_ids'][:tokens]
+    return tokenizer.decode(ids, skip_special_tokens=True).rstrip() + '...'
+
+
+def ordenar_por_relevancia(prompt, registros):
+    """
+    Índices de los registros de más a menos relevante: por términos de la
+    pregunta que contienen y, a igualdad, en el orden original (los del
+    índice BM25 ya vienen ordenados).
+    """
+    consulta = set(terminos(prompt))
+    coincidencias = [len(consulta.intersection(terminos(registro))) for registro in registros]
+    return sorted(range(len(registros)), key=lambda i: -coincidencias[i])
+
+
+def ajustar_contexto(tokenizer, prompt, db_context, presupuesto):
+    """
+    Contexto que cabe en `presupuesto` tokens y un resumen con los tokens y
+    fragmentos incluidos del total. Los registros elegidos conservan su orden
+    original; si ni el más relevante cabe, se incluye recortado.
+    """
+    encabezado, registros = fragmentos(db_context)
+    separador = '\n\n'
+    tokens_encabezado, tokens_separador = contar_tokens(tokenizer, [encabezado, separador])
+    tokens_registros = contar_tokens(tokenizer, registros)
+    resumen = {
+        'presupuesto': presupuesto,
+        'tokens_total': tokens_encabezado + sum(tokens_registros) + tokens_separador * len(registros),
+        'fragmentos_total': len(registros),
+    }
+
+    disponibles = presupuesto - (tokens_encabezado + tokens_separador if encabezado else 0)
+    orden = ordenar_por_relevancia(prompt, registros)
+    elegidos = []
+    for i in orden:
+        costo = tokens_registros[i] + (tokens_separador if elegidos else 0)
+        if costo <= disponibles:
+            elegidos.append(i)
+            disponibles -= costo
+
+    partes = [registros[i] for i in sorted(elegidos)]
+    if not partes and registros and disponibles > 0:
+        partes = [recortar(tokenizer, registros[orden[0]], disponibles - 1)]
+    contexto = separador.join(([encabezado] if encabezado and partes else []) + partes)
+
+    resumen['tokens'] = contar_tokens(tokenizer, [contexto])[0] if contexto else 0
+    resumen['fragmentos'] = len(partes)
+    return contexto, resumen
@@ -0,0 +1,318 @@
+# mcp/indice.py
+# Índice de búsqueda (BM25) sobre los textos de metas, proyectos,
+# actividades, riesgos y departamentos para elegir los registros más
+# relevantes para la pregunta en lugar de los primeros de la tabla
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Max
+from .cache import INTENCIONES, normalizar_prompt
+
+logger = logging.getLogger(__name__)
+
+# Formato del archivo: cambiarlo obliga a reconstruir los índices guardados
+VERSION_FORMATO = 1
+
+# Modelos indexados: (modelo, campos con texto, nombre en el contexto)
+FUENTES = {
+    'metas.Meta': (['clave', 'nombre', 'indicador', 'enunciado'], 'Meta'),
+    'proyectos.Proyecto': (['clave', 'nombre'], 'Proyecto'),
+    'actividades.Actividad': (['nombre', 'descripcion', 'estado'], 'Actividad'),
+    'riesgos.Riesgo': (['enunciado'], 'Riesgo'),
+    'departamentos.Departamento': (['nombre'], 'Departamento'),
+}
+
+PALABRAS_VACIAS = set(
+    'a al algo ante como con cual cuales cuando de del desde donde el ella en entre es '
+    'esta este esto hay la las le les lo los mas me mi mis muy no nos o para pero por '
+    'que quien se sin sobre son su sus te tiene tengo todo todos tu un una uno unos y ya'.split()
+)
+
+# Modelos en los que se busca según la intención de la pregunta ("general":
+# en todos)
+MODELOS_BUSQUEDA = {
+    'proyectos': ['proyectos.Proyecto'],
+    'actividades': ['actividades.Actividad'],
+    'metas': ['metas.Meta'],
+    'riesgos': ['riesgos.Riesgo'],
+    'departamentos': ['departamentos.Departamento'],
+    'general': None,
+}
+
+# Parámetros de BM25
+K1 = 1.5
+B = 0.75
+
+
+def raiz(palabra):
+    """Quita el plural para que "metas" y "meta" coincidan."""
+    if len(palabra) > 5 and palabra.endswith('es'):
+        return palabra[:-2]
+    if len(palabra) > 4 and palabra.endswith('s'):
+        return palabra[:-1]
+    return palabra
+
+
+def terminos(texto):
+    return [
+        raiz(palabra)
+        for palabra in normalizar_prompt(texto or '').split()
+        if len(palabra) > 2 and palabra not in PALABRAS_VACIAS
+    ]
+
+
+def texto_registro(label, registro):
+    campos, _ = FUENTES[label]
+    return ' '.join(str(getattr(registro, campo) or '') for campo in campos)
+
+
+class IndiceBM25:
+    """
+    Índice invertido: por término, {posición del documento: frecuencia}. Las
+    longitudes de los documentos se guardan en un arreglo de NumPy y la
+    puntuación de cada término de la consulta se calcula vectorizada sobre
+    los documentos que lo contienen.
+    """
+
+    def __init__(self):
+        self.claves = []
+        self.posiciones = {}
+        self.longitudes = np.zeros(0)
+        self.terminos_documento = []
+        self.postings = {}
+        self.libres = []
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def agregar(self, clave, lista_terminos):
+        self.quitar(clave)
+        if not lista_terminos:
+            return
+        if self.libres:
+            posicion = self.libres.pop()
+            self.claves[posicion] = clave
+        else:
+            posicion = len(self.claves)
+            self.claves.append(clave)
+            self.terminos_documento.append(None)
+            if posicion >= len(self.longitudes):
+                self.longitudes = np.concatenate([self.longitudes, np.zeros(max(64, posicion))])
+        frecuencias = Counter(lista_terminos)
+        self.posiciones[clave] = posicion
+        self.terminos_documento[posicion] = frecuencias
+        self.longitudes[posicion] = len(lista_terminos)
+        for termino, frecuencia in frecuencias.items():
+            self.postings.setdefault(termino, {})[posicion] = frecuencia
+
+    def quitar(self, clave):
+        posicion = self.posiciones.pop(clave, None)
+        if posicion is None:
+            return
+        for termino in self.terminos_documento[posicion]:
+            documentos = self.postings[termino]
+            del documentos[posicion]
+            if not documentos:
+                del self.postings[termino]
+        self.claves[posicion] = None
+        self.terminos_documento[posicion] = None
+        self.longitudes[posicion] = 0
+        self.libres.append(posicion)
+
+    def buscar(self, lista_terminos, k, prefijos=None):
+        """Las k claves con mayor puntuación BM25 (solo las que empiezan con `prefijos`)."""
+        total = len(self.posiciones)
+        if not total:
+            return []
+        promedio = self.longitudes.sum() / total
+        puntuaciones = np.zeros(len(self.claves))
+        for termino in set(lista_terminos):
+            documentos = self.postings.get(termino)
+            if not documentos:
+                continue
+            posiciones = np.fromiter(documentos.keys(), dtype=np.int64, count=len(documentos))
+            frecuencias = np.fromiter(documentos.values(), dtype=np.float64, count=len(documentos))
+            idf = math.log(1 + (total - len(documentos) + 0.5) / (len(documentos) + 0.5))
+            normalizacion = K1 * (1 - B + B * self.longitudes[posiciones] / promedio)
+            puntuaciones[posiciones] += idf * frecuencias * (K1 + 1) / (frecuencias + normalizacion)
+
+        if prefijos:
+            for posicion in np.flatnonzero(puntuaciones):
+                if not self.claves[posicion].startswith(prefijos):
+                    puntuaciones[posicion] = 0
+        candidatos = np.flatnonzero(puntuaciones)
+        if not len(candidatos):
+            return []
+        if len(candidatos) > k:
+            candidatos = candidatos[np.argpartition(-puntuaciones[candidatos], k - 1)[:k]]
+        candidatos = candidatos[np.argsort(-puntuaciones[candidatos], kind='stable')]
+        return [(self.claves[posicion], float(puntuaciones[posicion])) for posicion in candidatos]
+
+    def documentos(self):
+        return {
+            clave: dict(self.terminos_documento[posicion]) for clave, posicion in self.posiciones.items()
+        }
+
+
+class IndiceEntidades:
+    """
+    Índice BM25 de los modelos de FUENTES, guardado en disco. Cada modelo
+    lleva como marca el último history_id de su historial (simple_history):
+    al buscar, solo se vuelven a leer los registros con cambios posteriores
+    a la marca, así que el índice se actualiza de forma incremental tanto
+    con los cambios de este proceso como con los de otros workers, y un
+    worker nuevo parte del archivo en lugar de reconstruirlo.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.indice = None
+        self.marcas = {}
+
+    def historial(self, label):
+        return apps.get_model(label).history
+
+    def marca_actual(self, label):
+        return self.historial(label).aggregate(ultima=Max('history_id'))['ultima'] or 0
+
+    def indexar(self, label, ids=None):
+        """Vuelve a leer los registros (todos, o los ids indicados) del modelo."""
+        modelo = apps.get_model(label)
+        registros = modelo.objects.all() if ids is None else modelo.objects.filter(pk__in=ids)
+        campos, _ = FUENTES[label]
+        encontrados = set()
+        for registro in registros.only('pk', *campos):
+            encontrados.add(registro.pk)
+            self.indice.agregar(f'{label}:{registro.pk}', terminos(texto_registro(label, registro)))
+        for pk in set(ids or ()) - encontrados:
+            self.indice.quitar(f'{label}:{pk}')
+
+    def cargar(self):
+        self.indice = IndiceBM25()
+        self.marcas = {}
+        try:
+            with open(self.ruta, encoding='utf-8') as archivo:
+                datos = json.load(archivo)
+        except (OSError, ValueError):
+            return
+        if datos.get('formato') != VERSION_FORMATO:
+            return
+        for clave, frecuencias in datos['documentos'].items():
+            self.indice.agregar(clave, list(Counter(frecuencias).elements()))
+        self.marcas = {label: marca for label, marca in datos['marcas'].items() if label in FUENTES}
+
+    def guardar(self):
+        # Se escribe en un temporal y se reemplaza: los otros procesos nunca
+        # leen un archivo a medias
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(self.ruta), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+                json.dump(
+                    {'formato': VERSION_FORMATO, 'marcas': self.marcas, 'documentos': self.indice.documentos()},
+                    archivo,
+                )
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el índice en {self.ruta}: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    def sincronizar(self):
+        """Aplica los cambios registrados en el historial desde la última marca."""
+        if self.indice is None:
+            self.cargar()
+
+        inicio = time.perf_counter()
+        cambios = 0
+        for label in FUENTES:
+            # La marca se lee antes que los registros: un cambio que llegue
+            # mientras se indexa se vuelve a aplicar en la siguiente búsqueda
+            marca = self.marca_actual(label)
+            anterior = self.marcas.get(label)
+            if anterior == marca:
+                continue
+            if anterior is None or marca < anterior:
+                # Sin índice guardado o historial depurado: se indexa todo
+                self.indexar(label)
+            else:
+                ids = set(
+                    self.historial(label)
+                    .filter(history_id__gt=anterior)
+                    .values_list('id', flat=True)
+                )
+                self.indexar(label, ids)
+                cambios += len(ids)
+            self.marcas[label] = marca
+            cambios += 1
+
+        if cambios:
+            self.guardar()
+            logger.info(
+                f"Índice MCP actualizado: {len(self.indice)} documentos "
+                f"en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+            )
+
+    def buscar(self, consulta, k, labels=None):
+        """[(label, pk, puntuación)] de los k registros más relevantes para los términos."""
+        with self.lock:
+            self.sincronizar()
+            prefijos = tuple(f'{label}:' for label in labels) if labels else None
+            resultados = self.indice.buscar(consulta, k, prefijos)
+        return [(clave.rsplit(':', 1)[0], clave.rsplit(':', 1)[1], puntuacion) for clave, puntuacion in resultados]
+
+
+def describir(label, registro):
+    campos, nombre = FUENTES[label]
+    partes = [str(getattr(registro, campo)) for campo in campos if getattr(registro, campo, None)]
+    texto = ' — '.join(partes)
+    return f"[{nombre}] {texto[:240]}{'...' if len(texto) > 240 else ''}"
+
+
+def contexto_relevante(prompt, intencion, k=None):
+    """
+    Texto con los registros más relevantes para la pregunta, en orden de
+    relevancia, o "" si ninguno comparte términos con ella (sin contar las
+    palabras que solo indican la intención, como "proyectos").
+    """
+    if intencion not in MODELOS_BUSQUEDA:
+        return ''
+    palabras_intencion = {
+        raiz(normalizar_prompt(palabra))
+        for nombre, palabras, _ in INTENCIONES
+        if nombre == intencion
+        for palabra in palabras
+    }
+    consulta = [termino for termino in terminos(prompt) if termino not in palabras_intencion]
+    if not consulta:
+        return ''
+
+    k = k or settings.MCP_CONFIG['CONTEXT_TOP_K']
+    resultados = indice_entidades.buscar(consulta, k, MODELOS_BUSQUEDA[intencion])
+    if not resultados:
+        return ''
+
+    por_modelo = {}
+    for label, pk, _ in resultados:
+        por_modelo.setdefault(label, []).append(pk)
+    registros = {}
+    for label, pks in por_modelo.items():
+        for registro in apps.get_model(label).objects.filter(pk__in=pks):
+            registros[(label, str(registro.pk))] = registro
+
+    # Un registro borrado después de la última sincronización no aparece
+    encontrados = [(label, registros[(label, pk)]) for label, pk, _ in resultados if (label, pk) in registros]
+    lineas = [f"{i}. {describir(label, registro)}" for i, (label, registro) in enumerate(encontrados, 1)]
+    return 'REGISTROS RELEVANTES:\n' + '\n'.join(lineas) if lineas else ''
+
+
+indice_entidades = IndiceEntidades(settings.MCP_CONFIG['INDEX_PATH'])
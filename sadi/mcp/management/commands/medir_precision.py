@@ -0,0 +1,228 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mcp.mcp_service import PRECISIONES, OptimizedSpanishMCPService, resolver_precision
+
+# Prompts fijos (pregunta, contexto de la base de datos) con los que se mide
+# cada precisión y se comparan sus respuestas con las de float32
+PROMPTS = [
+    (
+        "¿Cuáles son mis proyectos?",
+        "PROYECTOS REGISTRADOS:\n"
+        "1. Fortalecimiento de la investigación\n"
+        "   Clave: PE1-OE2-PY1\n"
+        "   Objetivo: Incrementar la producción académica",
+    ),
+    (
+        "¿Qué metas tengo pendientes?",
+        "METAS DEL CICLO 2025:\n"
+        "1. Publicar 3 artículos arbitrados (En Proceso)\n"
+        "2. Titular a 20 estudiantes (No Cumplida)",
+    ),
+    (
+        "¿Qué actividades vencen este mes?",
+        "ACTIVIDADES:\n"
+        "1. Entrega de informe trimestral - Fin: 30/06/2025 (En Proceso)\n"
+        "2. Registro de tesis - Fin: 15/06/2025 (Cumplida)",
+    ),
+    (
+        "¿Cuál es el ciclo activo?",
+        "CICLOS:\n1. Ciclo 2025 - del 01/01/2025 al 31/12/2025 (activo)",
+    ),
+    (
+        "Resume el avance de mi departamento",
+        "DEPARTAMENTO: Ciencias Básicas\n"
+        "Metas: 12 (5 cumplidas, 4 en proceso, 3 no cumplidas)\n"
+        "Actividades: 48 (30 cumplidas)",
+    ),
+]
+
+
+def rss_actual_mb():
+    """Memoria residente actual del proceso (VmRSS)."""
+    with open("/proc/self/status") as status:
+        for linea in status:
+            if linea.startswith("VmRSS:"):
+                return int(linea.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir_modo(modelo, precision, tokens):
+    """
+    Carga el modelo con la precisión indicada en este proceso y mide la carga,
+    la memoria, la latencia del primer token y los tokens por segundo con
+    decodificación greedy sobre PROMPTS.
+    """
+    import torch
+
+    servicio = OptimizedSpanishMCPService()
+    servicio.model_id = modelo
+    servicio.precision = precision
+
+    inicio = time.perf_counter()
+    servicio.load_model()
+    carga = time.perf_counter() - inicio
+    if servicio.model is None:
+        raise CommandError(f"No se pudo cargar {modelo} en {precision}")
+
+    parametros = {
+        "do_sample": False,
+        "repetition_penalty": 1.5,
+        "pad_token_id": servicio.tokenizer.eos_token_id,
+        "eos_token_id": servicio.tokenizer.eos_token_id,
+    }
+    primeros, salidas = [], []
+    generados, segundos = 0, 0
+    with torch.no_grad():
+        for pregunta, contexto in PROMPTS:
+            entrada = servicio.tokenizer(
+                servicio.create_spanish_prompt(pregunta, contexto), return_tensors="pt"
+            )
+            largo = entrada["input_ids"].shape[1]
+
+            t = time.perf_counter()
+            servicio.model.generate(**entrada, max_new_tokens=1, **parametros)
+            primeros.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            salida = servicio.model.generate(
+                **entrada, max_new_tokens=tokens, **parametros
+            )
+            segundos += time.perf_counter() - t
+            nuevos = salida[0, largo:].tolist()
+            generados += len(nuevos)
+            salidas.append(nuevos)
+
+    primeros.sort()
+    return {
+        "precision": precision,
+        "precision_efectiva": resolver_precision(precision),
+        "carga_s": round(carga, 2),
+        "rss_mb": round(rss_actual_mb(), 1),
+        "rss_pico_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "primer_token_ms": round(primeros[len(primeros) // 2] * 1000, 1),
+        "tokens_s": round(generados / segundos, 2) if segundos else 0,
+        "salidas": salidas,
+    }
+
+
+def coincidencia(salidas, referencia):
+    """
+    Respuestas idénticas a la referencia y fracción promedio de tokens
+    iniciales que coinciden con ella.
+    """
+    iguales, prefijos = 0, []
+    for salida, esperada in zip(salidas, referencia):
+        iguales += salida == esperada
+        comun = 0
+        for a, b in zip(salida, esperada):
+            if a != b:
+                break
+            comun += 1
+        prefijos.append(comun / max(len(salida), len(esperada), 1))
+    return iguales, round(sum(prefijos) / len(prefijos), 3)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara las precisiones de inferencia del asistente MCP (float32, "
+        "int8, bfloat16): tiempo de carga, memoria RSS, latencia del primer "
+        "token, tokens por segundo y coincidencia de las respuestas con float32."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modelo",
+            default=OptimizedSpanishMCPService().model_id,
+            help="Modelo (id de Hugging Face o ruta local)",
+        )
+        parser.add_argument(
+            "--precisiones",
+            nargs="+",
+            choices=PRECISIONES,
+            default=list(PRECISIONES),
+            help="Precisiones a medir (float32 siempre se mide como referencia)",
+        )
+        parser.add_argument(
+            "--tokens",
+            type=int,
+            default=64,
+            help="Tokens nuevos que se generan por prompt",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime el resultado en JSON"
+        )
+        # Uso interno: mide una sola precisión en este proceso
+        parser.add_argument("--solo", choices=PRECISIONES, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["solo"]:
+            resultado = medir_modo(
+                options["modelo"], options["solo"], options["tokens"]
+            )
+            self.stdout.write(json.dumps(resultado))
+            return
+
+        precisiones = ["float32"] + [
+            p for p in options["precisiones"] if p != "float32"
+        ]
+        # Cada precisión en un proceso nuevo para que la carga y la memoria
+        # no dependan de los modelos medidos antes
+        resultados = []
+        for precision in precisiones:
+            proceso = subprocess.run(
+                [
+                    sys.executable,
+                    "manage.py",
+                    "medir_precision",
+                    "--solo",
+                    precision,
+                    "--modelo",
+                    options["modelo"],
+                    "--tokens",
+                    str(options["tokens"]),
+                ],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+            )
+            if proceso.returncode:
+                raise CommandError(
+                    f"Falló la medición en {precision}:\n{proceso.stderr[-2000:]}"
+                )
+            resultados.append(json.loads(proceso.stdout.strip().splitlines()[-1]))
+
+        referencia = resultados[0]["salidas"]
+        for resultado in resultados:
+            iguales, prefijo = coincidencia(resultado.pop("salidas"), referencia)
+            resultado["respuestas_iguales"] = f"{iguales}/{len(PROMPTS)}"
+            resultado["prefijo_comun"] = prefijo
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados))
+            return
+
+        self.stdout.write(
+            f"{options['modelo']} - {len(PROMPTS)} prompts, "
+            f"{options['tokens']} tokens nuevos (greedy)"
+        )
+        self.stdout.write(
+            f"{'precisión':<18}{'carga s':>9}{'RSS MB':>9}{'pico MB':>9}"
+            f"{'1er token ms':>14}{'tok/s':>8}{'iguales':>9}{'prefijo':>9}"
+        )
+        for r in resultados:
+            nombre = r["precision"]
+            if r["precision_efectiva"] != nombre:
+                nombre += f"→{r['precision_efectiva']}"
+            self.stdout.write(
+                f"{nombre:<18}{r['carga_s']:>9}{r['rss_mb']:>9}{r['rss_pico_mb']:>9}"
+                f"{r['primer_token_ms']:>14}{r['tokens_s']:>8}"
+                f"{r['respuestas_iguales']:>9}{r['prefijo_comun']:>9}"
+            )
@@ -0,0 +1,114 @@
+import json
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mcp.mcp_service import (
+    PRECISIONES,
+    OptimizedSpanishMCPService,
+    plantilla_prompt,
+)
+from .medir_precision import PROMPTS
+
+
+def medir_primer_token(servicio, pregunta, spanish_prompt, usar_prefijo, repeticiones):
+    """
+    Mediana, en ms, del tiempo hasta el primer token (preparar las entradas,
+    incluida la copia del caché del prefijo, y generar un token) y el token
+    generado.
+    """
+    import torch
+
+    parametros = dict(servicio.parametros_generacion(), max_new_tokens=1)
+    tiempos = []
+    with torch.no_grad():
+        # La primera pasada no se cuenta (reserva de memoria de torch)
+        for _ in range(repeticiones + 1):
+            t = time.perf_counter()
+            entradas = servicio.entradas_generacion(
+                pregunta, spanish_prompt, usar_prefijo
+            )
+            salida = servicio.model.generate(**entradas, **parametros)
+            tiempos.append(time.perf_counter() - t)
+    return statistics.median(tiempos[1:]) * 1000, salida[0, -1].item()
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo hasta el primer token del asistente MCP con y sin el "
+        "caché KV del preámbulo de cada plantilla del prompt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modelo",
+            default=OptimizedSpanishMCPService().model_id,
+            help="Modelo (id de Hugging Face o ruta local)",
+        )
+        parser.add_argument(
+            "--precision",
+            choices=PRECISIONES,
+            default=settings.MCP_CONFIG["PRECISION"],
+            help="Precisión con la que se carga el modelo",
+        )
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=10,
+            help="Mediciones por plantilla en cada caso",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime el resultado en JSON"
+        )
+
+    def handle(self, *args, **options):
+        servicio = OptimizedSpanishMCPService()
+        servicio.model_id = options["modelo"]
+        servicio.precision = options["precision"]
+        servicio.usar_prefijos = True
+        servicio.load_model()
+        if servicio.model is None or not servicio.prefijos:
+            raise CommandError(f"No se pudo cargar {options['modelo']}")
+
+        resultados = []
+        for pregunta, contexto in PROMPTS:
+            plantilla = plantilla_prompt(pregunta)
+            spanish_prompt = servicio.create_spanish_prompt(pregunta, contexto)
+            sin_prefijo, token_sin = medir_primer_token(
+                servicio, pregunta, spanish_prompt, False, options["repeticiones"]
+            )
+            con_prefijo, token_con = medir_primer_token(
+                servicio, pregunta, spanish_prompt, True, options["repeticiones"]
+            )
+            resultados.append(
+                {
+                    "plantilla": plantilla,
+                    "tokens_prefijo": len(servicio.prefijos[plantilla][0]),
+                    "tokens_prompt": len(
+                        servicio.tokenizer(spanish_prompt)["input_ids"]
+                    ),
+                    "sin_prefijo_ms": round(sin_prefijo, 1),
+                    "con_prefijo_ms": round(con_prefijo, 1),
+                    "reduccion": round(1 - con_prefijo / sin_prefijo, 3),
+                    "mismo_token": token_sin == token_con,
+                }
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultados))
+            return
+
+        self.stdout.write(
+            f"{options['modelo']} ({options['precision']}) - mediana de "
+            f"{options['repeticiones']} mediciones del primer token"
+        )
+        self.stdout.write(
+            f"{'plantilla':<13}{'prefijo':>9}{'prompt':>8}{'sin ms':>9}"
+            f"{'con ms':>9}{'reducción':>11}{'igual':>7}"
+        )
+        for r in resultados:
+            self.stdout.write(
+                f"{r['plantilla']:<13}{r['tokens_prefijo']:>9}{r['tokens_prompt']:>8}"
+                f"{r['sin_prefijo_ms']:>9}{r['con_prefijo_ms']:>9}"
+                f"{r['reduccion']:>11.1%}{'sí' if r['mismo_token'] else 'no':>7}"
+            )
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mcp.mcp_service import PRECISIONES, OptimizedSpanishMCPService, cargar_modelo_cpu
+
+# Procesos que pueden tener el modelo cargado
+PATRONES = ["manage.py", "gunicorn", "uwsgi"]
+
+
+def memoria_proceso(pid):
+    """
+    Memoria del proceso según /proc/<pid>/smaps_rollup, en MB: "unica" son
+    las páginas que solo tiene este proceso y "compartida" las que comparte
+    con otros (por ejemplo los pesos cargados por mmap).
+    """
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for linea in smaps:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == "kB":
+                valores[partes[0].rstrip(":")] = int(partes[1]) / 1024
+    return {
+        "pid": pid,
+        "rss": round(valores.get("Rss", 0), 1),
+        "pss": round(valores.get("Pss", 0), 1),
+        "unica": round(
+            valores.get("Private_Clean", 0) + valores.get("Private_Dirty", 0), 1
+        ),
+        "compartida": round(
+            valores.get("Shared_Clean", 0) + valores.get("Shared_Dirty", 0), 1
+        ),
+    }
+
+
+def buscar_procesos(patrones):
+    """Pids (distintos al actual) cuya línea de comandos contiene un patrón."""
+    pids = []
+    for nombre in os.listdir("/proc"):
+        if not nombre.isdigit() or int(nombre) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{nombre}/cmdline", "rb") as cmdline:
+                comando = cmdline.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if any(patron in comando for patron in patrones):
+            pids.append(int(nombre))
+    return sorted(pids)
+
+
+def medir_workers(workers, modelo, precision, compartir):
+    """
+    Arranca `workers` procesos que cargan el modelo (como lo haría cada worker
+    web sin servidor de inferencia) y mide su memoria con todos cargados.
+    """
+    procesos = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "manage.py",
+                "reporte_memoria",
+                "--worker",
+                "--modelo",
+                modelo,
+                "--precision",
+                precision,
+            ]
+            + (["--compartir"] if compartir else []),
+            cwd=settings.BASE_DIR,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        for _ in range(workers)
+    ]
+    try:
+        for proceso in procesos:
+            if proceso.stdout.readline().strip() != "listo":
+                raise CommandError(f"Un worker no pudo cargar {modelo}")
+        return [memoria_proceso(proceso.pid) for proceso in procesos]
+    finally:
+        # Al cerrar su stdin cada worker termina
+        for proceso in procesos:
+            proceso.stdin.close()
+        for proceso in procesos:
+            proceso.wait()
+
+
+class Command(BaseCommand):
+    help = (
+        "Reporta la memoria única y compartida de los procesos que pueden tener "
+        "el modelo MCP cargado. Con --comparar arranca varios workers que cargan "
+        "el modelo con y sin pesos compartidos (mmap) y compara su memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pids", nargs="+", type=int, help="Procesos a reportar (por pid)"
+        )
+        parser.add_argument(
+            "--patron",
+            nargs="+",
+            default=PATRONES,
+            help="Reporta los procesos cuya línea de comandos contiene estos textos",
+        )
+        parser.add_argument(
+            "--comparar",
+            action="store_true",
+            help="Compara workers con pesos privados contra pesos compartidos",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="Workers que se arrancan en cada caso con --comparar",
+        )
+        parser.add_argument(
+            "--modelo",
+            default=OptimizedSpanishMCPService().model_id,
+            help="Modelo (id de Hugging Face o ruta local) para --comparar",
+        )
+        parser.add_argument(
+            "--precision",
+            choices=PRECISIONES,
+            default=settings.MCP_CONFIG["PRECISION"],
+            help="Precisión con la que cargan el modelo los workers",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Imprime el resultado en JSON"
+        )
+        # Uso interno: proceso que carga el modelo y espera a que lo midan
+        parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+        parser.add_argument("--compartir", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self.worker(options)
+
+        if options["comparar"]:
+            workers = max(2, options["workers"])
+            resultado = {
+                "privados": medir_workers(
+                    workers, options["modelo"], options["precision"], False
+                ),
+                "compartidos": medir_workers(
+                    workers, options["modelo"], options["precision"], True
+                ),
+            }
+        else:
+            pids = options["pids"] or buscar_procesos(options["patron"])
+            resultado = {"procesos": [memoria_proceso(pid) for pid in pids]}
+
+        if options["json"]:
+            self.stdout.write(json.dumps(resultado))
+            return
+
+        for titulo, procesos in resultado.items():
+            self.stdout.write(f"\n{titulo.capitalize()}:")
+            self.stdout.write(
+                f"{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'única MB':>10}"
+                f"{'compartida MB':>15}"
+            )
+            for p in procesos:
+                self.stdout.write(
+                    f"{p['pid']:>8}{p['rss']:>10}{p['pss']:>10}{p['unica']:>10}"
+                    f"{p['compartida']:>15}"
+                )
+            # El PSS reparte las páginas compartidas entre los procesos que
+            # las usan: su suma es la memoria real que ocupan todos juntos
+            self.stdout.write(
+                f"{'total':>8}{round(sum(p['rss'] for p in procesos), 1):>10}"
+                f"{round(sum(p['pss'] for p in procesos), 1):>10}"
+                f"{round(sum(p['unica'] for p in procesos), 1):>10}"
+            )
+
+    def worker(self, options):
+        import torch
+
+        model = cargar_modelo_cpu(
+            options["modelo"], options["precision"], options["compartir"]
+        )
+        # Una pasada hacia adelante para que todas las páginas de los pesos
+        # estén residentes al medir
+        with torch.no_grad():
+            model(torch.tensor([[1, 2, 3]]))
+        self.stdout.write("listo")
+        self.stdout.flush()
+        sys.stdin.read()
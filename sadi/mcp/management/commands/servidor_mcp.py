@@ -0,0 +1,71 @@
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from mcp.mcp_service import mcp_service
+from mcp.servidor import ServidorInferencia, crear_servidor
+
+
+class Command(BaseCommand):
+    help = (
+        "Servidor local de inferencia del asistente MCP: carga el modelo una "
+        "sola vez y atiende a los workers web con una cola acotada."
+    )
+
+    def add_arguments(self, parser):
+        url = urlparse(settings.MCP_CONFIG["SERVER_URL"] or "http://127.0.0.1:8765")
+        parser.add_argument(
+            "--host", default=url.hostname, help="Dirección en la que escucha"
+        )
+        parser.add_argument(
+            "--puerto",
+            type=int,
+            default=url.port or 80,
+            help="Puerto en el que escucha",
+        )
+        parser.add_argument(
+            "--cola",
+            type=int,
+            default=settings.MCP_CONFIG["QUEUE_SIZE"],
+            help="Solicitudes que pueden esperar turno (con la cola llena se responde 503)",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=settings.MCP_CONFIG["TIMEOUT"],
+            help="Segundos máximos por solicitud (espera en cola + generación)",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=settings.MCP_CONFIG["BATCH_SIZE"],
+            help="Máximo de solicitudes que se generan juntas",
+        )
+        parser.add_argument(
+            "--espera-ms",
+            type=int,
+            default=settings.MCP_CONFIG["BATCH_WAIT_MS"],
+            help="Milisegundos que se esperan otras solicitudes para formar un lote",
+        )
+
+    def handle(self, *args, **options):
+        inferencia = ServidorInferencia(
+            mcp_service,
+            max(1, options["cola"]),
+            options["timeout"],
+            tamano_lote=options["lote"],
+            ventana=options["espera_ms"] / 1000,
+        )
+        inferencia.iniciar()
+
+        servidor = crear_servidor(inferencia, options["host"], options["puerto"])
+        self.stdout.write(
+            f"Servidor MCP en http://{options['host']}:{options['puerto']} "
+            f"(cola {options['cola']}, timeout {options['timeout']} s, "
+            f"lotes de hasta {options['lote']} en {options['espera_ms']} ms)"
+        )
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo servidor MCP...")
+        finally:
+            servidor.server_close()
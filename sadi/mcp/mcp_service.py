@@ -1,19 +1,176 @@
 # mcp/mcp_service.py
-import torch
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
+# torch y transformers se importan dentro de las funciones que los usan: este
+# módulo se importa al cargar las URLs y no debe retrasar el arranque de los
+# workers web (ver "python manage.py medir_arranque")
 from django.conf import settings
 import logging
 import gc
+import os
 import re
+import shutil
+import tempfile
+import threading
+import time
+from .contexto import ajustar_contexto
 
 logger = logging.getLogger(__name__)
 
+# Ventana de contexto si la configuración del modelo no la indica
+VENTANA_PREDETERMINADA = 2048
+
+# Plantillas del prompt. Todo lo anterior a {db_context} es fijo: su caché KV
+# se calcula una vez al cargar el modelo (ver preparar_prefijos)
+INSTRUCCION = "Responde en español usando SOLO esta información:\n\n"
+PLANTILLAS = {
+    nombre: INSTRUCCION + f"INFORMACIÓN DE {titulo}:\n{{db_context}}\n\nPREGUNTA: {{prompt}}\n\n"
+    "RESPUESTA (solo en español, solo información de arriba):"
+    for nombre, titulo in [
+        ('proyectos', 'PROYECTOS'),
+        ('metas', 'METAS'),
+        ('actividades', 'ACTIVIDADES'),
+        ('ciclos', 'CICLOS'),
+    ]
+}
+PLANTILLAS['general'] = INSTRUCCION + "{db_context}\n\nPREGUNTA: {prompt}\n\nRESPUESTA:"
+
+
+# Pregunta y contexto de la generación de calentamiento
+CALENTAMIENTO = ("¿Cuáles son mis metas?", "METAS ACTIVAS:\n1. Meta de prueba\n   Clave: M1")
+
+
+def plantilla_prompt(prompt):
+    """Plantilla que corresponde a la pregunta."""
+    prompt_lower = prompt.lower()
+    if 'proyecto' in prompt_lower:
+        return 'proyectos'
+    elif 'meta' in prompt_lower or 'objetivo' in prompt_lower:
+        return 'metas'
+    elif 'actividad' in prompt_lower:
+        return 'actividades'
+    elif 'ciclo' in prompt_lower:
+        return 'ciclos'
+    return 'general'
+
+
+PRECISIONES = ("float32", "int8", "bfloat16")
+
+
+def soporta_bfloat16():
+    """Si el CPU tiene instrucciones bfloat16 nativas (AVX512-BF16 o AMX)."""
+    import torch
+
+    return torch.cpu._is_avx512_bf16_supported() or torch.cpu._is_amx_tile_supported()
+
+
+def resolver_precision(precision):
+    """
+    Precisión efectiva para MCP_CONFIG["PRECISION"]: bfloat16 sin soporte en
+    el CPU es más lento que float32, así que en ese caso se usa float32.
+    """
+    if precision not in PRECISIONES:
+        raise ValueError(f"Precisión no soportada: {precision} (opciones: {', '.join(PRECISIONES)})")
+    if precision == "bfloat16" and not soporta_bfloat16():
+        logger.warning("⚠️ El CPU no soporta bfloat16, se usa float32")
+        return "float32"
+    return precision
+
+
+def ruta_pesos_compartidos(model_id, dtype):
+    nombre = model_id.strip("/").replace("/", "--")
+    return os.path.join(settings.BASE_DIR, "model_cache", "compartido", f"{nombre}-{dtype}")
+
+
+def preparar_pesos_compartidos(model_id, dtype):
+    """
+    Guarda (una sola vez) una copia del modelo en safetensors con el dtype
+    indicado. transformers carga por mmap los safetensors cuyo dtype coincide
+    con el pedido, así que los pesos quedan en páginas del archivo que todos
+    los procesos comparten. Si el dtype no coincide (TinyLlama se publica en
+    bfloat16 y se usa en float32) cada proceso convierte los pesos a una copia
+    privada en memoria.
+    """
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    ruta = ruta_pesos_compartidos(model_id, dtype)
+    if os.path.exists(os.path.join(ruta, "config.json")):
+        return ruta
+
+    logger.info(f"💾 Guardando pesos {dtype} para compartir en {ruta}...")
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype=getattr(torch, dtype),
+        low_cpu_mem_usage=True,
+        trust_remote_code=True,
+    )
+    # Se escribe en un directorio temporal y se renombra: otro proceso que lo
+    # prepare al mismo tiempo nunca ve una copia a medias
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = tempfile.mkdtemp(dir=os.path.dirname(ruta))
+    try:
+        model.save_pretrained(temporal, safe_serialization=True)
+        os.rename(temporal, ruta)
+    except OSError:
+        # Otro proceso terminó primero
+        if not os.path.exists(os.path.join(ruta, "config.json")):
+            raise
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    del model
+    gc.collect()
+    return ruta
+
+
+def cargar_modelo_cpu(model_id, precision, compartir=False):
+    """
+    Carga el modelo en CPU con la precisión indicada. En "int8" se cuantizan
+    dinámicamente las capas Linear (pesos int8, activaciones en float32). Con
+    `compartir` los pesos float32/bfloat16 se cargan por mmap desde
+    model_cache/compartido; los int8 siempre son una copia del proceso.
+    """
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    dtype = "bfloat16" if precision == "bfloat16" else "float32"
+    if compartir:
+        model_id = preparar_pesos_compartidos(model_id, dtype)
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype=getattr(torch, dtype),
+        device_map=None,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True,
+    )
+    model.eval()
+
+    if precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        # Libera los pesos float32 que reemplazó la cuantización
+        gc.collect()
+    return model
+
+
 class OptimizedSpanishMCPService:
     def __init__(self):
         self.model = None
         self.tokenizer = None
         self.pipeline = None
         self.is_loaded = False
+        self.precision = settings.MCP_CONFIG["PRECISION"]
+        self.compartir_pesos = settings.MCP_CONFIG["SHARED_WEIGHTS"]
+        self.max_new_tokens = settings.MCP_CONFIG["MAX_NEW_TOKENS"]
+        self.tokens_contexto = settings.MCP_CONFIG["CONTEXT_TOKENS"]
+        self.usar_prefijos = settings.MCP_CONFIG["PREFIX_CACHE"]
+        self.prefijos = {}
+        self.estado_carga = 'pendiente'
+        self.tiempos_carga = {}
+        self.error_carga = None
+        self.lock_carga = threading.Lock()
+        self.lock_precarga = threading.Lock()
+        self.hilo_carga = None
         
         # MODELO RECOMENDADO - Cambia esta línea según tu elección
         self.model_id = 'TinyLlama/TinyLlama-1.1B-Chat-v1.0'  # Mantenemos TinyLlama por ahora
@@ -22,10 +179,33 @@ class OptimizedSpanishMCPService:
         """Carga el modelo optimizado para español"""
         if self.is_loaded:
             return
-            
+
+        # La precarga (iniciar_precarga) y la primera solicitud pueden llegar
+        # a la vez: solo una carga el modelo y la otra la espera
+        with self.lock_carga:
+            if self.is_loaded:
+                return
+            self.cargar()
+
+    def cargar(self):
+        self.estado_carga = 'cargando'
+        self.tiempos_carga = {}
+        self.error_carga = None
+        inicio = time.perf_counter()
+        etapa = inicio
+
+        def medir(nombre):
+            nonlocal etapa
+            ahora = time.perf_counter()
+            self.tiempos_carga[nombre] = round(ahora - etapa, 3)
+            etapa = ahora
+
         try:
             logger.info(f"🚀 Cargando {self.model_id}...")
-            
+
+            import torch
+            from transformers import pipeline, AutoTokenizer
+
             torch.set_grad_enabled(False)
             
             self.tokenizer = AutoTokenizer.from_pretrained(
@@ -33,138 +213,315 @@ class OptimizedSpanishMCPService:
                 cache_dir="./model_cache"
             )
             self.tokenizer.pad_token = self.tokenizer.eos_token
+            # Modelo decoder-only: en los lotes el relleno va a la izquierda
+            self.tokenizer.padding_side = 'left'
+            medir('tokenizador_s')
             
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_id,
-                torch_dtype=torch.float32,
-                device_map=None,
-                low_cpu_mem_usage=True,
-                trust_remote_code=True,
-            )
-            
-            self.model = self.model.to('cpu')
-            self.model.eval()
+            precision = resolver_precision(self.precision)
+            self.model = cargar_modelo_cpu(self.model_id, precision, self.compartir_pesos)
+            medir('modelo_s')
             
             self.pipeline = pipeline(
                 "text-generation",
                 model=self.model,
                 tokenizer=self.tokenizer,
-                max_length=1024,
                 temperature=0.3,  # Más bajo para menos creatividad
                 do_sample=True,
                 pad_token_id=self.tokenizer.eos_token_id,
             )
+            medir('pipeline_s')
             
+            if self.usar_prefijos:
+                try:
+                    self.preparar_prefijos()
+                except Exception as e:
+                    # Sin caché de prefijos se procesa el prompt completo
+                    logger.warning(f"No se pudo precalcular el caché de prefijos: {e}")
+                    self.prefijos = {}
+                medir('prefijos_s')
+
+            self.calentar()
+            medir('calentamiento_s')
+
+            self.tiempos_carga['total_s'] = round(time.perf_counter() - inicio, 3)
             self.is_loaded = True
-            logger.info("✅ Modelo cargado correctamente")
+            self.estado_carga = 'listo'
+            logger.info(f"✅ Modelo cargado correctamente ({precision}): {self.tiempos_carga}")
             
             gc.collect()
             
         except Exception as e:
             logger.error(f"❌ Error cargando modelo: {e}")
+            self.error_carga = str(e)
+            self.tiempos_carga['total_s'] = round(time.perf_counter() - inicio, 3)
             self.setup_fallback()
     
     def setup_fallback(self):
+        # Sin modelo se contesta con las respuestas directas; el estado
+        # "fallido" evita que el endpoint de disponibilidad lo reporte listo
+        self.model = None
+        self.estado_carga = 'fallido'
         self.is_loaded = True
-    
+
+    def calentar(self):
+        """
+        Generación de prueba de unos tokens: la primera solicitud real no paga
+        la inicialización perezosa de torch (reserva de memoria, kernels).
+        """
+        import torch
+
+        pregunta, contexto = CALENTAMIENTO
+        entradas = self.entradas_generacion(pregunta, self.create_spanish_prompt(pregunta, contexto))
+        with torch.no_grad():
+            self.model.generate(**entradas, **dict(self.parametros_generacion(), max_new_tokens=4))
+
+    def iniciar_precarga(self):
+        """Carga y calienta el modelo en un hilo (si no está cargado ni cargando)."""
+        with self.lock_precarga:
+            if self.is_loaded or (self.hilo_carga and self.hilo_carga.is_alive()):
+                return
+            self.estado_carga = 'cargando'
+            self.hilo_carga = threading.Thread(target=self.load_model, name='mcp-precarga', daemon=True)
+            self.hilo_carga.start()
+
+    def estado(self):
+        """Estado de la carga (pendiente, cargando, listo o fallido) y sus tiempos."""
+        return {
+            'estado': self.estado_carga,
+            'modelo': self.model_id,
+            'precision': self.precision,
+            'tiempos': self.tiempos_carga,
+            'error': self.error_carga,
+        }
+
     def generate_contextual_response(self, prompt, db_context=""):
         """Genera respuesta optimizada para español y contexto"""
+        return self.generate_contextual_responses([(prompt, db_context)])[0]
+
+    def generate_contextual_responses(self, solicitudes):
+        """
+        Genera las respuestas de varias solicitudes (prompt, db_context) en un
+        solo lote del pipeline. Devuelve las respuestas en el mismo orden.
+        """
         if not self.is_loaded:
             self.load_model()
-        
-        # Si no hay contexto válido, respuesta directa
-        if not db_context or any(x in db_context for x in ["Error", "No hay", "Consulta general"]):
-            return self.get_spanish_fallback(prompt, db_context)
-        
+
+        respuestas = [None] * len(solicitudes)
+        pendientes = []
+        for i, (prompt, db_context) in enumerate(solicitudes):
+            # Si no hay contexto válido, respuesta directa
+            if not db_context or any(x in db_context for x in ["Error", "No hay", "Consulta general"]):
+                respuestas[i] = self.get_spanish_fallback(prompt, db_context)
+            else:
+                pendientes.append(i)
+
+        if not pendientes:
+            return respuestas
+
         try:
             # PROMPT MEJORADO - Más específico y en español
-            spanish_prompt = self.create_spanish_prompt(prompt, db_context)
-            
-            # Generación con parámetros optimizados
-            with torch.no_grad():
-                outputs = self.pipeline(
-                    spanish_prompt,
-                    max_new_tokens=300,
-                    num_return_sequences=1,
-                    temperature=0.2,  # Muy bajo para máxima precisión
-                    top_p=0.7,
-                    repetition_penalty=1.5,  # Alto para evitar repetición
-                    do_sample=False,  # Desactivado para más consistencia
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,
-                )
-            
-            response = outputs[0]['generated_text']
-            
-            # Extraer respuesta
-            if spanish_prompt in response:
-                response = response.replace(spanish_prompt, '').strip()
-            
-            # Limpieza mejorada
-            response = self.clean_spanish_response(response)
-            
-            # Verificar si la respuesta es útil
-            if not self.is_useful_response(response, db_context):
-                return self.get_contextual_direct_response(prompt, db_context)
-            
-            return response
-            
+            spanish_prompts = [self.preparar_prompt(*solicitudes[i]) for i in pendientes]
+
+            import torch
+
+            if len(spanish_prompts) == 1 and self.prefijos:
+                # Una sola solicitud: se reutiliza el caché KV del preámbulo
+                # de la plantilla (en un lote con relleno a la izquierda el
+                # preámbulo no queda en las mismas posiciones)
+                entradas = self.entradas_generacion(solicitudes[pendientes[0]][0], spanish_prompts[0])
+                with torch.no_grad():
+                    salida = self.model.generate(**entradas, **self.parametros_generacion())
+                nuevos = salida[0, entradas['input_ids'].shape[1]:]
+                generadas = [self.tokenizer.decode(nuevos, skip_special_tokens=True).strip()]
+            else:
+                # Generación con parámetros optimizados; los prompts del lote
+                # se rellenan (a la izquierda) hasta el más largo
+                with torch.no_grad():
+                    outputs = self.pipeline(
+                        spanish_prompts,
+                        batch_size=len(spanish_prompts),
+                        max_new_tokens=self.max_new_tokens,
+                        num_return_sequences=1,
+                        temperature=0.2,  # Muy bajo para máxima precisión
+                        top_p=0.7,
+                        repetition_penalty=1.5,  # Alto para evitar repetición
+                        do_sample=False,  # Desactivado para más consistencia
+                        pad_token_id=self.tokenizer.eos_token_id,
+                        eos_token_id=self.tokenizer.eos_token_id,
+                    )
+
+                generadas = []
+                for spanish_prompt, output in zip(spanish_prompts, outputs):
+                    response = output[0]['generated_text']
+
+                    # Extraer respuesta
+                    if spanish_prompt in response:
+                        response = response.replace(spanish_prompt, '').strip()
+                    generadas.append(response)
+
+            for i, response in zip(pendientes, generadas):
+                respuestas[i] = self.finish_response(*solicitudes[i], response)
+
         except Exception as e:
             logger.error(f"Error en generación: {e}")
+            for i in pendientes:
+                if respuestas[i] is None:
+                    respuestas[i] = self.get_contextual_direct_response(*solicitudes[i])
+
+        return respuestas
+
+    def parametros_generacion(self):
+        """Parámetros de model.generate() (decodificación greedy)."""
+        return {
+            'max_new_tokens': self.max_new_tokens,
+            'repetition_penalty': 1.5,  # Alto para evitar repetición
+            'do_sample': False,  # Desactivado para más consistencia
+            'pad_token_id': self.tokenizer.eos_token_id,
+            'eos_token_id': self.tokenizer.eos_token_id,
+        }
+
+    def finish_response(self, prompt, db_context, response):
+        """Limpia la respuesta generada o la sustituye si no es útil"""
+        # Limpieza mejorada
+        response = self.clean_spanish_response(response)
+
+        # Verificar si la respuesta es útil
+        if not self.is_useful_response(response, db_context):
             return self.get_contextual_direct_response(prompt, db_context)
-    
-    def create_spanish_prompt(self, prompt, db_context):
-        """Crea prompt optimizado para español"""
-        prompt_templates = {
-            'proyectos': f"""Responde en español usando SOLO esta información:
 
-INFORMACIÓN DE PROYECTOS:
-{db_context}
+        return response
 
-PREGUNTA: {prompt}
+    def stream_contextual_response(self, prompt, db_context="", cancelada=lambda: False):
+        """
+        Genera la respuesta token a token (TextIteratorStreamer) como pares
+        ("token", fragmento) y al final ("fin", respuesta), con la respuesta
+        limpia (o la respuesta directa si la generada no es útil). La
+        generación se detiene en cuanto cancelada() devuelve True (el cliente
+        se desconectó) o se deja de consumir el generador.
+        """
+        if not self.is_loaded:
+            self.load_model()
 
-RESPUESTA (solo en español, solo información de arriba):""",
+        # Si no hay contexto válido (o no hay modelo), respuesta directa
+        if (
+            self.model is None
+            or not db_context
+            or any(x in db_context for x in ["Error", "No hay", "Consulta general"])
+        ):
+            yield 'fin', self.generate_contextual_response(prompt, db_context)
+            return
 
-            'metas': f"""Responde en español usando SOLO esta información:
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 
-INFORMACIÓN DE METAS:
-{db_context}
+        detener = threading.Event()
 
-PREGUNTA: {prompt}
+        class Cancelacion(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                parar = detener.is_set() or bool(cancelada())
+                return torch.full((input_ids.shape[0],), parar, dtype=torch.bool)
 
-RESPUESTA (solo en español, solo información de arriba):""",
+        spanish_prompt = self.preparar_prompt(prompt, db_context)
+        inputs = self.entradas_generacion(prompt, spanish_prompt)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
 
-            'actividades': f"""Responde en español usando SOLO esta información:
+        def generar():
+            try:
+                with torch.no_grad():
+                    self.model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        **self.parametros_generacion(),
+                        stopping_criteria=StoppingCriteriaList([Cancelacion()]),
+                    )
+            except Exception as e:
+                logger.error(f"Error en generación: {e}")
+                streamer.end()
 
-INFORMACIÓN DE ACTIVIDADES:
-{db_context}
+        hilo = threading.Thread(target=generar, daemon=True)
+        hilo.start()
+        partes = []
+        try:
+            for texto in streamer:
+                if texto:
+                    partes.append(texto)
+                    yield 'token', texto
+        finally:
+            detener.set()
+            hilo.join()
 
-PREGUNTA: {prompt}
+        yield 'fin', self.finish_response(prompt, db_context, ''.join(partes))
 
-RESPUESTA (solo en español, solo información de arriba):""",
+    def presupuesto_contexto(self, prompt):
+        """
+        Tokens disponibles para el contexto: los de CONTEXT_TOKENS, sin pasar
+        de lo que deja libre la ventana del modelo después de la plantilla, la
+        pregunta y los max_new_tokens de la respuesta.
+        """
+        ventana = getattr(self.model.config, 'max_position_embeddings', None) or VENTANA_PREDETERMINADA
+        plantilla = len(self.tokenizer(self.create_spanish_prompt(prompt, ''))['input_ids'])
+        return max(0, min(self.tokens_contexto, ventana - self.max_new_tokens - plantilla))
 
-            'ciclos': f"""Responde en español usando SOLO esta información:
+    def preparar_prompt(self, prompt, db_context):
+        """Prompt con el contexto ajustado al presupuesto de tokens."""
+        presupuesto = self.presupuesto_contexto(prompt)
+        contexto, resumen = ajustar_contexto(self.tokenizer, prompt, db_context, presupuesto)
+        spanish_prompt = self.create_spanish_prompt(prompt, contexto)
+        logger.info(
+            f"Prompt MCP: {len(self.tokenizer(spanish_prompt)['input_ids'])} tokens "
+            f"(contexto {resumen['tokens']}/{resumen['tokens_total']} tokens, "
+            f"{resumen['fragmentos']}/{resumen['fragmentos_total']} registros, "
+            f"presupuesto {presupuesto}) + {self.max_new_tokens} de respuesta"
+        )
+        return spanish_prompt
 
-INFORMACIÓN DE CICLOS:
-{db_context}
+    def create_spanish_prompt(self, prompt, db_context):
+        """Crea prompt optimizado para español"""
+        return PLANTILLAS[plantilla_prompt(prompt)].format(prompt=prompt, db_context=db_context)
 
-PREGUNTA: {prompt}
+    def preparar_prefijos(self):
+        """
+        Precalcula el caché KV (past_key_values) del preámbulo fijo de cada
+        plantilla: al generar solo se procesan el contexto y la pregunta.
+        """
+        import torch
+
+        self.prefijos = {}
+        for nombre, plantilla in PLANTILLAS.items():
+            ids = self.tokenizer(plantilla.split('{db_context}')[0], return_tensors='pt')['input_ids']
+            with torch.no_grad():
+                salida = self.model(input_ids=ids, use_cache=True)
+            self.prefijos[nombre] = (ids[0].tolist(), salida.past_key_values)
+        logger.info(f"Caché de prefijos listo para {len(self.prefijos)} plantillas")
+
+    def entradas_generacion(self, prompt, spanish_prompt, usar_prefijo=True):
+        """
+        input_ids y attention_mask del prompt y, si empieza con el preámbulo
+        precalculado de su plantilla, una copia de su caché KV recortada a los
+        tokens en común (generate() solo procesa los tokens que faltan).
+        """
+        import copy
+        import torch
+
+        ids = self.tokenizer(spanish_prompt, return_tensors='pt')['input_ids']
+        entradas = {'input_ids': ids, 'attention_mask': torch.ones_like(ids)}
+        prefijo = self.prefijos.get(plantilla_prompt(prompt)) if usar_prefijo else None
+        if prefijo:
+            ids_prefijo, cache = prefijo
+            # Al menos un token del prompt se procesa para obtener el primero
+            # de la respuesta
+            comunes = 0
+            for a, b in zip(ids_prefijo, ids[0, :-1].tolist()):
+                if a != b:
+                    break
+                comunes += 1
+            if comunes:
+                # Copia: generate() agrega al caché los tokens nuevos
+                cache = copy.deepcopy(cache)
+                cache.crop(comunes)
+                entradas['past_key_values'] = cache
+        return entradas
 
-RESPUESTA (solo en español, solo información de arriba):"""
-        }
-        
-        prompt_lower = prompt.lower()
-        if 'proyecto' in prompt_lower:
-            return prompt_templates['proyectos']
-        elif 'meta' in prompt_lower or 'objetivo' in prompt_lower:
-            return prompt_templates['metas']
-        elif 'actividad' in prompt_lower:
-            return prompt_templates['actividades']
-        elif 'ciclo' in prompt_lower:
-            return prompt_templates['ciclos']
-        else:
-            return f"Responde en español usando SOLO esta información:\n\n{db_context}\n\nPREGUNTA: {prompt}\n\nRESPUESTA:"
-    
     def clean_spanish_response(self, response):
         """Limpia respuestas en español"""
         # Eliminar frases en inglés
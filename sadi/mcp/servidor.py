@@ -0,0 +1,334 @@
+# mcp/servidor.py
+# Servidor local de inferencia: un solo proceso con el modelo cargado que
+# atiende las generaciones de todos los workers web (ver mcp/cliente.py)
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class Solicitud:
+    """Generación pendiente; el hilo HTTP espera a que el modelo la resuelva."""
+
+    def __init__(self, prompt, db_context, flujo=False):
+        self.prompt = prompt
+        self.db_context = db_context
+        # Solicitudes por streaming: los eventos ("token"/"fin"/"error", texto)
+        # se van dejando aquí y al final un None
+        self.eventos = queue.Queue() if flujo else None
+        self.creada = time.monotonic()
+        self.listo = threading.Event()
+        self.respuesta = None
+        self.error = None
+        # Se marca si el cliente dejó de esperar (timeout) antes de su turno
+        self.cancelada = False
+
+
+def percentiles(valores):
+    """p50, p95 y máximo (en ms) de una lista de duraciones en segundos."""
+    if not valores:
+        return {'p50': 0, 'p95': 0, 'max': 0}
+    ordenados = sorted(valores)
+    return {
+        'p50': round(ordenados[len(ordenados) // 2] * 1000, 1),
+        'p95': round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000, 1),
+        'max': round(ordenados[-1] * 1000, 1),
+    }
+
+
+class MetricasLotes:
+    """Tamaño de los lotes y latencias de las últimas solicitudes."""
+
+    # Solicitudes recientes con las que se calculan los percentiles
+    MUESTRAS = 500
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tamanos = Counter()
+        self.latencias = deque(maxlen=self.MUESTRAS)
+        self.esperas = deque(maxlen=self.MUESTRAS)
+        self.generaciones = deque(maxlen=self.MUESTRAS)
+
+    def registrar(self, lote, inicio, fin):
+        with self.lock:
+            self.tamanos[len(lote)] += 1
+            self.generaciones.append(fin - inicio)
+            for solicitud in lote:
+                self.esperas.append(inicio - solicitud.creada)
+                self.latencias.append(fin - solicitud.creada)
+
+    def resumen(self):
+        with self.lock:
+            lotes = sum(self.tamanos.values())
+            solicitudes = sum(tamano * n for tamano, n in self.tamanos.items())
+            return {
+                'lotes': lotes,
+                'tamano_lote_promedio': round(solicitudes / lotes, 2) if lotes else 0,
+                'tamanos_lote': dict(sorted(self.tamanos.items())),
+                'latencia_ms': percentiles(list(self.latencias)),
+                'espera_cola_ms': percentiles(list(self.esperas)),
+                'generacion_lote_ms': percentiles(list(self.generaciones)),
+            }
+
+
+class ServidorInferencia:
+    """
+    Cola acotada de solicitudes delante del servicio MCP. Un único hilo
+    genera las respuestas por lotes: toma la primera solicitud en espera y
+    junta las que lleguen durante `ventana` segundos (hasta `tamano_lote`)
+    para generarlas juntas. Si la cola está llena la solicitud se rechaza en
+    lugar de esperar indefinidamente.
+    """
+
+    def __init__(self, servicio, capacidad, timeout, tamano_lote=1, ventana=0):
+        self.servicio = servicio
+        self.timeout = timeout
+        self.tamano_lote = max(1, tamano_lote)
+        self.ventana = ventana
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.metricas = MetricasLotes()
+        # Solicitud por streaming que llegó mientras se armaba un lote
+        self.siguiente = None
+        self.atendidas = 0
+        self.rechazadas = 0
+        self.vencidas = 0
+
+    def iniciar(self):
+        threading.Thread(target=self.atender, name='mcp-inferencia', daemon=True).start()
+
+    def tomar_lote(self):
+        """
+        Espera la primera solicitud y junta las que lleguen en la ventana. Las
+        solicitudes por streaming se generan solas.
+        """
+        lote = []
+        while not lote:
+            if self.siguiente:
+                solicitud, self.siguiente = self.siguiente, None
+            else:
+                solicitud = self.cola.get()
+            if not solicitud.cancelada:
+                lote.append(solicitud)
+        if lote[0].eventos is not None:
+            return lote
+
+        limite = time.monotonic() + self.ventana
+        while len(lote) < self.tamano_lote:
+            restante = limite - time.monotonic()
+            try:
+                # Pasada la ventana solo se toman las que ya están en cola
+                if restante > 0:
+                    solicitud = self.cola.get(timeout=restante)
+                else:
+                    solicitud = self.cola.get_nowait()
+            except queue.Empty:
+                break
+            if solicitud.eventos is not None:
+                self.siguiente = solicitud
+                break
+            if not solicitud.cancelada:
+                lote.append(solicitud)
+        return lote
+
+    def atender(self):
+        # Se carga y calienta el modelo antes de la primera solicitud; las
+        # que llegan mientras tanto esperan en la cola
+        self.servicio.load_model()
+        while True:
+            lote = self.tomar_lote()
+            if lote[0].eventos is not None:
+                self.atender_flujo(lote[0])
+                continue
+
+            inicio = time.monotonic()
+            try:
+                respuestas = self.servicio.generate_contextual_responses(
+                    [(solicitud.prompt, solicitud.db_context) for solicitud in lote]
+                )
+                error = None
+            except Exception as e:
+                logger.exception('Error generando respuestas')
+                respuestas = [None] * len(lote)
+                error = str(e)
+            fin = time.monotonic()
+
+            for solicitud, respuesta in zip(lote, respuestas):
+                solicitud.respuesta = respuesta
+                solicitud.error = error
+                solicitud.listo.set()
+            self.atendidas += len(lote)
+            self.metricas.registrar(lote, inicio, fin)
+            logger.info(f'Lote de {len(lote)} solicitudes en {(fin - inicio) * 1000:.0f} ms')
+
+    def atender_flujo(self, solicitud):
+        inicio = time.monotonic()
+        try:
+            for evento in self.servicio.stream_contextual_response(
+                solicitud.prompt, solicitud.db_context, lambda: solicitud.cancelada
+            ):
+                solicitud.eventos.put(evento)
+        except Exception as e:
+            logger.exception('Error generando respuesta por streaming')
+            solicitud.eventos.put(('error', str(e)))
+        finally:
+            solicitud.eventos.put(None)
+            solicitud.listo.set()
+
+        fin = time.monotonic()
+        self.atendidas += 1
+        self.metricas.registrar([solicitud], inicio, fin)
+        estado = 'cancelada' if solicitud.cancelada else 'completa'
+        logger.info(f'Respuesta por streaming {estado} en {(fin - inicio) * 1000:.0f} ms')
+
+    def encolar(self, solicitud):
+        """Lanza queue.Full si no hay lugar en la cola."""
+        try:
+            self.cola.put_nowait(solicitud)
+        except queue.Full:
+            self.rechazadas += 1
+            raise
+        return solicitud
+
+    def generar(self, prompt, db_context):
+        """
+        Encola la solicitud y espera su respuesta. Lanza queue.Full si no hay
+        lugar en la cola y TimeoutError si no termina a tiempo.
+        """
+        solicitud = self.encolar(Solicitud(prompt, db_context))
+
+        if not solicitud.listo.wait(self.timeout):
+            solicitud.cancelada = True
+            self.vencidas += 1
+            raise TimeoutError(f'Sin respuesta en {self.timeout} s')
+        if solicitud.error:
+            raise RuntimeError(solicitud.error)
+        return solicitud.respuesta, time.monotonic() - solicitud.creada
+
+    def estado(self):
+        return {
+            'cargado': self.servicio.is_loaded,
+            'carga': self.servicio.estado(),
+            'en_cola': self.cola.qsize(),
+            'capacidad': self.cola.maxsize,
+            'tamano_lote_max': self.tamano_lote,
+            'ventana_ms': round(self.ventana * 1000),
+            'atendidas': self.atendidas,
+            'rechazadas': self.rechazadas,
+            'vencidas': self.vencidas,
+            **self.metricas.resumen(),
+        }
+
+
+class ManejadorInferencia(BaseHTTPRequestHandler):
+    """
+    POST /generar  {"prompt", "db_context"} -> {"response", "segundos"}
+    POST /generar/flujo  {"prompt", "db_context"} -> eventos token/fin/error
+    GET  /estado   -> cola, contadores y métricas de los lotes
+    GET  /listo    -> estado de la carga del modelo: 200 si está listo, 503 si no
+    """
+
+    servidor_inferencia = None
+
+    def responder(self, status, datos, encabezados=None):
+        cuerpo = json.dumps(datos).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for nombre, valor in (encabezados or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        if self.path == '/listo':
+            carga = self.servidor_inferencia.servicio.estado()
+            return self.responder(200 if carga['estado'] == 'listo' else 503, carga)
+        if self.path != '/estado':
+            return self.responder(404, {'error': 'No encontrado'})
+        self.responder(200, self.servidor_inferencia.estado())
+
+    def responder_ocupado(self):
+        self.responder(
+            503,
+            {'error': 'El asistente está ocupado, intenta de nuevo en unos segundos.'},
+            {'Retry-After': '5'},
+        )
+
+    def do_POST(self):
+        if self.path not in ('/generar', '/generar/flujo'):
+            return self.responder(404, {'error': 'No encontrado'})
+
+        try:
+            largo = int(self.headers.get('Content-Length', 0))
+            datos = json.loads(self.rfile.read(largo))
+            prompt = datos['prompt']
+        except (ValueError, KeyError):
+            return self.responder(400, {'error': 'Solicitud inválida'})
+
+        if self.path == '/generar/flujo':
+            return self.generar_flujo(prompt, datos.get('db_context', ''))
+
+        try:
+            respuesta, segundos = self.servidor_inferencia.generar(
+                prompt, datos.get('db_context', '')
+            )
+        except queue.Full:
+            return self.responder_ocupado()
+        except TimeoutError as e:
+            return self.responder(504, {'error': str(e)})
+        except RuntimeError as e:
+            return self.responder(500, {'error': str(e)})
+
+        self.responder(200, {'response': respuesta, 'segundos': round(segundos, 3)})
+
+    def enviar_evento(self, tipo, texto):
+        datos = json.dumps({'texto': texto})
+        self.wfile.write(f'event: {tipo}\ndata: {datos}\n\n'.encode('utf-8'))
+        self.wfile.flush()
+
+    def generar_flujo(self, prompt, db_context):
+        """
+        Envía la respuesta como Server-Sent Events a medida que se genera. Si
+        el cliente se desconecta, la generación se cancela.
+        """
+        inferencia = self.servidor_inferencia
+        try:
+            solicitud = inferencia.encolar(Solicitud(prompt, db_context, flujo=True))
+        except queue.Full:
+            return self.responder_ocupado()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        try:
+            while True:
+                evento = solicitud.eventos.get(timeout=inferencia.timeout)
+                if evento is None:
+                    break
+                self.enviar_evento(*evento)
+        except queue.Empty:
+            solicitud.cancelada = True
+            inferencia.vencidas += 1
+            self.enviar_evento('error', f'Sin respuesta en {inferencia.timeout} s')
+        except (BrokenPipeError, ConnectionResetError):
+            solicitud.cancelada = True
+            logger.info('Cliente desconectado, generación cancelada')
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+
+def crear_servidor(servidor_inferencia, host, puerto):
+    manejador = type(
+        'Manejador', (ManejadorInferencia,), {'servidor_inferencia': servidor_inferencia}
+    )
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    servidor.daemon_threads = True
+    return servidor
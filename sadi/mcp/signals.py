@@ -0,0 +1,20 @@
+# mcp/signals.py
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from core.cache import incrementar_version_modelo
+from .cache import MODELOS_INTENCION
+
+
+def invalidar_respuestas(sender, raw=False, **kwargs):
+    if raw:
+        return
+    # Al confirmar la transacción, igual que las versiones de core.signals
+    label = sender._meta.label
+    transaction.on_commit(lambda: incrementar_version_modelo(label))
+
+
+for label in sorted({label for modelos in MODELOS_INTENCION.values() for label in modelos}):
+    modelo = apps.get_model(label)
+    post_save.connect(invalidar_respuestas, sender=modelo)
+    post_delete.connect(invalidar_respuestas, sender=modelo)
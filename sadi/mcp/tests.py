@@ -1,3 +1,451 @@
-from django.test import TestCase
+import os
+import queue
+import tempfile
+import threading
+import json
+import time
+from datetime import date
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from core.cache import incrementar_version_modelo
+from departamentos.models import Departamento
+from programas.models import Ciclo, ProgramaEstrategico
+from riesgos.models import Riesgo
+from usuarios.models import Usuario
+from . import cliente
+from .consultas import ENTIDADES, Consulta, interpretar, responder, responder_rapido
+from .contexto import ajustar_contexto
+from .cache import CacheRespuestas, normalizar_prompt, respuestas_cache
+from .indice import IndiceEntidades, terminos
+from .management.commands.medir_precision import coincidencia
+from .management.commands.reporte_memoria import memoria_proceso
+from .mcp_service import (
+    PLANTILLAS,
+    OptimizedSpanishMCPService,
+    plantilla_prompt,
+    resolver_precision,
+    ruta_pesos_compartidos,
+)
+from .servidor import ServidorInferencia, crear_servidor
 
-# Create your tests here.
+
+class ServicioLento:
+    """Servicio MCP de prueba: cada generación tarda `segundos`."""
+
+    is_loaded = True
+
+    def __init__(self, segundos):
+        self.segundos = segundos
+        self.liberar = threading.Event()
+        self.lotes = []
+
+    def load_model(self):
+        pass
+
+    def estado(self):
+        return {'estado': 'listo', 'tiempos': {}, 'error': None}
+
+    def generate_contextual_responses(self, solicitudes):
+        self.lotes.append(len(solicitudes))
+        self.liberar.wait(self.segundos)
+        return [f'{prompt}: {db_context}' for prompt, db_context in solicitudes]
+
+    def stream_contextual_response(self, prompt, db_context='', cancelada=lambda: False):
+        self.cancelado = threading.Event()
+        for i in range(50):
+            if cancelada():
+                self.cancelado.set()
+                return
+            yield 'token', f'{prompt}{i} '
+            self.liberar.wait(self.segundos)
+        yield 'fin', f'{prompt}: {db_context}'
+
+
+class TokenizadorPalabras:
+    """Tokenizador de prueba: un token por palabra."""
+
+    def __call__(self, textos, add_special_tokens=True):
+        if isinstance(textos, str):
+            return {'input_ids': textos.split()}
+        return {'input_ids': [texto.split() for texto in textos]}
+
+    def decode(self, ids, skip_special_tokens=False):
+        return ' '.join(ids)
+
+
+class ServidorInferenciaTests(SimpleTestCase):
+    def test_genera_respuesta(self):
+        inferencia = ServidorInferencia(ServicioLento(0), capacidad=2, timeout=5)
+        inferencia.iniciar()
+
+        respuesta, segundos = inferencia.generar('metas', 'datos')
+
+        self.assertEqual(respuesta, 'metas: datos')
+        self.assertEqual(inferencia.estado()['atendidas'], 1)
+
+    def test_agrupa_solicitudes_en_lotes(self):
+        servicio = ServicioLento(0)
+        inferencia = ServidorInferencia(
+            servicio, capacidad=8, timeout=5, tamano_lote=4, ventana=0.2
+        )
+        inferencia.iniciar()
+
+        respuestas = {}
+
+        def generar(i):
+            respuestas[i] = inferencia.generar(f'p{i}', 'datos')[0]
+
+        hilos = [threading.Thread(target=generar, args=(i,)) for i in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        # Cada solicitud recibe su propia respuesta
+        self.assertEqual(respuestas, {i: f'p{i}: datos' for i in range(6)})
+        self.assertEqual(sorted(servicio.lotes, reverse=True), [4, 2])
+        estado = inferencia.estado()
+        self.assertEqual(estado['tamanos_lote'], {2: 1, 4: 1})
+        self.assertEqual(estado['tamano_lote_promedio'], 3)
+
+    def test_cola_llena_y_timeout(self):
+        servicio = ServicioLento(5)
+        inferencia = ServidorInferencia(servicio, capacidad=1, timeout=0.2)
+        inferencia.iniciar()
+
+        # La primera solicitud ocupa el modelo y la segunda llena la cola
+        hilos = [
+            threading.Thread(target=self.generar_sin_error, args=(inferencia,))
+            for _ in range(2)
+        ]
+        for hilo in hilos:
+            hilo.start()
+            time.sleep(0.05)
+
+        with self.assertRaises(queue.Full):
+            inferencia.generar('otra', '')
+        # Las dos solicitudes dejan de esperar al vencer su timeout
+        for hilo in hilos:
+            hilo.join()
+        servicio.liberar.set()
+
+        estado = inferencia.estado()
+        self.assertEqual(estado['rechazadas'], 1)
+        self.assertGreaterEqual(estado['vencidas'], 1)
+
+    def generar_sin_error(self, inferencia):
+        try:
+            inferencia.generar('metas', '')
+        except TimeoutError:
+            pass
+
+
+class StreamingTests(SimpleTestCase):
+    def setUp(self):
+        self.servicio = ServicioLento(0)
+        inferencia = ServidorInferencia(self.servicio, capacidad=2, timeout=5)
+        inferencia.iniciar()
+        self.servidor = crear_servidor(inferencia, '127.0.0.1', 0)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        puerto = self.servidor.server_address[1]
+        self.config = {**settings.MCP_CONFIG, 'SERVER_URL': f'http://127.0.0.1:{puerto}'}
+
+    def test_tokens_y_respuesta_final(self):
+        with override_settings(MCP_CONFIG=self.config):
+            eventos = list(cliente.generar_flujo('metas', 'datos'))
+
+        self.assertEqual(eventos[0], ('token', 'metas0 '))
+        self.assertEqual(len(eventos), 51)
+        self.assertEqual(eventos[-1], ('fin', 'metas: datos'))
+
+    def test_desconexion_cancela_la_generacion(self):
+        self.servicio.segundos = 0.05
+        with override_settings(MCP_CONFIG=self.config):
+            eventos = cliente.generar_flujo('metas')
+            self.assertEqual(next(eventos)[0], 'token')
+            eventos.close()
+
+        self.assertTrue(self.servicio.cancelado.wait(2))
+
+
+class PrecisionTests(SimpleTestCase):
+    def test_precision_invalida(self):
+        with self.assertRaises(ValueError):
+            resolver_precision('float16')
+        self.assertEqual(resolver_precision('int8'), 'int8')
+
+    def test_coincidencia_con_float32(self):
+        referencia = [[1, 2, 3, 4], [5, 6]]
+        self.assertEqual(coincidencia(referencia, referencia), (2, 1.0))
+        # Segunda respuesta distinta desde el primer token
+        self.assertEqual(coincidencia([[1, 2, 9, 9], [7, 6]], referencia), (0, 0.25))
+
+
+class PrefijoTests(SimpleTestCase):
+    def test_preambulo_fijo_por_plantilla(self):
+        servicio = OptimizedSpanishMCPService()
+        for pregunta, plantilla in [
+            ('¿Cuáles son mis proyectos?', 'proyectos'),
+            ('¿Qué objetivos tengo?', 'metas'),
+            ('Resume el avance', 'general'),
+        ]:
+            self.assertEqual(plantilla_prompt(pregunta), plantilla)
+            prefijo = PLANTILLAS[plantilla].split('{db_context}')[0]
+            # El caché del preámbulo sirve para cualquier contexto y pregunta
+            self.assertTrue(servicio.create_spanish_prompt(pregunta, '{x}').startswith(prefijo))
+
+
+class DisponibilidadTests(SimpleTestCase):
+    def test_carga_fallida(self):
+        servicio = OptimizedSpanishMCPService()
+        servicio.model_id = os.path.join(settings.BASE_DIR, 'model_cache', 'no-existe')
+        servicio.iniciar_precarga()
+        servicio.hilo_carga.join(30)
+
+        estado = servicio.estado()
+        self.assertEqual(estado['estado'], 'fallido')
+        self.assertTrue(estado['error'])
+        self.assertIn('total_s', estado['tiempos'])
+        # Sigue respondiendo con las respuestas directas
+        self.assertTrue(servicio.is_loaded)
+
+    @override_settings(MCP_CONFIG={**settings.MCP_CONFIG, 'SERVER_URL': ''})
+    def test_endpoint_listo(self):
+        url = reverse('mcp:listo')
+        with mock.patch('mcp.views.mcp_service') as servicio:
+            servicio.estado.return_value = {'estado': 'cargando', 'tiempos': {}, 'error': None}
+            self.assertEqual(self.client.get(url).status_code, 503)
+            servicio.iniciar_precarga.assert_called_once()
+
+            servicio.estado.return_value = {'estado': 'listo', 'tiempos': {'total_s': 1.5}, 'error': None}
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['tiempos'], {'total_s': 1.5})
+
+
+class MemoriaTests(SimpleTestCase):
+    def test_memoria_del_proceso(self):
+        memoria = memoria_proceso(os.getpid())
+        self.assertGreater(memoria['rss'], 0)
+        self.assertAlmostEqual(memoria['unica'] + memoria['compartida'], memoria['rss'], delta=1)
+
+    def test_ruta_por_modelo_y_dtype(self):
+        ruta = ruta_pesos_compartidos('TinyLlama/TinyLlama-1.1B-Chat-v1.0', 'float32')
+        self.assertTrue(ruta.endswith(os.path.join('compartido', 'TinyLlama--TinyLlama-1.1B-Chat-v1.0-float32')))
+
+
+class ContextoTests(SimpleTestCase):
+    CONTEXTO = (
+        'RIESGOS IDENTIFICADOS:\n'
+        '1. Retraso en entregas\n   Nivel de riesgo: 6\n\n'
+        '2. Falta de presupuesto\n   Nivel de riesgo: 72\n\n'
+        '3. Rotación de personal\n   Nivel de riesgo: 20'
+    )
+
+    def test_elige_los_relevantes_dentro_del_presupuesto(self):
+        contexto, resumen = ajustar_contexto(TokenizadorPalabras(), 'riesgos de presupuesto', self.CONTEXTO, 18)
+        self.assertEqual(
+            contexto,
+            'RIESGOS IDENTIFICADOS:\n\n1. Retraso en entregas\n   Nivel de riesgo: 6\n\n'
+            '2. Falta de presupuesto\n   Nivel de riesgo: 72',
+        )
+        self.assertLessEqual(resumen['tokens'], 18)
+        self.assertEqual((resumen['fragmentos'], resumen['fragmentos_total']), (2, 3))
+
+        contexto, _ = ajustar_contexto(TokenizadorPalabras(), 'riesgos de presupuesto', self.CONTEXTO, 8)
+        self.assertIn('Falta de presupuesto', contexto)
+        self.assertNotIn('Retraso', contexto)
+
+    def test_recorta_si_no_cabe_ningun_registro(self):
+        contexto, resumen = ajustar_contexto(TokenizadorPalabras(), 'presupuesto', 'Un texto sin registros ' * 10, 5)
+        self.assertEqual(contexto, 'Un texto sin registros...')
+        self.assertEqual(resumen['fragmentos'], 1)
+
+
+class CacheRespuestasTests(SimpleTestCase):
+    def test_lru_y_ttl(self):
+        respuestas = CacheRespuestas(capacidad=2, ttl=60)
+        respuestas.guardar('a', 1)
+        respuestas.guardar('b', 2)
+        respuestas.obtener('a')
+        # Se descarta la usada hace más tiempo
+        respuestas.guardar('c', 3)
+        self.assertIsNone(respuestas.obtener('b'))
+        self.assertEqual(respuestas.obtener('a'), 1)
+
+        respuestas.ttl = 0
+        time.sleep(0.01)
+        self.assertIsNone(respuestas.obtener('c'))
+
+    def test_normalizar_prompt(self):
+        self.assertEqual(
+            normalizar_prompt('  ¿Cuáles son   mis PROYECTOS? '), 'cuales son mis proyectos'
+        )
+
+
+@override_settings(MCP_CONFIG={**settings.MCP_CONFIG, 'SERVER_URL': ''})
+class RespuestasEnCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        respuestas_cache.entradas.clear()
+        usuario = Usuario.objects.create_user(
+            'docente', 'docente@sadi.mx', 'x', role='DOCENTE'
+        )
+        self.client.force_login(usuario)
+
+    def preguntar(self, prompt):
+        respuesta = self.client.post(
+            reverse('mcp:api-chat'), json.dumps({'prompt': prompt}), content_type='application/json'
+        )
+        return respuesta.json()
+
+    @mock.patch('mcp.views.generar_respuesta', return_value='Departamentos de SADI')
+    def test_misma_pregunta_desde_cache(self, generar):
+        self.assertFalse(self.preguntar('¿Cómo se organizan los departamentos?')['cached'])
+        datos = self.preguntar('como se organizan los departamentos')
+
+        self.assertTrue(datos['cached'])
+        self.assertEqual(datos['response'], 'Departamentos de SADI')
+        self.assertEqual(generar.call_count, 1)
+
+    @mock.patch('mcp.views.generar_respuesta', return_value='Departamentos de SADI')
+    def test_cambios_invalidan_la_respuesta(self, generar):
+        self.preguntar('¿Cómo se organizan los departamentos?')
+        with self.captureOnCommitCallbacks(execute=True):
+            Departamento.objects.create(nombre='Ciencias Básicas')
+
+        self.assertFalse(self.preguntar('¿Cómo se organizan los departamentos?')['cached'])
+        self.assertEqual(generar.call_count, 2)
+
+    @mock.patch('mcp.views.generar_respuesta', return_value='Departamentos de SADI')
+    def test_cambio_en_otro_proceso(self, generar):
+        self.preguntar('¿Cómo se organizan los departamentos?')
+        # Otro worker guardó un departamento: solo cambia la versión compartida
+        incrementar_version_modelo('departamentos.Departamento')
+
+        self.assertFalse(self.preguntar('¿Cómo se organizan los departamentos?')['cached'])
+        self.assertEqual(generar.call_count, 2)
+
+
+class RutaRapidaTests(TestCase):
+    def setUp(self):
+        usuario = Usuario.objects.create_user('apoyo', 'apoyo@sadi.mx', 'x', role='APOYO')
+        self.client.force_login(usuario)
+        Riesgo.objects.create(enunciado='Falta de presupuesto', probabilidad=8, impacto=9)
+        Riesgo.objects.create(enunciado='Retraso en entregas', probabilidad=2, impacto=3)
+        Riesgo.objects.create(enunciado='Cierre del laboratorio', probabilidad=10, impacto=10)
+
+    def test_interpretar(self):
+        consulta = interpretar('¿Cuántas actividades cumplidas hay?')
+        self.assertEqual(
+            (consulta.entidad, consulta.operacion, consulta.filtro), ('actividades', 'contar', 'Cumplida')
+        )
+        consulta = interpretar('riesgos críticos del ciclo')
+        self.assertEqual(
+            (consulta.entidad, consulta.operacion, consulta.filtro, consulta.ciclo),
+            ('riesgos', 'listar', 'critico', 'actual'),
+        )
+        consulta = interpretar('metas del departamento de Física', [(7, 'Física')])
+        self.assertEqual((consulta.entidad, consulta.departamento), ('metas', 7))
+        # Preguntas abiertas o con palabras desconocidas van al modelo
+        self.assertIsNone(interpretar('¿Por qué no se cumplieron las metas?'))
+        self.assertIsNone(interpretar('actividades del proyecto Fortalecimiento'))
+
+    @mock.patch('mcp.views.generar_respuesta')
+    def test_responde_sin_el_modelo(self, generar):
+        respuesta = self.client.post(
+            reverse('mcp:api-chat'),
+            json.dumps({'prompt': '¿Cuántos riesgos críticos hay?'}),
+            content_type='application/json',
+        ).json()
+
+        self.assertTrue(respuesta['fast_path'])
+        self.assertEqual(respuesta['response'], '📊 Hay 1 riesgo crítico.')
+        generar.assert_not_called()
+
+        # Alto (51-90) y crítico (más de 90) no se suman, como en el reporte de riesgos
+        respuesta = self.client.post(
+            reverse('mcp:api-chat'), json.dumps({'prompt': '¿Cuántos riesgos altos hay?'}), content_type='application/json'
+        ).json()
+        self.assertEqual(respuesta['response'], '📊 Hay 1 riesgo alto.')
+
+        respuesta = self.client.post(
+            reverse('mcp:api-chat'), json.dumps({'prompt': 'lista de riesgos'}), content_type='application/json'
+        ).json()
+        self.assertIn('1. Cierre del laboratorio — nivel 100 (crítico)', respuesta['response'])
+        self.assertIn('2. Falta de presupuesto — nivel 72 (alto)', respuesta['response'])
+
+    def test_filtros_de_todas_las_entidades(self):
+        departamento = Departamento.objects.create(nombre='Física')
+        usuario = Usuario.objects.create_user(
+            'docente', 'docente@sadi.mx', 'x', role='DOCENTE', departamento=departamento
+        )
+        programa = ProgramaEstrategico.objects.create(
+            clave='PE1', nombre='Programa', nombre_corto='PE1',
+            fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31), duracion=1,
+        )
+        Ciclo.objects.create(programa=programa, fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31))
+        request = RequestFactory().get('/')
+        request.user = usuario
+        request.session = {}
+
+        # Cada filtro que declara una entidad debe resolverse en su modelo
+        for entidad, definicion in ENTIDADES.items():
+            for filtro in ('ciclo', 'departamento', 'propias'):
+                if filtro not in definicion:
+                    continue
+                argumentos = {'ciclo': 'actual', 'departamento': 'mio', 'propias': True}
+                for operacion in ('contar', 'listar'):
+                    with self.subTest(entidad=entidad, filtro=filtro, operacion=operacion):
+                        consulta = Consulta(entidad, operacion, **{filtro: argumentos[filtro]})
+                        self.assertIsInstance(responder(consulta, request), str)
+
+        self.assertEqual(
+            responder(interpretar('cuántos proyectos hay en mi departamento'), request),
+            '📊 Hay 0 proyectos del departamento Física.',
+        )
+
+    def test_error_pasa_al_modelo(self):
+        request = RequestFactory().get('/')
+        request.user = Usuario.objects.get(username='apoyo')
+        with mock.patch('mcp.consultas.responder', side_effect=RuntimeError), self.assertLogs('mcp.consultas', 'ERROR'):
+            self.assertIsNone(responder_rapido('¿Cuántos riesgos hay?', request))
+
+
+class IndiceTests(TestCase):
+    def setUp(self):
+        self.ruta = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'indice.json')
+        Riesgo.objects.create(enunciado='Falta de presupuesto para laboratorios', probabilidad=8, impacto=9)
+        Riesgo.objects.create(enunciado='Retraso en entregas del proveedor', probabilidad=2, impacto=3)
+        Riesgo.objects.create(enunciado='Recorte de presupuesto federal', probabilidad=5, impacto=5)
+
+    def test_ordena_por_relevancia(self):
+        indice = IndiceEntidades(self.ruta)
+        resultados = indice.buscar(terminos('presupuesto de laboratorios'), 5)
+        self.assertEqual(len(resultados), 2)
+        self.assertEqual(Riesgo.objects.get(pk=resultados[0][1]).enunciado, 'Falta de presupuesto para laboratorios')
+        self.assertEqual(indice.buscar(terminos('proveedor'), 5, ['metas.Meta']), [])
+
+    def test_actualiza_con_el_historial(self):
+        indice = IndiceEntidades(self.ruta)
+        self.assertEqual(len(indice.buscar(['presupuesto'], 5)), 2)
+
+        riesgo = Riesgo.objects.get(enunciado__startswith='Retraso')
+        riesgo.enunciado = 'Retraso por falta de presupuesto'
+        riesgo.save()
+        Riesgo.objects.get(enunciado__startswith='Recorte').delete()
+        self.assertEqual(
+            {pk for _, pk, _ in indice.buscar(['presupuesto'], 5)},
+            {str(pk) for pk in Riesgo.objects.values_list('pk', flat=True)},
+        )
+
+        # Otro proceso parte del archivo guardado, sin volver a indexar
+        otro = IndiceEntidades(self.ruta)
+        with mock.patch.object(IndiceEntidades, 'indexar') as indexar:
+            self.assertEqual(len(otro.buscar(['presupuesto'], 5)), 2)
+        indexar.assert_not_called()
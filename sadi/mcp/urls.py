@@ -7,7 +7,10 @@ app_name = 'mcp'
 urlpatterns = [
     path('', views.mcp_dashboard, name='dashboard'),
     path('api/chat/', views.mcp_api, name='api-chat'),
+    path('api/chat/stream/', views.mcp_api_stream, name='api-chat-stream'),
     path('api/report/', views.generate_report, name='generate-report'),
+    path('api/metricas/', views.metricas_servidor, name='metricas'),
+    path('api/listo/', views.mcp_listo, name='listo'),
     path('conversations/', views.conversation_list, name='conversation-list'),
     path('conversations/<int:conversation_id>/', views.conversation_detail, name='conversation-detail'),
 ]
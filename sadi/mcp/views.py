@@ -1,6 +1,7 @@
 # mcp/views.py
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import get_user_model
@@ -8,6 +9,13 @@ from django.utils import timezone
 import json
 import logging
 import traceback
+from usuarios.decorators import role_required
+from .cache import clave_respuesta, detectar_intencion, respuestas_cache
+from .consultas import metricas_ruta_rapida, responder_rapido
+from .indice import contexto_relevante
+from .cliente import (
+    ServidorNoDisponible, ServidorOcupado, estado_servidor, generar_flujo, generar_respuesta
+)
 from .mcp_service import mcp_service
 
 logger = logging.getLogger(__name__)
@@ -16,6 +24,47 @@ User = get_user_model()
 def mcp_dashboard(request):
     return render(request, 'mcp/dashboard.html')
 
+@role_required('ADMIN')
+def metricas_servidor(request):
+    """
+    Métricas del servidor de inferencia (lotes, latencias y cola) y de la
+    ruta rápida y la caché de respuestas de este proceso
+    """
+    locales = {
+        'ruta_rapida': metricas_ruta_rapida.estadisticas(),
+        'cache_respuestas': respuestas_cache.estadisticas(),
+    }
+    try:
+        return JsonResponse({**estado_servidor(), **locales})
+    except ServidorNoDisponible as e:
+        return JsonResponse({'error': f'Servidor MCP no disponible: {e}', **locales}, status=503)
+
+def mcp_listo(request):
+    """
+    Disponibilidad del asistente para el balanceador de carga: 200 si el
+    modelo está cargado y caliente, 503 mientras carga o si falló la carga.
+    Sin sesión, como cualquier health check
+    """
+    if settings.MCP_CONFIG['SERVER_URL']:
+        try:
+            carga = estado_servidor()['carga']
+        except (ServidorNoDisponible, KeyError) as e:
+            carga = {'estado': 'no_disponible', 'error': f'Servidor MCP no disponible: {e}'}
+    else:
+        # Si la precarga está desactivada, la primera consulta la inicia
+        mcp_service.iniciar_precarga()
+        carga = mcp_service.estado()
+    return JsonResponse(carga, status=200 if carga['estado'] == 'listo' else 503)
+
+def respuesta_ocupado(error):
+    """503 cuando la cola del servidor de inferencia está llena"""
+    response = JsonResponse({
+        'success': False,
+        'error': str(error) or 'El asistente está ocupado, intenta de nuevo en unos segundos.'
+    }, status=503)
+    response['Retry-After'] = '5'
+    return response
+
 @csrf_exempt
 @login_required
 def mcp_api(request):
@@ -27,12 +76,52 @@ def mcp_api(request):
 
             logger.info(f"📥 Petición recibida: '{prompt}'")
 
+            # Preguntas de conteo o listado: se responden con el ORM, sin el
+            # modelo (antes que la caché porque pueden depender del ciclo de
+            # la sesión)
+            rapida = responder_rapido(prompt, request)
+            if rapida is not None:
+                return JsonResponse({
+                    'success': True,
+                    'response': rapida,
+                    'prompt': prompt,
+                    'has_db_context': True,
+                    'response_length': len(rapida),
+                    'cached': False,
+                    'fast_path': True
+                })
+
+            # Misma pregunta con los mismos datos: respuesta guardada
+            clave = clave_respuesta(prompt, request.user)
+            guardada = respuestas_cache.obtener(clave)
+            if guardada is not None:
+                logger.info(f"⚡ Respuesta desde caché ({clave[1]})")
+                response, has_db_context = guardada
+                return JsonResponse({
+                    'success': True,
+                    'response': response,
+                    'prompt': prompt,
+                    'has_db_context': has_db_context,
+                    'response_length': len(response),
+                    'cached': True,
+                    'fast_path': False
+                })
+
             # Obtener contexto REAL de la base de datos
             db_context = get_real_database_context(request, prompt)
             logger.info(f"📊 Contexto BD: {len(db_context)} caracteres")
 
-            # Generar respuesta SIN limitaciones artificiales
-            response = mcp_service.generate_contextual_response(prompt, db_context)
+            # Generar respuesta en el servidor de inferencia
+            try:
+                response = generar_respuesta(prompt, db_context)
+                respuestas_cache.guardar(clave, (response, bool(db_context)))
+            except ServidorOcupado as e:
+                return respuesta_ocupado(e)
+            except ServidorNoDisponible as e:
+                # Sin modelo se responde directamente con los datos (no se
+                # guarda: la siguiente vez puede responder el modelo)
+                logger.error(f"❌ Servidor MCP no disponible: {e}")
+                response = mcp_service.get_contextual_direct_response(prompt, db_context)
             logger.info(f"📤 Respuesta generada: {len(response)} caracteres")
 
             return JsonResponse({
@@ -40,7 +129,9 @@ def mcp_api(request):
                 'response': response,
                 'prompt': prompt,
                 'has_db_context': bool(db_context),
-                'response_length': len(response)
+                'response_length': len(response),
+                'cached': False,
+                'fast_path': False
             })
 
         except Exception as e:
@@ -52,14 +143,91 @@ def mcp_api(request):
 
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+@csrf_exempt
+@login_required
+def mcp_api_stream(request):
+    """Variante de mcp_api que envía la respuesta como Server-Sent Events"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    try:
+        prompt = json.loads(request.body).get('prompt', '').strip()
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Solicitud inválida'}, status=400)
+
+    logger.info(f"📥 Petición (streaming) recibida: '{prompt}'")
+
+    rapida = responder_rapido(prompt, request)
+    if rapida is not None:
+        return respuesta_sse(iter([('fin', rapida)]))
+
+    clave = clave_respuesta(prompt, request.user)
+    guardada = respuestas_cache.obtener(clave)
+    if guardada is not None:
+        logger.info(f"⚡ Respuesta desde caché ({clave[1]})")
+        return respuesta_sse(iter([('fin', guardada[0])]))
+
+    db_context = get_real_database_context(request, prompt)
+
+    try:
+        eventos = guardar_respuesta(generar_flujo(prompt, db_context), clave, bool(db_context))
+    except ServidorOcupado as e:
+        return respuesta_ocupado(e)
+    except ServidorNoDisponible as e:
+        logger.error(f"❌ Servidor MCP no disponible: {e}")
+        eventos = iter([('fin', mcp_service.get_contextual_direct_response(prompt, db_context))])
+
+    return respuesta_sse(eventos)
+
+def respuesta_sse(eventos):
+    response = StreamingHttpResponse(eventos_sse(eventos), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evita que un proxy (nginx) acumule la respuesta antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def guardar_respuesta(eventos, clave, has_db_context):
+    """Pasa los eventos y guarda en caché la respuesta final"""
+    try:
+        for tipo, texto in eventos:
+            if tipo == 'fin':
+                respuestas_cache.guardar(clave, (texto, has_db_context))
+            yield tipo, texto
+    finally:
+        if hasattr(eventos, 'close'):
+            eventos.close()
+
+def eventos_sse(eventos):
+    """Convierte los eventos (tipo, texto) al formato Server-Sent Events"""
+    try:
+        for tipo, texto in eventos:
+            yield f"event: {tipo}\ndata: {json.dumps({'texto': texto})}\n\n"
+    except ServidorNoDisponible as e:
+        logger.error(f"❌ Servidor MCP no disponible: {e}")
+        yield f"event: error\ndata: {json.dumps({'texto': 'Se perdió la conexión con el asistente.'})}\n\n"
+    finally:
+        # Si el navegador se desconecta, el servidor WSGI cierra este generador;
+        # al cerrar los eventos se corta la generación en el modelo
+        if hasattr(eventos, 'close'):
+            eventos.close()
+
 def get_real_database_context(request, prompt):
     """Obtiene datos REALES y ESPECÍFICOS usando los modelos correctos"""
-    prompt_lower = prompt.lower()
+    intencion = detectar_intencion(prompt)
     context = ""
 
+    # Registros más relevantes para la pregunta (índice BM25); si ninguno
+    # comparte términos con ella se usan los primeros de cada tabla
+    try:
+        context = contexto_relevante(prompt, intencion)
+    except Exception as e:
+        logger.error(f"Error en el índice de búsqueda: {e}")
+    if context:
+        return context
+
     try:
         # 1. PROYECTOS - Información específica
-        if any(word in prompt_lower for word in ['proyecto', 'project']):
+        if intencion == 'proyectos':
             try:
                 from proyectos.models import Proyecto
                 proyectos = Proyecto.objects.select_related('objetivo').all()[:8]
@@ -86,7 +254,7 @@ def get_real_database_context(request, prompt):
                 context = "Error al cargar proyectos."
 
         # 2. ACTIVIDADES - Información específica
-        elif any(word in prompt_lower for word in ['actividad', 'activity', 'tarea']):
+        elif intencion == 'actividades':
             try:
                 from actividades.models import Actividad
                 actividades = Actividad.objects.select_related('responsable', 'departamento', 'meta').all()[:6]
@@ -118,7 +286,7 @@ def get_real_database_context(request, prompt):
                 context = "Error al cargar actividades."
 
         # 3. CICLOS - Información específica
-        elif any(word in prompt_lower for word in ['ciclo', 'ciclos']):
+        elif intencion == 'ciclos':
             try:
                 from programas.models import Ciclo
                 ciclos = Ciclo.objects.select_related('programa').filter(activo=True)[:5]
@@ -148,7 +316,7 @@ def get_real_database_context(request, prompt):
                 context = "Error al cargar ciclos."
 
         # 4. METAS - Información específica
-        elif any(word in prompt_lower for word in ['meta', 'metas', 'objetivo']):
+        elif intencion == 'metas':
             try:
                 from metas.models import Meta
                 metas = Meta.objects.select_related('proyecto', 'departamento', 'ciclo').filter(activa=True)[:6]
@@ -179,7 +347,7 @@ def get_real_database_context(request, prompt):
                 context = "Error al cargar metas."
 
         # 5. PROGRAMAS ESTRATÉGICOS
-        elif any(word in prompt_lower for word in ['programa', 'programas', 'estrategico']):
+        elif intencion == 'programas':
             try:
                 from programas.models import ProgramaEstrategico
                 programas = ProgramaEstrategico.objects.filter(estado=True)[:5]
@@ -207,7 +375,7 @@ def get_real_database_context(request, prompt):
                 context = "Error al cargar programas."
 
         # 6. DEPARTAMENTOS
-        elif any(word in prompt_lower for word in ['departamento', 'departamentos', 'área', 'area']):
+        elif intencion == 'departamentos':
             try:
                 from departamentos.models import Departamento
                 departamentos = Departamento.objects.all()[:10]
@@ -229,7 +397,7 @@ def get_real_database_context(request, prompt):
                 context = "Error al cargar departamentos."
 
         # 7. RIESGOS
-        elif any(word in prompt_lower for word in ['riesgo', 'riesgos', 'mitigacion']):
+        elif intencion == 'riesgos':
             try:
                 from riesgos.models import Riesgo
                 riesgos = Riesgo.objects.select_related('meta').all()[:5]
@@ -259,7 +427,7 @@ def get_real_database_context(request, prompt):
                 context = "Error al cargar riesgos."
 
         # 8. AVANCE DE METAS
-        elif any(word in prompt_lower for word in ['avance', 'progreso', 'cumplimiento']):
+        elif intencion == 'avances':
             try:
                 from metas.models import AvanceMeta
                 avances = AvanceMeta.objects.select_related('metacumplir', 'departamento').order_by('-fecha_registro')[:5]
@@ -309,8 +477,15 @@ def generate_report(request):
             report_data = obtener_datos_reporte_real(report_type)
 
             # Generar el reporte con el modelo
-            prompt = f"Genera un reporte de {report_type} con estos datos: {json.dumps(report_data, indent=2)}"
-            report = mcp_service.generate_response(prompt)
+            prompt = f"Genera un reporte de {report_type}"
+            db_context = json.dumps(report_data, indent=2, ensure_ascii=False)
+            try:
+                report = generar_respuesta(prompt, db_context)
+            except ServidorOcupado as e:
+                return respuesta_ocupado(e)
+            except ServidorNoDisponible as e:
+                logger.error(f"❌ Servidor MCP no disponible: {e}")
+                report = mcp_service.get_contextual_direct_response(prompt, db_context)
 
             return JsonResponse({
                 'success': True,
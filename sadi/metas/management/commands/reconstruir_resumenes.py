@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from programas.models import Ciclo
+from metas.models import ResumenCumplimiento
+from metas.resumenes import calcular_resumenes, reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye desde cero los resúmenes de cumplimiento "
+        "(Meta → Proyecto → Objetivo) o los verifica contra el cálculo en vivo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ciclo", type=int, help="ID del ciclo (por defecto, todos los ciclos)"
+        )
+        parser.add_argument(
+            "--verificar",
+            action="store_true",
+            help="Solo compara los resúmenes guardados con el cálculo en vivo",
+        )
+
+    def handle(self, *args, **options):
+        ciclos = Ciclo.objects.all().order_by("id")
+        if options["ciclo"]:
+            ciclos = ciclos.filter(id=options["ciclo"])
+            if not ciclos.exists():
+                raise CommandError(f"No existe el ciclo {options['ciclo']}")
+
+        diferencias = 0
+        for ciclo in ciclos:
+            if options["verificar"]:
+                diferencias += self.verificar(ciclo)
+            else:
+                total = reconstruir_resumenes(ciclo)
+                self.stdout.write(f"{ciclo.nombre}: {total} resúmenes generados")
+
+        if diferencias:
+            raise CommandError(
+                f"{diferencias} resúmenes no coinciden con el cálculo en vivo. "
+                "Ejecuta el comando sin --verificar para reconstruirlos."
+            )
+        self.stdout.write(self.style.SUCCESS("Resúmenes correctos"))
+
+    def verificar(self, ciclo):
+        en_vivo = calcular_resumenes(ciclo)
+        guardados = {
+            (r.nivel, r.entidad_id, r.departamento_id): {
+                "total": r.total,
+                "cumplidos": r.cumplidos,
+                "en_progreso": r.en_progreso,
+            }
+            for r in ResumenCumplimiento.objects.filter(ciclo=ciclo)
+        }
+
+        diferencias = 0
+        for clave in sorted(set(en_vivo) | set(guardados), key=str):
+            esperado = en_vivo.get(clave)
+            actual = guardados.get(clave)
+            if esperado != actual:
+                diferencias += 1
+                nivel, entidad_id, departamento_id = clave
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{ciclo.nombre} | {nivel} {entidad_id} "
+                        f"(departamento {departamento_id or 'todos'}): "
+                        f"guardado={actual} en vivo={esperado}"
+                    )
+                )
+        return diferencias
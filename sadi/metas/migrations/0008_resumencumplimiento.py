@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departamentos', '0002_initial'),
+        ('metas', '0007_alter_metacomprometida_unique_together'),
+        ('programas', '0005_alter_ciclo_estado_alter_ciclo_nombre_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCumplimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nivel', models.CharField(choices=[('proyecto', 'Proyecto'), ('objetivo', 'Objetivo')], max_length=10)),
+                ('entidad_id', models.BigIntegerField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('cumplidos', models.PositiveIntegerField(default=0)),
+                ('en_progreso', models.PositiveIntegerField(default=0)),
+                ('ciclo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_cumplimiento', to='programas.ciclo')),
+                ('departamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='departamentos.departamento')),
+            ],
+            options={
+                'unique_together': {('ciclo', 'nivel', 'entidad_id', 'departamento')},
+            },
+        ),
+    ]
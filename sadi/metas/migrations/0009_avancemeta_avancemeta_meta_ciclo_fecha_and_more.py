@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("departamentos", "0002_initial"),
+        ("metas", "0008_resumencumplimiento"),
+        ("programas", "0005_alter_ciclo_estado_alter_ciclo_nombre_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="avancemeta",
+            index=models.Index(
+                fields=["metaCumplir", "ciclo", "fecha_registro", "avance"],
+                name="avancemeta_meta_ciclo_fecha",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="metaciclo",
+            index=models.Index(fields=["ciclo", "meta"], name="metaciclo_ciclo_meta"),
+        ),
+    ]
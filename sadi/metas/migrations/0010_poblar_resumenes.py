@@ -0,0 +1,119 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Sum
+
+
+def contar_ciclo(apps, alias, ciclo_id):
+    """
+    Mismo cálculo que metas/resumenes.py (calcular_resumenes) con los modelos
+    históricos: {(nivel, entidad_id, departamento_id): conteo}.
+    """
+    AvanceMeta = apps.get_model("metas", "AvanceMeta")
+    MetaCiclo = apps.get_model("metas", "MetaCiclo")
+    avances = AvanceMeta.objects.using(alias).filter(ciclo_id=ciclo_id)
+
+    sumas = dict(
+        avances.order_by()
+        .values("metaCumplir_id")
+        .annotate(total=Sum("avance"))
+        .values_list("metaCumplir_id", "total")
+    )
+    ultimos = {}
+    for meta_id, avance in avances.order_by(
+        "metaCumplir_id", "-fecha_registro", "-id"
+    ).values_list("metaCumplir_id", "avance"):
+        ultimos.setdefault(meta_id, avance)
+
+    proyectos = defaultdict(lambda: {"total": 0, "cumplidos": 0, "en_progreso": 0})
+    objetivo_de_proyecto = {}
+    for (
+        meta_id,
+        meta_cumplir,
+        acumulable,
+        proyecto_id,
+        departamento_id,
+        objetivo_id,
+    ) in (
+        MetaCiclo.objects.using(alias)
+        .filter(ciclo_id=ciclo_id)
+        .values_list(
+            "meta_id",
+            "metaCumplir",
+            "meta__acumulable",
+            "meta__proyecto_id",
+            "meta__departamento_id",
+            "meta__proyecto__objetivo_id",
+        )
+    ):
+        avance = (ultimos if acumulable else sumas).get(meta_id) or Decimal("0")
+        objetivo_de_proyecto[proyecto_id] = objetivo_id
+        for departamento in {None, departamento_id}:
+            conteo = proyectos[(proyecto_id, departamento)]
+            conteo["total"] += 1
+            if avance >= (meta_cumplir or Decimal("0")):
+                conteo["cumplidos"] += 1
+            elif avance > 0:
+                conteo["en_progreso"] += 1
+
+    objetivos = defaultdict(lambda: {"total": 0, "cumplidos": 0, "en_progreso": 0})
+    for (proyecto_id, departamento), c in proyectos.items():
+        conteo = objetivos[(objetivo_de_proyecto[proyecto_id], departamento)]
+        conteo["total"] += 1
+        if c["cumplidos"] == c["total"]:
+            conteo["cumplidos"] += 1
+        elif c["en_progreso"] > 0:
+            conteo["en_progreso"] += 1
+
+    resumenes = {}
+    for nivel, conteos in (("proyecto", proyectos), ("objetivo", objetivos)):
+        for (entidad_id, departamento), conteo in conteos.items():
+            resumenes[(nivel, entidad_id, departamento)] = conteo
+    return resumenes
+
+
+def poblar_resumenes(apps, schema_editor):
+    """
+    Genera los resúmenes de cumplimiento de los ciclos que ya existían al
+    crear la tabla: sin ellos el dashboard y los reportes muestran ceros
+    hasta el siguiente cambio.
+    """
+    alias = schema_editor.connection.alias
+    Ciclo = apps.get_model("programas", "Ciclo")
+    ResumenCumplimiento = apps.get_model("metas", "ResumenCumplimiento")
+
+    for ciclo_id in (
+        Ciclo.objects.using(alias).order_by("id").values_list("id", flat=True)
+    ):
+        ResumenCumplimiento.objects.using(alias).filter(ciclo_id=ciclo_id).delete()
+        ResumenCumplimiento.objects.using(alias).bulk_create(
+            [
+                ResumenCumplimiento(
+                    ciclo_id=ciclo_id,
+                    nivel=nivel,
+                    entidad_id=entidad_id,
+                    departamento_id=departamento_id,
+                    **conteo,
+                )
+                for (nivel, entidad_id, departamento_id), conteo in contar_ciclo(
+                    apps, alias, ciclo_id
+                ).items()
+            ]
+        )
+
+
+def borrar_resumenes(apps, schema_editor):
+    ResumenCumplimiento = apps.get_model("metas", "ResumenCumplimiento")
+    ResumenCumplimiento.objects.using(schema_editor.connection.alias).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("metas", "0009_avancemeta_avancemeta_meta_ciclo_fecha_and_more"),
+        ("proyectos", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_resumenes, borrar_resumenes),
+    ]
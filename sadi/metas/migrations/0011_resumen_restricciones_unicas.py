@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("departamentos", "0002_initial"),
+        ("metas", "0010_poblar_resumenes"),
+        ("programas", "0005_alter_ciclo_estado_alter_ciclo_nombre_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="resumencumplimiento",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="resumencumplimiento",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("departamento__isnull", False)),
+                fields=("ciclo", "nivel", "entidad_id", "departamento"),
+                name="resumen_por_departamento_unico",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="resumencumplimiento",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("departamento__isnull", True)),
+                fields=("ciclo", "nivel", "entidad_id"),
+                name="resumen_todos_departamentos_unico",
+            ),
+        ),
+    ]
@@ -84,6 +84,16 @@ class AvanceMeta(models.Model):
     ciclo = models.ForeignKey(Ciclo, on_delete=models.CASCADE, blank=True, null=True)
     history = HistoricalRecords()
 
+    class Meta:
+        indexes = [
+            # Avances de una meta en un ciclo ordenados por fecha; con avance
+            # al final, la suma y el último avance se leen del índice
+            models.Index(
+                fields=["metaCumplir", "ciclo", "fecha_registro", "avance"],
+                name="avancemeta_meta_ciclo_fecha",
+            ),
+        ]
+
     def clean(self):
         if self.avance is not None:
             if self.avance < 0:
@@ -206,6 +216,10 @@ class MetaCiclo(models.Model):
 
     class Meta:
         unique_together = ("meta", "ciclo")
+        indexes = [
+            # Metas de un ciclo (el índice único empieza por meta)
+            models.Index(fields=["ciclo", "meta"], name="metaciclo_ciclo_meta"),
+        ]
 
     def save(self, *args, **kwargs):
 
@@ -262,3 +276,59 @@ class MetaCiclo(models.Model):
         )
         valor = valor.quantize(Decimal("0.00"))
         return f"{valor}"
+
+
+class ResumenCumplimiento(models.Model):
+    """
+    Resumen persistido del cumplimiento de la jerarquía Meta → Proyecto → Objetivo
+    por ciclo. En el nivel proyecto se cuentan metas y en el nivel objetivo se
+    cuentan proyectos. departamento vacío = todos los departamentos.
+    Se mantiene por señales (metas/signals.py) y se reconstruye con el comando
+    reconstruir_resumenes.
+    """
+
+    NIVEL_PROYECTO = "proyecto"
+    NIVEL_OBJETIVO = "objetivo"
+    NIVELES = [
+        (NIVEL_PROYECTO, "Proyecto"),
+        (NIVEL_OBJETIVO, "Objetivo"),
+    ]
+
+    ciclo = models.ForeignKey(
+        Ciclo, on_delete=models.CASCADE, related_name="resumenes_cumplimiento"
+    )
+    nivel = models.CharField(max_length=10, choices=NIVELES)
+    entidad_id = models.BigIntegerField()
+    departamento = models.ForeignKey(
+        Departamento, on_delete=models.CASCADE, null=True, blank=True
+    )
+    total = models.PositiveIntegerField(default=0)
+    cumplidos = models.PositiveIntegerField(default=0)
+    en_progreso = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Un UNIQUE sobre departamento no impide duplicar el resumen de todos
+        # los departamentos (NULL != NULL): ese caso lleva su propia restricción
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ciclo", "nivel", "entidad_id", "departamento"],
+                condition=models.Q(departamento__isnull=False),
+                name="resumen_por_departamento_unico",
+            ),
+            models.UniqueConstraint(
+                fields=["ciclo", "nivel", "entidad_id"],
+                condition=models.Q(departamento__isnull=True),
+                name="resumen_todos_departamentos_unico",
+            ),
+        ]
+
+    @property
+    def cumplido(self):
+        return self.total > 0 and self.cumplidos == self.total
+
+    @property
+    def rezagados(self):
+        return self.total - self.cumplidos - self.en_progreso
+
+    def __str__(self):
+        return f"{self.get_nivel_display()} {self.entidad_id} ({self.cumplidos}/{self.total})"
@@ -0,0 +1,172 @@
+from django.db import transaction
+from programas.models import Ciclo
+from proyectos.models import Proyecto
+from .models import Meta, ResumenCumplimiento
+from .utils import progreso_metas
+
+PROYECTO = ResumenCumplimiento.NIVEL_PROYECTO
+OBJETIVO = ResumenCumplimiento.NIVEL_OBJETIVO
+
+
+def _nuevo_conteo():
+    return {"total": 0, "cumplidos": 0, "en_progreso": 0}
+
+
+def contar_proyectos(metas_ciclo):
+    """
+    Agrupa las metas evaluadas por (proyecto_id, departamento_id).
+    departamento_id None acumula todas las metas del proyecto.
+    """
+    conteos = {}
+    for mc in metas_ciclo:
+        departamentos = {None, mc.meta.departamento_id}
+        for departamento_id in departamentos:
+            conteo = conteos.setdefault(
+                (mc.meta.proyecto_id, departamento_id), _nuevo_conteo()
+            )
+            conteo["total"] += 1
+            if mc.estado == "Cumplida":
+                conteo["cumplidos"] += 1
+            elif mc.estado == "En progreso":
+                conteo["en_progreso"] += 1
+    return conteos
+
+
+def contar_objetivos(conteos_proyectos, objetivo_de_proyecto):
+    """
+    Agrupa los conteos de proyectos por (objetivo_id, departamento_id).
+    Un proyecto está cumplido si TODAS sus metas lo están y en progreso si
+    tiene alguna meta en progreso.
+    """
+    conteos = {}
+    for (proyecto_id, departamento_id), c in conteos_proyectos.items():
+        conteo = conteos.setdefault(
+            (objetivo_de_proyecto[proyecto_id], departamento_id), _nuevo_conteo()
+        )
+        conteo["total"] += 1
+        if c["cumplidos"] == c["total"]:
+            conteo["cumplidos"] += 1
+        elif c["en_progreso"] > 0:
+            conteo["en_progreso"] += 1
+    return conteos
+
+
+def calcular_resumenes(ciclo):
+    """
+    Calcula en vivo todos los resúmenes de un ciclo.
+    Devuelve {(nivel, entidad_id, departamento_id): conteo}.
+    """
+    metas_ciclo = progreso_metas(ciclo)
+    conteos_proyectos = contar_proyectos(metas_ciclo)
+    objetivo_de_proyecto = {
+        mc.meta.proyecto_id: mc.meta.proyecto.objetivo_id for mc in metas_ciclo
+    }
+    conteos_objetivos = contar_objetivos(conteos_proyectos, objetivo_de_proyecto)
+
+    resumenes = {}
+    for nivel, conteos in (
+        (PROYECTO, conteos_proyectos),
+        (OBJETIVO, conteos_objetivos),
+    ):
+        for (entidad_id, departamento_id), conteo in conteos.items():
+            resumenes[(nivel, entidad_id, departamento_id)] = conteo
+    return resumenes
+
+
+def _crear_resumenes(ciclo_id, nivel, conteos):
+    ResumenCumplimiento.objects.bulk_create(
+        [
+            ResumenCumplimiento(
+                ciclo_id=ciclo_id,
+                nivel=nivel,
+                entidad_id=entidad_id,
+                departamento_id=departamento_id,
+                **conteo,
+            )
+            for (entidad_id, departamento_id), conteo in conteos.items()
+        ]
+    )
+
+
+def bloquear_ciclo(ciclo_id):
+    """
+    Bloquea la fila del ciclo hasta el final de la transacción: las
+    actualizaciones de resúmenes de un mismo ciclo (señales de distintos
+    workers, reconstruir_resumenes) se ejecutan una tras otra y cada una
+    calcula sobre lo que ya confirmó la anterior.
+    """
+    list(Ciclo.objects.select_for_update().filter(id=ciclo_id).values_list("id"))
+
+
+def reconstruir_resumenes(ciclo):
+    """Borra y vuelve a generar todos los resúmenes de un ciclo."""
+    with transaction.atomic():
+        bloquear_ciclo(ciclo.id)
+        resumenes = calcular_resumenes(ciclo)
+        ResumenCumplimiento.objects.filter(ciclo=ciclo).delete()
+        ResumenCumplimiento.objects.bulk_create(
+            [
+                ResumenCumplimiento(
+                    ciclo=ciclo,
+                    nivel=nivel,
+                    entidad_id=entidad_id,
+                    departamento_id=departamento_id,
+                    **conteo,
+                )
+                for (nivel, entidad_id, departamento_id), conteo in resumenes.items()
+            ]
+        )
+    return len(resumenes)
+
+
+def actualizar_resumen_objetivo(ciclo_id, objetivo_id):
+    """Recalcula los resúmenes de un objetivo a partir de los de sus proyectos."""
+    proyectos = Proyecto.objects.filter(objetivo_id=objetivo_id)
+    with transaction.atomic():
+        bloquear_ciclo(ciclo_id)
+        conteos_proyectos = {
+            (r.entidad_id, r.departamento_id): {
+                "total": r.total,
+                "cumplidos": r.cumplidos,
+                "en_progreso": r.en_progreso,
+            }
+            for r in ResumenCumplimiento.objects.filter(
+                ciclo_id=ciclo_id,
+                nivel=PROYECTO,
+                entidad_id__in=proyectos.values("id"),
+            )
+        }
+        conteos = contar_objetivos(
+            conteos_proyectos,
+            {proyecto_id: objetivo_id for proyecto_id, _ in conteos_proyectos},
+        )
+
+        ResumenCumplimiento.objects.filter(
+            ciclo_id=ciclo_id, nivel=OBJETIVO, entidad_id=objetivo_id
+        ).delete()
+        _crear_resumenes(ciclo_id, OBJETIVO, conteos)
+
+
+def actualizar_resumen_proyecto(ciclo_id, proyecto_id):
+    """
+    Recalcula los resúmenes de un proyecto en un ciclo (solo sus metas)
+    y después los de su objetivo.
+    """
+    with transaction.atomic():
+        bloquear_ciclo(ciclo_id)
+        metas_ciclo = progreso_metas(
+            ciclo_id, metas=Meta.objects.filter(proyecto_id=proyecto_id)
+        )
+        conteos = contar_proyectos(metas_ciclo)
+        ResumenCumplimiento.objects.filter(
+            ciclo_id=ciclo_id, nivel=PROYECTO, entidad_id=proyecto_id
+        ).delete()
+        _crear_resumenes(ciclo_id, PROYECTO, conteos)
+
+        objetivo_id = (
+            Proyecto.objects.filter(id=proyecto_id)
+            .values_list("objetivo_id", flat=True)
+            .first()
+        )
+        if objetivo_id:
+            actualizar_resumen_objetivo(ciclo_id, objetivo_id)
@@ -0,0 +1,137 @@
+# signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from core.cache import incrementar_version_datos
+from programas.models import Ciclo
+from proyectos.models import Proyecto
+from .models import AvanceMeta, Meta, MetaCiclo, ResumenCumplimiento
+from .resumenes import actualizar_resumen_objetivo, actualizar_resumen_proyecto
+
+
+def programar_resumenes(*claves):
+    """
+    Recalcula los resúmenes de cada (ciclo_id, proyecto_id) cuando se confirma
+    la transacción, para no trabajar sobre datos que aún pueden revertirse.
+    """
+    for ciclo_id, proyecto_id in {c for c in claves if c and all(c)}:
+
+        def actualizar(ciclo_id=ciclo_id, proyecto_id=proyecto_id):
+            if Ciclo.objects.filter(id=ciclo_id).exists():
+                actualizar_resumen_proyecto(ciclo_id, proyecto_id)
+                # Los resúmenes cambiaron después de la señal de core
+                incrementar_version_datos()
+
+        transaction.on_commit(actualizar)
+
+
+# ===================== AVANCES =====================
+@receiver(pre_save, sender=AvanceMeta)
+def guardar_avance_anterior(sender, instance, raw=False, **kwargs):
+    instance._resumen_anterior = None
+    if instance.pk and not raw:
+        instance._resumen_anterior = (
+            AvanceMeta.objects.filter(pk=instance.pk)
+            .values_list("ciclo_id", "metaCumplir__proyecto_id")
+            .first()
+        )
+
+
+@receiver(post_save, sender=AvanceMeta)
+@receiver(post_delete, sender=AvanceMeta)
+def actualizar_resumen_avance(sender, instance, raw=False, **kwargs):
+    if raw or not instance.metaCumplir_id:
+        return
+    programar_resumenes(
+        getattr(instance, "_resumen_anterior", None),
+        (instance.ciclo_id, instance.metaCumplir.proyecto_id),
+    )
+
+
+# ===================== META POR CICLO =====================
+@receiver(pre_save, sender=MetaCiclo)
+def guardar_meta_ciclo_anterior(sender, instance, raw=False, **kwargs):
+    instance._resumen_anterior = None
+    if instance.pk and not raw:
+        instance._resumen_anterior = (
+            MetaCiclo.objects.filter(pk=instance.pk)
+            .values_list("ciclo_id", "meta__proyecto_id")
+            .first()
+        )
+
+
+@receiver(post_save, sender=MetaCiclo)
+@receiver(post_delete, sender=MetaCiclo)
+def actualizar_resumen_meta_ciclo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    programar_resumenes(
+        getattr(instance, "_resumen_anterior", None),
+        (instance.ciclo_id, instance.meta.proyecto_id),
+    )
+
+
+# ===================== META =====================
+@receiver(pre_save, sender=Meta)
+def guardar_meta_anterior(sender, instance, raw=False, **kwargs):
+    instance._resumen_anterior = None
+    if instance.pk and not raw:
+        instance._resumen_anterior = (
+            Meta.objects.filter(pk=instance.pk)
+            .values_list("proyecto_id", "departamento_id", "acumulable")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Meta)
+def actualizar_resumen_meta(sender, instance, raw=False, **kwargs):
+    anterior = getattr(instance, "_resumen_anterior", None)
+    if raw or not anterior:
+        return
+
+    # Solo afectan al resumen el proyecto, el departamento y el tipo de meta
+    actual = (instance.proyecto_id, instance.departamento_id, instance.acumulable)
+    if anterior == actual:
+        return
+
+    ciclos = instance.metas_ciclo.values_list("ciclo_id", flat=True)
+    claves = []
+    for ciclo_id in ciclos:
+        claves.append((ciclo_id, anterior[0]))
+        claves.append((ciclo_id, instance.proyecto_id))
+    programar_resumenes(*claves)
+
+
+# ===================== PROYECTO =====================
+@receiver(pre_save, sender=Proyecto)
+def guardar_proyecto_anterior(sender, instance, raw=False, **kwargs):
+    instance._objetivo_anterior = None
+    if instance.pk and not raw:
+        instance._objetivo_anterior = (
+            Proyecto.objects.filter(pk=instance.pk)
+            .values_list("objetivo_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Proyecto)
+def actualizar_resumen_proyecto_movido(sender, instance, raw=False, **kwargs):
+    objetivo_anterior = getattr(instance, "_objetivo_anterior", None)
+    if raw or not objetivo_anterior or objetivo_anterior == instance.objetivo_id:
+        return
+
+    ciclos = list(
+        ResumenCumplimiento.objects.filter(
+            nivel=ResumenCumplimiento.NIVEL_PROYECTO, entidad_id=instance.id
+        )
+        .values_list("ciclo_id", flat=True)
+        .distinct()
+    )
+
+    def actualizar():
+        for ciclo_id in ciclos:
+            actualizar_resumen_objetivo(ciclo_id, objetivo_anterior)
+            actualizar_resumen_objetivo(ciclo_id, instance.objetivo_id)
+        incrementar_version_datos()
+
+    transaction.on_commit(actualizar)
@@ -1,3 +1,270 @@
+import datetime as dt
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from departamentos.models import Departamento
+from objetivos.models import ObjetivoEstrategico
+from programas.models import Ciclo, ProgramaEstrategico
+from proyectos.models import Proyecto
+from usuarios.models import Usuario
+from .models import AvanceMeta, Meta, MetaCiclo, ResumenCumplimiento
+from .utils import avances_mensuales, progreso_metas
 
-# Create your tests here.
+
+class TablaSeguimientoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        programa = ProgramaEstrategico.objects.create(
+            clave="P1",
+            nombre="Programa",
+            nombre_corto="PR",
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            duracion=1,
+        )
+        cls.ciclo = Ciclo.objects.create(
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            programa=programa,
+        )
+        objetivo = ObjetivoEstrategico.objects.create(
+            descripcion="Objetivo", programa=programa
+        )
+        cls.proyecto = Proyecto.objects.create(
+            clave="P1", nombre="Proyecto", objetivo=objetivo
+        )
+        cls.departamento = Departamento.objects.create(nombre="Sistemas")
+        cls.admin = Usuario.objects.create_superuser(
+            "admin", "admin@example.com", "x", role="ADMIN"
+        )
+
+    def crear_meta(self, nombre, acumulable, avances):
+        meta = Meta.objects.create(
+            nombre=nombre,
+            proyecto=self.proyecto,
+            departamento=self.departamento,
+            indicador="Indicador",
+            unidadMedida="Unidad",
+            metodoCalculo="Conteo",
+            acumulable=acumulable,
+        )
+        MetaCiclo.objects.create(meta=meta, ciclo=self.ciclo, metaCumplir=Decimal("10"))
+        for fecha, avance in avances:
+            AvanceMeta.objects.create(
+                metaCumplir=meta,
+                ciclo=self.ciclo,
+                avance=Decimal(avance),
+                fecha_registro=fecha,
+            )
+        return meta
+
+    def contar_consultas(self, url):
+        self.client.force_login(self.admin)
+        sesion = self.client.session
+        sesion["ciclo_id"] = self.ciclo.id
+        sesion.save()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas)
+
+    def test_pivote_mensual(self):
+        incremental = self.crear_meta(
+            "Incremental",
+            False,
+            [(dt.date(2025, 1, 5), 3), (dt.date(2025, 1, 20), 4)],
+        )
+        acumulable = self.crear_meta(
+            "Acumulable",
+            True,
+            [(dt.date(2025, 2, 5), 3), (dt.date(2025, 2, 25), 7)],
+        )
+
+        mensuales = avances_mensuales(self.ciclo, Meta.objects.all())
+
+        self.assertEqual(mensuales[(incremental.id, 2025, 1)]["suma"], Decimal("7"))
+        self.assertEqual(mensuales[(acumulable.id, 2025, 2)]["ultimo"], Decimal("7"))
+        self.assertNotIn((incremental.id, 2025, 2), mensuales)
+
+    def test_progreso_metas_en_una_consulta(self):
+        incremental = self.crear_meta(
+            "Incremental",
+            False,
+            [(dt.date(2025, 1, 5), 3), (dt.date(2025, 1, 20), 4)],
+        )
+        acumulable = self.crear_meta(
+            "Acumulable",
+            True,
+            [(dt.date(2025, 2, 5), 3), (dt.date(2025, 2, 25), 7)],
+        )
+        for i in range(5):
+            self.crear_meta(f"Meta {i}", False, [(dt.date(2025, 3, 1), 10)])
+
+        with self.assertNumQueries(1):
+            metas_ciclo = progreso_metas(self.ciclo, departamento=self.departamento)
+            # Proyecto y departamento vienen en la misma consulta
+            for mc in metas_ciclo:
+                mc.meta.proyecto.nombre, mc.meta.departamento.nombre
+
+        por_meta = {mc.meta_id: mc for mc in metas_ciclo}
+        self.assertEqual(len(por_meta), 7)
+        self.assertEqual(por_meta[incremental.id].avance_real, Decimal("7"))
+        self.assertEqual(por_meta[incremental.id].estado, "En progreso")
+        self.assertEqual(por_meta[acumulable.id].avance_real, Decimal("7"))
+        self.assertEqual(por_meta[acumulable.id].porcentaje, Decimal("70"))
+        self.assertEqual([mc.estado for mc in metas_ciclo].count("Cumplida"), 5)
+
+        with self.assertNumQueries(1):
+            metas_ciclo = progreso_metas(
+                self.ciclo, metas=Meta.objects.filter(acumulable=True)
+            )
+        self.assertEqual([mc.meta_id for mc in metas_ciclo], [acumulable.id])
+
+    def comprobar_consultas_constantes(self, url):
+        self.crear_meta("Meta 1", False, [(dt.date(2025, 1, 5), 1)])
+        # La primera petición crea datos de configuración y sesión
+        self.contar_consultas(url)
+        base = self.contar_consultas(url)
+
+        for i in range(2, 8):
+            self.crear_meta(
+                f"Meta {i}",
+                i % 2 == 0,
+                [(dt.date(2025, mes, 5), mes) for mes in range(1, 13)],
+            )
+        self.assertEqual(self.contar_consultas(url), base)
+
+    def test_consultas_constantes(self):
+        self.comprobar_consultas_constantes(reverse("tabla_seguimiento"))
+
+    def test_consultas_constantes_vista_simple(self):
+        self.comprobar_consultas_constantes(
+            reverse("tabla_seguimiento") + "?view=simple"
+        )
+
+
+class ResumenesTests(TestCase):
+    def setUp(self):
+        programa = ProgramaEstrategico.objects.create(
+            clave="P1",
+            nombre="Programa",
+            nombre_corto="PR",
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            duracion=1,
+        )
+        self.ciclo = Ciclo.objects.create(
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            programa=programa,
+        )
+        self.objetivo = ObjetivoEstrategico.objects.create(
+            descripcion="Objetivo", programa=programa
+        )
+        self.proyecto = Proyecto.objects.create(
+            clave="P1", nombre="Proyecto", objetivo=self.objetivo
+        )
+        self.sistemas = Departamento.objects.create(nombre="Sistemas")
+        self.industrial = Departamento.objects.create(nombre="Industrial")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meta = Meta.objects.create(
+                nombre="Meta",
+                proyecto=self.proyecto,
+                departamento=self.sistemas,
+                indicador="Indicador",
+                unidadMedida="Unidad",
+                metodoCalculo="Conteo",
+                acumulable=False,
+            )
+            MetaCiclo.objects.create(
+                meta=self.meta, ciclo=self.ciclo, metaCumplir=Decimal("10")
+            )
+
+    def resumenes(self):
+        """{(nivel, entidad_id, departamento_id): (total, cumplidos, en_progreso)}"""
+        return {
+            (r.nivel, r.entidad_id, r.departamento_id): (
+                r.total,
+                r.cumplidos,
+                r.en_progreso,
+            )
+            for r in ResumenCumplimiento.objects.filter(ciclo=self.ciclo)
+        }
+
+    def registrar_avance(self, avance):
+        with self.captureOnCommitCallbacks(execute=True):
+            return AvanceMeta.objects.create(
+                metaCumplir=self.meta,
+                ciclo=self.ciclo,
+                avance=Decimal(avance),
+                fecha_registro=dt.date(2025, 3, 1),
+            )
+
+    def test_senales_mantienen_los_resumenes(self):
+        proyecto = ("proyecto", self.proyecto.id)
+        objetivo = ("objetivo", self.objetivo.id)
+        self.assertEqual(
+            self.resumenes(),
+            {
+                (*proyecto, None): (1, 0, 0),
+                (*proyecto, self.sistemas.id): (1, 0, 0),
+                (*objetivo, None): (1, 0, 0),
+                (*objetivo, self.sistemas.id): (1, 0, 0),
+            },
+        )
+
+        self.registrar_avance(4)
+        self.assertEqual(self.resumenes()[(*proyecto, None)], (1, 0, 1))
+        self.assertEqual(self.resumenes()[(*objetivo, None)], (1, 0, 1))
+
+        avance = self.registrar_avance(6)
+        self.assertEqual(self.resumenes()[(*proyecto, self.sistemas.id)], (1, 1, 0))
+        self.assertEqual(self.resumenes()[(*objetivo, None)], (1, 1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            avance.delete()
+        self.assertEqual(self.resumenes()[(*proyecto, None)], (1, 0, 1))
+
+        # Cambiar el departamento mueve la meta entre resúmenes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meta.departamento = self.industrial
+            self.meta.save()
+        resumenes = self.resumenes()
+        self.assertNotIn((*proyecto, self.sistemas.id), resumenes)
+        self.assertEqual(resumenes[(*proyecto, self.industrial.id)], (1, 0, 1))
+        self.assertEqual(resumenes[(*proyecto, None)], (1, 0, 1))
+
+    def test_un_resumen_por_entidad_sin_departamento(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResumenCumplimiento.objects.create(
+                ciclo=self.ciclo,
+                nivel=ResumenCumplimiento.NIVEL_PROYECTO,
+                entidad_id=self.proyecto.id,
+                departamento=None,
+            )
+
+    def test_verificar_y_reconstruir(self):
+        salida = StringIO()
+        call_command("reconstruir_resumenes", "--verificar", stdout=salida)
+        self.assertIn("Resúmenes correctos", salida.getvalue())
+
+        ResumenCumplimiento.objects.filter(
+            nivel=ResumenCumplimiento.NIVEL_PROYECTO, departamento=None
+        ).update(cumplidos=1)
+        ResumenCumplimiento.objects.filter(
+            nivel=ResumenCumplimiento.NIVEL_OBJETIVO, departamento=self.sistemas
+        ).delete()
+        salida = StringIO()
+        with self.assertRaisesMessage(CommandError, "2 resúmenes no coinciden"):
+            call_command("reconstruir_resumenes", "--verificar", stdout=salida)
+        self.assertIn("guardado={'total': 1, 'cumplidos': 1", salida.getvalue())
+        self.assertIn("guardado=None", salida.getvalue())
+
+        call_command("reconstruir_resumenes", stdout=StringIO())
+        self.assertEqual(len(self.resumenes()), 4)
+        call_command("reconstruir_resumenes", "--verificar", stdout=StringIO())
@@ -0,0 +1,137 @@
+from decimal import Decimal
+from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from .models import AvanceMeta, MetaCiclo
+
+
+def anotar_avance_real(metas_ciclo):
+    """
+    Anota cada MetaCiclo del queryset con la suma de sus avances del ciclo
+    (avance_suma) y con el último avance registrado (avance_ultimo).
+    Todo se resuelve en la misma consulta mediante subconsultas.
+    """
+    avances = AvanceMeta.objects.filter(
+        metaCumplir=OuterRef("meta_id"), ciclo=OuterRef("ciclo_id")
+    )
+
+    suma = (
+        avances.order_by()
+        .values("metaCumplir")
+        .annotate(total=Sum("avance"))
+        .values("total")
+    )
+    ultimo = avances.order_by("-fecha_registro", "-id").values("avance")[:1]
+
+    return metas_ciclo.annotate(
+        avance_suma=Subquery(
+            suma, output_field=models.DecimalField(max_digits=20, decimal_places=4)
+        ),
+        avance_ultimo=Subquery(
+            ultimo, output_field=models.DecimalField(max_digits=11, decimal_places=4)
+        ),
+    )
+
+
+def evaluar_progreso(meta_ciclo):
+    """
+    Calcula sobre una MetaCiclo anotada con anotar_avance_real:
+    - avance_real: último avance (acumulable) o suma de avances (incremental)
+    - porcentaje: (avance_real / metaCumplir) * 100
+    - cumplida: avance_real >= metaCumplir
+    - estado: Cumplida / En progreso / Rezagada
+    """
+    if meta_ciclo.meta.acumulable:
+        avance_real = meta_ciclo.avance_ultimo or Decimal("0")
+    else:
+        avance_real = meta_ciclo.avance_suma or Decimal("0")
+
+    meta_cumplir = meta_ciclo.metaCumplir or Decimal("0")
+
+    if meta_cumplir > 0:
+        porcentaje = (avance_real / meta_cumplir) * Decimal("100")
+    else:
+        porcentaje = Decimal("0")
+
+    meta_ciclo.avance_real = avance_real
+    meta_ciclo.porcentaje = porcentaje
+    meta_ciclo.cumplida = avance_real >= meta_cumplir
+
+    if meta_ciclo.cumplida:
+        meta_ciclo.estado = "Cumplida"
+    elif avance_real > Decimal("0"):
+        meta_ciclo.estado = "En progreso"
+    else:
+        meta_ciclo.estado = "Rezagada"
+
+    return meta_ciclo
+
+
+def consulta_progreso(ciclo, departamento=None, metas=None):
+    """
+    Queryset de las MetaCiclo del ciclo (opcionalmente de un departamento o
+    restringidas a un queryset de metas) anotado con anotar_avance_real.
+    Cada fila se completa con evaluar_progreso.
+    """
+    metas_ciclo = MetaCiclo.objects.filter(ciclo=ciclo).select_related(
+        "meta", "meta__proyecto", "meta__departamento"
+    )
+
+    if departamento:
+        metas_ciclo = metas_ciclo.filter(meta__departamento=departamento)
+    if metas is not None:
+        metas_ciclo = metas_ciclo.filter(meta__in=metas)
+
+    return anotar_avance_real(metas_ciclo).order_by("meta_id")
+
+
+def progreso_metas(ciclo, departamento=None, metas=None):
+    """
+    Devuelve todas las MetaCiclo del ciclo (opcionalmente de un departamento
+    o restringidas a un queryset de metas) con avance_real, porcentaje,
+    cumplida y estado calculados en una sola consulta.
+    """
+    return [
+        evaluar_progreso(mc)
+        for mc in consulta_progreso(ciclo, departamento=departamento, metas=metas)
+    ]
+
+
+def avances_mensuales(ciclo, metas):
+    """
+    Devuelve {(meta_id, anio, mes): {"suma": ..., "ultimo": ...}} con la suma
+    de los avances de cada mes (metas incrementales) y el último avance
+    registrado en el mes (metas acumulables), en una sola consulta agrupada.
+    """
+    ultimo = (
+        AvanceMeta.objects.annotate(mes=TruncMonth("fecha_registro"))
+        .filter(
+            metaCumplir=OuterRef("metaCumplir"),
+            ciclo=OuterRef("ciclo"),
+            mes=OuterRef("mes"),
+        )
+        .order_by("-fecha_registro", "-id")
+        .values("avance")[:1]
+    )
+
+    filas = (
+        AvanceMeta.objects.filter(ciclo=ciclo, metaCumplir__in=metas)
+        .annotate(mes=TruncMonth("fecha_registro"))
+        .order_by()
+        .values("metaCumplir", "ciclo", "mes")
+        .annotate(
+            suma=Sum("avance"),
+            ultimo=Subquery(
+                ultimo,
+                output_field=models.DecimalField(max_digits=11, decimal_places=4),
+            ),
+        )
+    )
+
+    return {
+        (fila["metaCumplir"], fila["mes"].year, fila["mes"].month): {
+            "suma": fila["suma"],
+            "ultimo": fila["ultimo"],
+        }
+        for fila in filas
+    }
@@ -1,4 +1,4 @@
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 import json
 from django.http import JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
@@ -8,9 +8,9 @@ from psycopg2 import IntegrityError
 from rest_framework import viewsets, permissions
 from departamentos.models import Departamento
 from .models import Meta, AvanceMeta, MetaComprometida, MetaCiclo
+from .utils import avances_mensuales, progreso_metas
 from programas.models import Ciclo
 from proyectos.models import Proyecto
-from django.db.models import Sum
 from django.db import transaction
 from core.models import ConfiguracionGlobal
 from django.utils import timezone
@@ -682,54 +682,29 @@ def TablaSeguimiento(request):
     # 4) Construir tabla
     tabla = []
 
-    for meta in metas:
-        meta_ciclo = MetaCiclo.objects.filter(meta=meta, ciclo=ciclo).first()
-        if not meta_ciclo:
-            continue
+    # Valores mensuales de todas las metas en una sola consulta
+    mensuales = avances_mensuales(ciclo, metas)
 
-        # Obtener todos los avances asociados a la meta y ciclo
-        avances = AvanceMeta.objects.filter(metaCumplir=meta, ciclo=ciclo).order_by(
-            "fecha_registro"
-        )
-
-        if not avances.exists():
-            total = Decimal("0")
-        else:
-            if meta.acumulable:
-                #  Tomar SOLO el último avance registrado
-                ultimo_avance = avances.last()
-                total = Decimal(str(ultimo_avance.avance or 0))
-            else:
-                #  Sumar TODOS los avances
-                total = avances.aggregate(total=Sum("avance"))["total"] or Decimal("0")
+    for meta_ciclo in progreso_metas(ciclo, metas=metas):
+        meta = meta_ciclo.meta
+        total = meta_ciclo.avance_real
+        porcentaje = meta_ciclo.porcentaje
 
         # Base y meta comprometida
         linea_base = meta_ciclo.lineaBase or Decimal("0")
         meta_cumplir = meta_ciclo.metaCumplir or Decimal("0")
 
-        #  Calcular porcentaje usando la fórmula (B / A) * 100
-        porcentaje = Decimal("0")
-        try:
-            if meta_cumplir != Decimal("0"):
-                porcentaje = (total / meta_cumplir) * Decimal("100")
-        except (InvalidOperation, TypeError, ZeroDivisionError):
-            porcentaje = Decimal("0")
-
         #  Mostrar valores mensuales (solo referencia visual)
         valores_por_mes = []
         for m in meses:
-            year, month = m["anio"], m["numero"]
-            avances_mes = avances.filter(
-                fecha_registro__year=year, fecha_registro__month=month
-            )
+            mes = mensuales.get((meta.id, m["anio"], m["numero"]), {})
 
             if meta.acumulable:
                 # Mostrar solo el último del mes
-                av_mes = avances_mes.last()
-                valor_mes = av_mes.avance if av_mes else None
+                valor_mes = mes.get("ultimo")
             else:
                 # Sumar todos los avances del mes
-                valor_mes = avances_mes.aggregate(total=Sum("avance"))["total"]
+                valor_mes = mes.get("suma")
 
             if not valor_mes or valor_mes == 0:
                 valores_por_mes.append("-")
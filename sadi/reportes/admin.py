@@ -1,3 +1,11 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import TrabajoReporte
+
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    list_display = ("tipo", "estado", "solicitante", "fecha_creacion", "fecha_fin")
+    list_filter = ("tipo", "estado")
+    readonly_fields = ("clave", "version_datos")
@@ -0,0 +1,67 @@
+import tempfile
+import xlsxwriter
+from django.http import FileResponse
+
+CONTENT_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Filas que se leen de la base de datos por bloque al exportar
+TAMANO_BLOQUE = 500
+
+
+def escribir_excel(archivo, hoja, columnas, filas, ancho=None, autoajustar=False):
+    """
+    Escribe las filas en un .xlsx sobre archivo (ruta u objeto de archivo).
+
+    - columnas: encabezados de la hoja
+    - filas: iterable (idealmente un generador sobre queryset.iterator())
+      de secuencias con un valor por columna
+    - ancho: ancho fijo para todas las columnas
+    - autoajustar: ajusta cada columna al contenido más largo (máximo 25)
+
+    xlsxwriter trabaja en modo constant_memory: cada fila se vuelca a disco
+    al escribir la siguiente, así que la memoria no depende del número de
+    filas.
+    """
+    libro = xlsxwriter.Workbook(archivo, {"constant_memory": True})
+    hoja_excel = libro.add_worksheet(hoja)
+
+    # Mismo formato de encabezado que generaba pandas.to_excel
+    encabezado = libro.add_format(
+        {"bold": True, "border": 1, "align": "center", "valign": "top"}
+    )
+    anchos = [len(str(columna)) for columna in columnas]
+
+    hoja_excel.write_row(0, 0, columnas, encabezado)
+    for num_fila, fila in enumerate(filas, start=1):
+        for num_columna, valor in enumerate(fila):
+            if valor is not None:
+                hoja_excel.write(num_fila, num_columna, valor)
+            if autoajustar:
+                anchos[num_columna] = max(anchos[num_columna], len(str(valor)))
+
+    # Las columnas se definen al cerrar el libro, por eso se pueden
+    # ajustar después de escribir las filas
+    if autoajustar:
+        for idx, largo in enumerate(anchos):
+            hoja_excel.set_column(idx, idx, min(largo + 2, 25))
+    elif ancho:
+        hoja_excel.set_column(0, len(columnas) - 1, ancho)
+
+    libro.close()
+
+
+def exportar_excel(nombre_archivo, hoja, columnas, filas, **opciones):
+    """
+    Genera el .xlsx (ver escribir_excel) en un archivo temporal y lo envía
+    por bloques; el archivo se elimina al cerrarse la respuesta.
+    """
+    archivo = tempfile.TemporaryFile(suffix=".xlsx")
+    escribir_excel(archivo, hoja, columnas, filas, **opciones)
+    archivo.seek(0)
+
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=nombre_archivo,
+        content_type=CONTENT_TYPE_XLSX,
+    )
@@ -0,0 +1,88 @@
+import multiprocessing
+import time
+import django
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from reportes.models import TrabajoReporte
+from reportes.trabajos import (
+    ejecutar_en_proceso,
+    purgar_trabajos,
+    reencolar_interrumpidos,
+    tomar_pendientes,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker que genera en segundo plano los reportes solicitados "
+        "(TrabajoReporte) usando un pool de procesos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--procesos",
+            type=int,
+            default=settings.REPORTES_PROCESOS,
+            help="Número de procesos que generan reportes en paralelo",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos entre cada revisión de la cola",
+        )
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Procesa los trabajos pendientes y termina",
+        )
+
+    def handle(self, *args, **options):
+        procesos = max(1, options["procesos"])
+
+        # Trabajos que quedaron a medias si un worker o una petición se
+        # detuvo; los que otro worker sigue generando no se tocan
+        reencolados = reencolar_interrumpidos()
+        if reencolados:
+            self.stdout.write(f"{reencolados} trabajos interrumpidos vueltos a la cola")
+
+        purgados = purgar_trabajos(settings.REPORTES_CONSERVAR_DIAS)
+        if purgados:
+            self.stdout.write(f"{purgados} trabajos antiguos eliminados")
+
+        # Los procesos se crean con "spawn" para que no hereden las conexiones
+        # abiertas a la base de datos; cada uno inicializa Django al arrancar
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+        self.stdout.write(f"Procesando reportes con {procesos} procesos")
+
+        en_curso = {}
+        try:
+            while True:
+                for futuro in [f for f in en_curso if f.done()]:
+                    trabajo_id = en_curso.pop(futuro)
+                    try:
+                        estado = futuro.result()
+                    except Exception as e:
+                        estado = f"{TrabajoReporte.ERROR} ({e})"
+                    self.stdout.write(f"Trabajo {trabajo_id}: {estado}")
+
+                libres = procesos - len(en_curso)
+                if libres > 0:
+                    for trabajo_id in tomar_pendientes(libres):
+                        futuro = pool.submit(ejecutar_en_proceso, trabajo_id)
+                        en_curso[futuro] = trabajo_id
+
+                if options["una_vez"] and not en_curso:
+                    break
+                time.sleep(options["intervalo"])
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo worker...")
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -1,3 +1,59 @@
+import uuid
 from django.db import models
+from usuarios.models import Usuario
 
-# Create your models here.
+
+class TrabajoReporte(models.Model):
+    """
+    Reporte que se genera fuera de la petición (ver procesar_reportes).
+    Los trabajos con el mismo tipo, parámetros (ciclo y filtros) y versión de
+    datos se reutilizan en lugar de generarse otra vez.
+    """
+
+    METAS_DEPARTAMENTO = "metas_departamento"
+    AVANCES_METAS = "avances_metas"
+    PROGRAMA_TRABAJO = "programa_trabajo"
+    TIPOS = [
+        (METAS_DEPARTAMENTO, "Metas por departamento"),
+        (AVANCES_METAS, "Avances de metas"),
+        (PROGRAMA_TRABAJO, "Programa de trabajo (PDF)"),
+    ]
+
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    TERMINADO = "terminado"
+    ERROR = "error"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (EN_PROCESO, "En proceso"),
+        (TERMINADO, "Terminado"),
+        (ERROR, "Error"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=30, choices=TIPOS)
+    # Ciclo, filtros y alcance del usuario con los que se genera el reporte
+    parametros = models.JSONField(default=dict, blank=True)
+    # Huella de (tipo, parámetros) para encontrar trabajos idénticos
+    clave = models.CharField(max_length=64, db_index=True)
+    version_datos = models.BigIntegerField()
+    estado = models.CharField(max_length=15, choices=ESTADOS, default=PENDIENTE)
+    archivo = models.FileField(upload_to="reportes/trabajos/", blank=True)
+    nombre_archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    solicitante = models.ForeignKey(
+        Usuario, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["fecha_creacion"]
+
+    @property
+    def terminado(self):
+        return self.estado in (self.TERMINADO, self.ERROR)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.get_estado_display()})"
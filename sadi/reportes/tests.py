@@ -1,3 +1,275 @@
-from django.test import TestCase
+import datetime as dt
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from openpyxl import load_workbook
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core.cache import incrementar_version_datos
+from departamentos.models import Departamento
+from programas.models import Ciclo, ProgramaEstrategico
+from usuarios.models import Usuario
+from .exportar import CONTENT_TYPE_XLSX, TAMANO_BLOQUE, escribir_excel, exportar_excel
+from .models import TrabajoReporte
+from .trabajos import (
+    purgar_trabajos,
+    reencolar_interrumpidos,
+    sin_worker,
+    solicitar_trabajo,
+    tomar_pendientes,
+    tomar_trabajo,
+)
 
-# Create your tests here.
+
+class TrabajosTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+
+        programa = ProgramaEstrategico.objects.create(
+            clave="P1",
+            nombre="Programa",
+            nombre_corto="PR",
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            duracion=1,
+        )
+        self.ciclo = Ciclo.objects.create(
+            fecha_inicio=dt.date(2025, 1, 1),
+            fecha_fin=dt.date(2025, 12, 31),
+            programa=programa,
+        )
+        self.departamento = Departamento.objects.create(nombre="Sistemas")
+        self.admin = Usuario.objects.create_user(
+            "admin", "admin@sadi.mx", "x", role="ADMIN"
+        )
+        self.docente = Usuario.objects.create_user(
+            "docente",
+            "docente@sadi.mx",
+            "x",
+            role="DOCENTE",
+            departamento=self.departamento,
+        )
+
+    def solicitar(self, **parametros):
+        return solicitar_trabajo(
+            TrabajoReporte.METAS_DEPARTAMENTO,
+            {"departamento": None, "ciclo": self.ciclo.id, **parametros},
+            self.admin,
+        )
+
+    def entrar(self, usuario):
+        self.client.force_login(usuario)
+        sesion = self.client.session
+        sesion["ciclo_id"] = self.ciclo.id
+        sesion.save()
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=True)
+    def test_cada_trabajo_se_toma_una_vez(self):
+        primero = self.solicitar()
+        segundo = self.solicitar(departamento=self.departamento.id)
+        tercero = self.solicitar(departamento=0)
+
+        self.assertTrue(tomar_trabajo(segundo.id))
+        self.assertFalse(tomar_trabajo(segundo.id))
+        # Del más antiguo al más nuevo, sin repetir los ya tomados
+        self.assertEqual(tomar_pendientes(5), [primero.id, tercero.id])
+        self.assertEqual(tomar_pendientes(5), [])
+        self.assertEqual(
+            TrabajoReporte.objects.filter(estado=TrabajoReporte.EN_PROCESO).count(), 3
+        )
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=True)
+    def test_reutiliza_el_trabajo_identico(self):
+        trabajo = self.solicitar()
+        self.assertEqual(self.solicitar().id, trabajo.id)
+        self.assertNotEqual(
+            self.solicitar(departamento=self.departamento.id).id, trabajo.id
+        )
+
+        # Los trabajos con error no se reutilizan
+        TrabajoReporte.objects.filter(id=trabajo.id).update(estado=TrabajoReporte.ERROR)
+        nuevo = self.solicitar()
+        self.assertNotEqual(nuevo.id, trabajo.id)
+
+        # Ni los generados con datos anteriores
+        incrementar_version_datos()
+        self.assertNotEqual(self.solicitar().id, nuevo.id)
+
+    def test_sin_segundo_plano_genera_en_la_peticion(self):
+        with override_settings(REPORTES_EN_SEGUNDO_PLANO=True):
+            encolado = self.solicitar()
+        self.assertEqual(encolado.estado, TrabajoReporte.PENDIENTE)
+
+        # El trabajo que quedó en cola también se genera al pedirlo de nuevo
+        trabajo = self.solicitar()
+        self.assertEqual(trabajo.id, encolado.id)
+        self.assertEqual(trabajo.estado, TrabajoReporte.TERMINADO)
+        self.assertTrue(trabajo.archivo.name.endswith(".xlsx"))
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=True, REPORTES_ESPERA_WORKER=60)
+    def test_aviso_sin_worker(self):
+        trabajo = self.solicitar()
+        self.assertFalse(sin_worker(trabajo))
+
+        trabajo.fecha_creacion = timezone.now() - timedelta(seconds=61)
+        self.assertTrue(sin_worker(trabajo))
+        trabajo.estado = TrabajoReporte.EN_PROCESO
+        self.assertFalse(sin_worker(trabajo))
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=True, REPORTES_TIMEOUT=600)
+    def test_trabajos_interrumpidos(self):
+        interrumpido = self.solicitar()
+        en_curso = self.solicitar(departamento=self.departamento.id)
+        self.assertEqual(tomar_pendientes(5), [interrumpido.id, en_curso.id])
+        TrabajoReporte.objects.filter(id=interrumpido.id).update(
+            fecha_inicio=timezone.now() - timedelta(seconds=601)
+        )
+
+        # El trabajo que pasó de REPORTES_TIMEOUT ya no se reutiliza...
+        self.assertNotEqual(self.solicitar().id, interrumpido.id)
+        self.assertEqual(
+            self.solicitar(departamento=self.departamento.id).id, en_curso.id
+        )
+        # ...y es el único que vuelve a la cola
+        self.assertEqual(reencolar_interrumpidos(), 1)
+        interrumpido.refresh_from_db()
+        en_curso.refresh_from_db()
+        self.assertEqual(interrumpido.estado, TrabajoReporte.PENDIENTE)
+        self.assertIsNone(interrumpido.fecha_inicio)
+        self.assertEqual(en_curso.estado, TrabajoReporte.EN_PROCESO)
+
+    def test_purgar_trabajos_antiguos(self):
+        antiguo = self.solicitar()
+        self.assertTrue(antiguo.archivo)
+        en_proceso = self.solicitar(departamento=self.departamento.id)
+        TrabajoReporte.objects.filter(id=en_proceso.id).update(
+            estado=TrabajoReporte.EN_PROCESO
+        )
+        interrumpido = self.solicitar(departamento=-1)
+        TrabajoReporte.objects.filter(id=interrumpido.id).update(
+            estado=TrabajoReporte.EN_PROCESO,
+            fecha_inicio=timezone.now() - timedelta(days=8),
+        )
+        TrabajoReporte.objects.update(fecha_creacion=timezone.now() - timedelta(days=8))
+        reciente = self.solicitar(departamento=0)
+
+        # Los que siguen en proceso se conservan, salvo los interrumpidos
+        self.assertEqual(purgar_trabajos(7), 2)
+        self.assertQuerySetEqual(
+            TrabajoReporte.objects.order_by("fecha_creacion"),
+            [en_proceso, reciente],
+        )
+        self.assertFalse(antiguo.archivo.storage.exists(antiguo.archivo.name))
+
+    def test_vistas_del_trabajo(self):
+        self.entrar(self.admin)
+        url = reverse("reporte_metas_departamento") + "?exportar=1"
+        respuesta = self.client.get(url)
+        trabajo = TrabajoReporte.objects.get()
+        self.assertRedirects(respuesta, reverse("trabajo_reporte", args=[trabajo.id]))
+        self.assertEqual(self.client.get(respuesta.url).status_code, 200)
+
+        datos = self.client.get(url + "&formato=json")
+        self.assertEqual(datos.status_code, 202)
+        self.assertEqual(datos.json()["id"], str(trabajo.id))
+
+        estado = self.client.get(reverse("estado_trabajo_reporte", args=[trabajo.id]))
+        self.assertEqual(estado.json()["estado"], TrabajoReporte.TERMINADO)
+        self.assertFalse(estado.json()["sin_worker"])
+
+        descarga = self.client.get(estado.json()["url_descarga"])
+        self.assertEqual(descarga.status_code, 200)
+        self.assertIn(".xlsx", descarga["Content-Disposition"])
+        # Leer el contenido cierra el archivo sin emitir request_finished
+        # (que cerraría la conexión de la prueba)
+        self.assertTrue(b"".join(descarga.streaming_content).startswith(b"PK"))
+
+        # Un docente no ve los trabajos de otros
+        self.entrar(self.docente)
+        with self.assertLogs("django.request", "WARNING"):
+            respuesta = self.client.get(
+                reverse("estado_trabajo_reporte", args=[trabajo.id])
+            )
+        self.assertEqual(respuesta.status_code, 404)
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=True, REPORTES_ESPERA_WORKER=60)
+    def test_vista_avisa_sin_worker(self):
+        trabajo = self.solicitar()
+        self.entrar(self.admin)
+        respuesta = self.client.get(reverse("trabajo_reporte", args=[trabajo.id]))
+        self.assertContains(respuesta, "mt-3 mb-0 d-none")
+
+        TrabajoReporte.objects.filter(id=trabajo.id).update(
+            fecha_creacion=timezone.now() - timedelta(minutes=5)
+        )
+        respuesta = self.client.get(reverse("trabajo_reporte", args=[trabajo.id]))
+        self.assertContains(respuesta, "No hay un worker procesando reportes")
+        self.assertNotContains(respuesta, "mt-3 mb-0 d-none")
+        estado = self.client.get(reverse("estado_trabajo_reporte", args=[trabajo.id]))
+        self.assertTrue(estado.json()["sin_worker"])
+
+
+class ExportarExcelTests(TestCase):
+    columnas = ["Departamento", "Clave", "Avance"]
+
+    def leer(self, contenido):
+        """Filas de la única hoja del libro (encabezados incluidos)."""
+        libro = load_workbook(io.BytesIO(contenido), read_only=True)
+        self.assertEqual(len(libro.sheetnames), 1)
+        hoja = libro[libro.sheetnames[0]]
+        return hoja.title, [list(fila) for fila in hoja.iter_rows(values_only=True)]
+
+    def test_escribir_por_bloques(self):
+        total = TAMANO_BLOQUE * 2 + 1
+        Departamento.objects.bulk_create(
+            Departamento(nombre=f"Depto {i:04d}") for i in range(total)
+        )
+        filas = (
+            (nombre, None if pk % 2 else f"D{pk}", pk / 4)
+            for pk, nombre in Departamento.objects.order_by("nombre")
+            .values_list("id", "nombre")
+            .iterator(chunk_size=TAMANO_BLOQUE)
+        )
+
+        with tempfile.TemporaryFile() as archivo:
+            escribir_excel(archivo, "Departamentos", self.columnas, filas, ancho=20)
+            archivo.seek(0)
+            hoja, filas = self.leer(archivo.read())
+
+        self.assertEqual(hoja, "Departamentos")
+        self.assertEqual(filas[0], self.columnas)
+        self.assertEqual(len(filas), total + 1)
+        esperadas = [
+            [nombre, None if pk % 2 else f"D{pk}", pk / 4]
+            for pk, nombre in Departamento.objects.order_by("nombre").values_list(
+                "id", "nombre"
+            )
+        ]
+        self.assertEqual(filas[1:], esperadas)
+
+    def test_exportar_excel(self):
+        filas = [["Sistemas", "S1", 0.5], ["Una descripción muy larga " * 3, "X", 1]]
+        respuesta = exportar_excel(
+            "avances.xlsx", "Avances", self.columnas, iter(filas), autoajustar=True
+        )
+
+        self.assertEqual(respuesta["Content-Type"], CONTENT_TYPE_XLSX)
+        self.assertIn('filename="avances.xlsx"', respuesta["Content-Disposition"])
+        # Sin respuesta.close(): emitiría request_finished y cerraría la
+        # conexión de la prueba
+        self.addCleanup(respuesta.file_to_stream.close)
+        contenido = b"".join(respuesta.streaming_content)
+
+        hoja, leidas = self.leer(contenido)
+        self.assertEqual(hoja, "Avances")
+        self.assertEqual(leidas, [self.columnas, *filas])
+        # Cada columna se ajusta al contenido, hasta 25 caracteres (xlsxwriter
+        # guarda el ancho con el margen de la celda)
+        anchos = load_workbook(io.BytesIO(contenido)).active.column_dimensions
+        self.assertEqual([int(anchos[letra].width) for letra in "ABC"], [25, 7, 8])
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from core.cache import version_datos
+from .models import TrabajoReporte
+
+logger = logging.getLogger(__name__)
+
+# Función que genera cada tipo de reporte: recibe (trabajo, archivo), escribe
+# el contenido en el archivo y devuelve el nombre de descarga
+GENERADORES = {
+    TrabajoReporte.METAS_DEPARTAMENTO: "reportes.views.generar_metas_departamento",
+    TrabajoReporte.AVANCES_METAS: "reportes.views.generar_avances_metas",
+    TrabajoReporte.PROGRAMA_TRABAJO: "actividades.views.generar_programa_trabajo",
+}
+
+
+def clave_trabajo(tipo, parametros):
+    contenido = json.dumps(
+        {"tipo": tipo, "parametros": parametros},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def solicitar_trabajo(tipo, parametros, usuario):
+    """
+    Devuelve el trabajo idéntico (mismo reporte, ciclo y filtros) que ya está
+    en cola, en proceso (sin pasar de REPORTES_TIMEOUT) o terminado con la
+    versión actual de los datos, o crea uno nuevo. Si REPORTES_EN_SEGUNDO_PLANO está desactivado, el trabajo
+    pendiente (nuevo o encolado antes de desactivarlo) se genera en la misma
+    petición.
+    """
+    clave = clave_trabajo(tipo, parametros)
+    version = version_datos()
+
+    trabajo = (
+        TrabajoReporte.objects.filter(clave=clave, version_datos=version)
+        .exclude(estado=TrabajoReporte.ERROR)
+        .exclude(id__in=interrumpidos().values("id"))
+        .order_by("-fecha_creacion")
+        .first()
+    )
+    if not trabajo:
+        trabajo = TrabajoReporte.objects.create(
+            tipo=tipo,
+            parametros=parametros,
+            clave=clave,
+            version_datos=version,
+            solicitante=usuario,
+        )
+
+    if not settings.REPORTES_EN_SEGUNDO_PLANO and tomar_trabajo(trabajo.id):
+        ejecutar_trabajo(trabajo.id)
+        trabajo.refresh_from_db()
+
+    return trabajo
+
+
+def sin_worker(trabajo):
+    """
+    True si el trabajo sigue pendiente después de REPORTES_ESPERA_WORKER
+    segundos: ningún worker (procesar_reportes) está tomando la cola.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.REPORTES_ESPERA_WORKER)
+    return (
+        trabajo.estado == TrabajoReporte.PENDIENTE and trabajo.fecha_creacion < limite
+    )
+
+
+def inicio_minimo():
+    """Los trabajos en proceso que empezaron antes ya pasaron REPORTES_TIMEOUT."""
+    return timezone.now() - timedelta(seconds=settings.REPORTES_TIMEOUT)
+
+
+def interrumpidos():
+    """
+    Trabajos en proceso desde hace más de REPORTES_TIMEOUT segundos: el
+    proceso que los generaba terminó sin marcarlos como terminados.
+    """
+    return TrabajoReporte.objects.filter(estado=TrabajoReporte.EN_PROCESO).exclude(
+        fecha_inicio__gte=inicio_minimo()
+    )
+
+
+def reencolar_interrumpidos():
+    """Vuelve a la cola los trabajos interrumpidos; devuelve cuántos."""
+    return interrumpidos().update(estado=TrabajoReporte.PENDIENTE, fecha_inicio=None)
+
+
+def tomar_trabajo(trabajo_id):
+    """Marca el trabajo en proceso; False si otro worker ya lo tomó."""
+    return bool(
+        TrabajoReporte.objects.filter(
+            id=trabajo_id, estado=TrabajoReporte.PENDIENTE
+        ).update(estado=TrabajoReporte.EN_PROCESO, fecha_inicio=timezone.now())
+    )
+
+
+def tomar_pendientes(limite):
+    """Toma hasta `limite` trabajos pendientes, del más antiguo al más nuevo."""
+    pendientes = TrabajoReporte.objects.filter(
+        estado=TrabajoReporte.PENDIENTE
+    ).values_list("id", flat=True)[:limite]
+    return [trabajo_id for trabajo_id in pendientes if tomar_trabajo(trabajo_id)]
+
+
+def ejecutar_trabajo(trabajo_id):
+    """
+    Genera el archivo de un trabajo ya tomado y lo guarda. Se ejecuta en los
+    procesos del worker (o en la petición si no hay segundo plano).
+    """
+    trabajo = TrabajoReporte.objects.get(id=trabajo_id)
+    generar = import_string(GENERADORES[trabajo.tipo])
+
+    try:
+        with tempfile.TemporaryFile() as archivo:
+            nombre = generar(trabajo, archivo)
+            archivo.seek(0)
+            trabajo.archivo.save(f"{trabajo.id}_{nombre}", File(archivo), save=False)
+        trabajo.nombre_archivo = nombre
+        trabajo.estado = TrabajoReporte.TERMINADO
+    except Exception as e:
+        logger.exception(f"Error generando el trabajo {trabajo_id}")
+        trabajo.estado = TrabajoReporte.ERROR
+        trabajo.error = str(e)
+
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save(
+        update_fields=["archivo", "nombre_archivo", "estado", "error", "fecha_fin"]
+    )
+    return trabajo.estado
+
+
+def ejecutar_en_proceso(trabajo_id):
+    """Punto de entrada de los procesos del pool de procesar_reportes."""
+    try:
+        return ejecutar_trabajo(trabajo_id)
+    finally:
+        # Cada trabajo abre su propia conexión; no se reutiliza entre trabajos
+        connections.close_all()
+
+
+def purgar_trabajos(dias):
+    """
+    Elimina los trabajos (y sus archivos) con más de `dias` días, salvo los
+    que se están generando.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    antiguos = TrabajoReporte.objects.filter(fecha_creacion__lt=limite).exclude(
+        estado=TrabajoReporte.EN_PROCESO, fecha_inicio__gte=inicio_minimo()
+    )
+    total = 0
+    for trabajo in antiguos.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.delete()
+        total += 1
+    return total
@@ -8,4 +8,16 @@ urlpatterns = [
     path("avances/", views.reporte_avances_metas, name="reporte_avances_metas"),
     path("riesgos/", views.reporte_riesgos, name="reporte_riesgos"),
     path("docentes/", views.reporte_general_docente, name="reporte_docente"),
+    # Trabajos en segundo plano
+    path("trabajos/<uuid:trabajo_id>/", views.trabajo_reporte, name="trabajo_reporte"),
+    path(
+        "trabajos/<uuid:trabajo_id>/estado/",
+        views.estado_trabajo_reporte,
+        name="estado_trabajo_reporte",
+    ),
+    path(
+        "trabajos/<uuid:trabajo_id>/descargar/",
+        views.descargar_trabajo_reporte,
+        name="descargar_trabajo_reporte",
+    ),
 ]
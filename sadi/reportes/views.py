@@ -1,18 +1,26 @@
-from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from decimal import Decimal, InvalidOperation
-from django.db.models import Prefetch, Sum
+from django.db.models import Case, Prefetch, Value, When
 from usuarios.decorators import role_required
-import io
 from datetime import datetime
-import pandas as pd
 from programas.models import Ciclo
-from metas.models import Meta, AvanceMeta, MetaCiclo
+from metas.models import Meta, AvanceMeta, MetaCiclo, ResumenCumplimiento
+from metas.utils import (
+    anotar_avance_real,
+    consulta_progreso,
+    evaluar_progreso,
+    progreso_metas,
+)
 from actividades.models import Actividad
 from proyectos.models import Proyecto
 from objetivos.models import ObjetivoEstrategico
 from riesgos.models import Riesgo
 from departamentos.models import Departamento
+from .exportar import TAMANO_BLOQUE, escribir_excel, exportar_excel
+from .models import TrabajoReporte
+from .trabajos import sin_worker, solicitar_trabajo
 
 
 # ========== VISTA PRINCIPAL ==========
@@ -35,87 +43,27 @@ def gestion_reportes(request):
 
 
 # =================REPORTES=================
-@role_required("ADMIN", "APOYO")
-def reporte_metas_departamento(request):
+def evaluar_metas_departamento(metas_ciclo):
     """
-    Reporte de Metas agrupadas por departamento y ciclo,
-    con cálculo del avance en base a AvanceMeta y MetaCiclo.
+    Genera, para cada MetaCiclo anotada con anotar_avance_real, el diccionario
+    con avance, estado y actividades que usan el reporte y su exportación.
     """
-    # --- FILTROS ---
-    departamento_id = request.GET.get("departamento")
-    ciclo_id = request.session.get("ciclo_id")
-
-    departamentos = Departamento.objects.all()
-    ciclos = Ciclo.objects.all()
-
-    # --- CONSULTA PRINCIPAL ---
-    metas_ciclo = MetaCiclo.objects.select_related(
-        "meta", "ciclo", "meta__proyecto", "meta__departamento"
-    ).prefetch_related(
-        Prefetch(
-            "meta__actividad_set",
-            queryset=Actividad.objects.select_related("responsable"),
-        )
-    )
-
-    if departamento_id:
-        metas_ciclo = metas_ciclo.filter(meta__departamento_id=departamento_id)
-    if ciclo_id:
-        metas_ciclo = metas_ciclo.filter(ciclo_id=ciclo_id)
-
-    metas_ciclo = metas_ciclo.order_by("meta__departamento__nombre", "meta__nombre")
-
-    resultados = []
-    stats = {"completadas": 0, "en_progreso": 0, "rezagadas": 0}
-
-    # --- PROCESAMIENTO PRINCIPAL ---
     for mc in metas_ciclo:
         meta = mc.meta
         ciclo = mc.ciclo
 
         # ----------------------------------------
-        # CALCULO CORRECTO DEL AVANCE DE LA META
+        # AVANCE, PORCENTAJE Y ESTADO (anotados en la consulta)
         # ----------------------------------------
-        avances = AvanceMeta.objects.filter(metaCumplir=meta, ciclo=ciclo).order_by(
-            "fecha_registro"
-        )
-
-        if not avances.exists():
-            avance_real = Decimal("0")
-        else:
-            if meta.acumulable:
-                avance_real = avances.last().avance or Decimal("0")
-            else:
-                # Acumulable = suma total
-                avance_real = avances.aggregate(total=Sum("avance"))[
-                    "total"
-                ] or Decimal("0")
+        evaluar_progreso(mc)
+        avance_real = mc.avance_real
+        estado_avance = mc.estado
 
         # Valores del ciclo
         linea_base = mc.lineaBase or Decimal("0")
         meta_cumplir = mc.metaCumplir or Decimal("0")
 
-        # Calcular % de avance
-        if meta_cumplir > 0:
-            porcentaje_avance = (avance_real / meta_cumplir) * Decimal("100")
-        else:
-            porcentaje_avance = Decimal("0")
-
-        # Limitar entre 0-100
-        porcentaje_avance = round(porcentaje_avance, 2)
-
-        # ----------------------------------------
-        # NUEVO: CÁLCULO DE ESTADO SEGÚN AVANCE VS META
-        # ----------------------------------------
-        if avance_real >= meta_cumplir:
-            estado_avance = "Cumplida"
-            stats["completadas"] += 1
-        elif avance_real > Decimal("0"):
-            estado_avance = "En progreso"
-            stats["en_progreso"] += 1
-        else:
-            estado_avance = "Rezagada"
-            stats["rezagadas"] += 1
+        porcentaje_avance = round(mc.porcentaje, 2)
 
         # ----------------------------------------
         # FORMATEOS DISPLAY
@@ -138,9 +86,12 @@ def reporte_metas_departamento(request):
         # ----------------------------------------
         # ESTADO SEGÚN ACTIVIDADES (se mantiene para display)
         # ----------------------------------------
-        actividades = meta.actividad_set.filter(ciclo_id=ciclo.id)
-        total_acts = actividades.count()
-        completadas = actividades.filter(estado__iexact="Cumplida").count()
+        # Se filtran en memoria las actividades ya precargadas
+        actividades = [
+            act for act in meta.actividad_set.all() if act.ciclo_id == ciclo.id
+        ]
+        total_acts = len(actividades)
+        completadas = sum(1 for act in actividades if act.estado.lower() == "cumplida")
 
         if total_acts == 0:
             estado_actividades = "Rezagada"
@@ -155,92 +106,159 @@ def reporte_metas_departamento(request):
             (completadas / total_acts) * 100 if total_acts > 0 else 0
         )
 
-        resultados.append(
-            {
-                "id": meta.id,
-                "clave": meta.clave,
-                "nombre": meta.nombre,
-                "indicador": meta.indicador,
-                "metacumplir": meta_cumplir_display,
-                "lineabase": linea_base_display,
-                "total_acumulado": avance_display,
-                "porcentaje_avance": float(porcentaje_avance),
-                "proyecto": meta.proyecto.nombre if meta.proyecto else "N/A",
-                "departamento": (
-                    meta.departamento.nombre if meta.departamento else "N/A"
-                ),
-                "ciclo": ciclo.nombre if ciclo else "N/A",
-                "estado": estado_avance,  # Ahora usa el estado por avance
-                "estado_actividades": estado_actividades,  # Nuevo campo para estado de actividades
-                "cumplimiento": round(cumplimiento_actividades, 2),
-                "restante": round(100 - cumplimiento_actividades, 2),
-                "total_actividades": total_acts,
-                "actividades_cumplidas": completadas,
-                "categoria": "Acumulable" if meta.acumulable else "Incremental",
-                "avance_real": float(avance_real),  # Para referencia
-                "meta_cumplir_valor": float(meta_cumplir),  # Para referencia
-                "actividades": [
-                    {
-                        "nombre": act.nombre,
-                        "descripcion": act.descripcion,
-                        "fecha_inicio": act.fecha_inicio,
-                        "fecha_fin": act.fecha_fin,
-                        "estado": act.estado,
-                        "responsable": (
-                            f"{act.responsable.first_name} {act.responsable.last_name}".strip()
-                            if act.responsable
-                            else "Sin asignar"
-                        ),
-                    }
-                    for act in actividades
-                ],
-            }
+        yield {
+            "id": meta.id,
+            "clave": meta.clave,
+            "nombre": meta.nombre,
+            "indicador": meta.indicador,
+            "metacumplir": meta_cumplir_display,
+            "lineabase": linea_base_display,
+            "total_acumulado": avance_display,
+            "porcentaje_avance": float(porcentaje_avance),
+            "proyecto": meta.proyecto.nombre if meta.proyecto else "N/A",
+            "departamento": (meta.departamento.nombre if meta.departamento else "N/A"),
+            "ciclo": ciclo.nombre if ciclo else "N/A",
+            "estado": estado_avance,  # Ahora usa el estado por avance
+            "estado_actividades": estado_actividades,  # Nuevo campo para estado de actividades
+            "cumplimiento": round(cumplimiento_actividades, 2),
+            "restante": round(100 - cumplimiento_actividades, 2),
+            "total_actividades": total_acts,
+            "actividades_cumplidas": completadas,
+            "categoria": "Acumulable" if meta.acumulable else "Incremental",
+            "avance_real": float(avance_real),  # Para referencia
+            "meta_cumplir_valor": float(meta_cumplir),  # Para referencia
+            "actividades": [
+                {
+                    "nombre": act.nombre,
+                    "descripcion": act.descripcion,
+                    "fecha_inicio": act.fecha_inicio,
+                    "fecha_fin": act.fecha_fin,
+                    "estado": act.estado,
+                    "responsable": (
+                        f"{act.responsable.first_name} {act.responsable.last_name}".strip()
+                        if act.responsable
+                        else "Sin asignar"
+                    ),
+                }
+                for act in actividades
+            ],
+        }
+
+
+def consulta_metas_departamento(departamento_id, ciclo_id):
+    """MetaCiclo del reporte de metas por departamento, ya anotadas."""
+    # --- CONSULTA PRINCIPAL ---
+    metas_ciclo = MetaCiclo.objects.select_related(
+        "meta", "ciclo", "meta__proyecto", "meta__departamento"
+    ).prefetch_related(
+        Prefetch(
+            "meta__actividad_set",
+            queryset=Actividad.objects.select_related("responsable"),
         )
+    )
 
-    total_metas = len(resultados)
+    if departamento_id:
+        metas_ciclo = metas_ciclo.filter(meta__departamento_id=departamento_id)
+    if ciclo_id:
+        metas_ciclo = metas_ciclo.filter(ciclo_id=ciclo_id)
+
+    return anotar_avance_real(metas_ciclo).order_by(
+        "meta__departamento__nombre", "meta__nombre"
+    )
+
+
+def generar_metas_departamento(trabajo, archivo):
+    """Genera el Excel de metas por departamento de un TrabajoReporte."""
+    filas = (
+        [
+            r["clave"],
+            r["nombre"],
+            r["proyecto"],
+            r["departamento"],
+            r["ciclo"],
+            r["indicador"],
+            r["categoria"],
+            r["lineabase"],
+            r["metacumplir"],
+            r["total_acumulado"],
+            r["porcentaje_avance"],
+            r["estado"],
+            r["estado_actividades"],
+            r["cumplimiento"],
+            r["total_actividades"],
+            r["actividades_cumplidas"],
+        ]
+        for r in evaluar_metas_departamento(
+            consulta_metas_departamento(
+                trabajo.parametros.get("departamento"),
+                trabajo.parametros.get("ciclo"),
+            ).iterator(chunk_size=TAMANO_BLOQUE)
+        )
+    )
+    escribir_excel(
+        archivo,
+        "Metas",
+        [
+            "Clave",
+            "Nombre",
+            "Proyecto",
+            "Departamento",
+            "Ciclo",
+            "Indicador",
+            "Categoría",
+            "Línea Base",
+            "Meta a Cumplir",
+            "Total Avance",
+            "Porcentaje Avance (%)",
+            "Estado (por Avance)",
+            "Estado (por Actividades)",
+            "Cumplimiento Actividades (%)",
+            "Total Actividades",
+            "Actividades Cumplidas",
+        ],
+        filas,
+        ancho=20,
+    )
+    return "reporte_metas_departamento.xlsx"
+
+
+@role_required("ADMIN", "APOYO")
+def reporte_metas_departamento(request):
+    """
+    Reporte de Metas agrupadas por departamento y ciclo,
+    con cálculo del avance en base a AvanceMeta y MetaCiclo.
+    """
+    # --- FILTROS ---
+    departamento_id = request.GET.get("departamento")
+    ciclo_id = request.session.get("ciclo_id")
+
+    departamentos = Departamento.objects.all()
+    ciclos = Ciclo.objects.all()
 
     # ----------------------------------------
-    # EXPORTACIÓN A EXCEL
+    # EXPORTACIÓN A EXCEL (en segundo plano)
     # ----------------------------------------
     if "exportar" in request.GET:
+        return solicitar_exportacion(
+            request,
+            TrabajoReporte.METAS_DEPARTAMENTO,
+            {"departamento": departamento_id, "ciclo": ciclo_id},
+        )
 
-        excel_data = [
-            {
-                "Clave": r["clave"],
-                "Nombre": r["nombre"],
-                "Proyecto": r["proyecto"],
-                "Departamento": r["departamento"],
-                "Ciclo": r["ciclo"],
-                "Indicador": r["indicador"],
-                "Categoría": r["categoria"],
-                "Línea Base": r["lineabase"],
-                "Meta a Cumplir": r["metacumplir"],
-                "Total Avance": r["total_acumulado"],
-                "Porcentaje Avance (%)": r["porcentaje_avance"],
-                "Estado (por Avance)": r["estado"],  # Actualizado
-                "Estado (por Actividades)": r["estado_actividades"],  # Nuevo
-                "Cumplimiento Actividades (%)": r["cumplimiento"],
-                "Total Actividades": r["total_actividades"],
-                "Actividades Cumplidas": r["actividades_cumplidas"],
-            }
-            for r in resultados
-        ]
+    metas_ciclo = consulta_metas_departamento(departamento_id, ciclo_id)
 
-        df = pd.DataFrame(excel_data)
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Metas")
-            writer.sheets["Metas"].set_column("A:P", 20)  # Ajustado por nueva columna
+    # --- PROCESAMIENTO PRINCIPAL ---
+    resultados = list(evaluar_metas_departamento(metas_ciclo))
+    total_metas = len(resultados)
 
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        response["Content-Disposition"] = (
-            'attachment; filename="reporte_metas_departamento.xlsx"'
-        )
-        return response
+    stats = {"completadas": 0, "en_progreso": 0, "rezagadas": 0}
+    for r in resultados:
+        if r["estado"] == "Cumplida":
+            stats["completadas"] += 1
+        elif r["estado"] == "En progreso":
+            stats["en_progreso"] += 1
+        else:
+            stats["rezagadas"] += 1
 
     # ----------------------------------------
     # CONTEXTO FINAL
@@ -260,6 +278,17 @@ def reporte_metas_departamento(request):
     return render(request, "reportes/reporte_metas.html", context)
 
 
+def estado_resumen_proyecto(resumen):
+    """Estado de un proyecto a partir de su resumen de cumplimiento."""
+    if not resumen or resumen.total == 0:
+        return "Sin metas en este ciclo"
+    if resumen.cumplido:
+        return "Cumplido"
+    if resumen.en_progreso > 0:
+        return "En progreso"
+    return "Rezago"
+
+
 @role_required("ADMIN", "APOYO")
 def reporte_proyectos(request):
     proyectos_cumplidos = 0
@@ -271,75 +300,96 @@ def reporte_proyectos(request):
 
     proyectos = Proyecto.objects.all().order_by("nombre")
 
+    # Conteos por proyecto desde los resúmenes persistidos (una consulta)
+    resumenes = {
+        r.entidad_id: r
+        for r in ResumenCumplimiento.objects.filter(
+            ciclo=ciclo,
+            nivel=ResumenCumplimiento.NIVEL_PROYECTO,
+            departamento__isnull=True,
+        )
+    }
+
+    if "exportar" in request.GET:
+        # Las metas se leen por bloques ya ordenadas por proyecto; el estado
+        # del proyecto sale de los resúmenes
+        estados = {
+            proyecto_id: estado_resumen_proyecto(resumen)
+            for proyecto_id, resumen in resumenes.items()
+        }
+        metas_ciclo = (
+            consulta_progreso(ciclo)
+            .order_by("meta__proyecto__nombre", "meta__proyecto_id", "meta_id")
+            .iterator(chunk_size=TAMANO_BLOQUE)
+        )
+        filas = (
+            [
+                mc.meta.proyecto.nombre,
+                estados.get(mc.meta.proyecto_id, "Sin metas en este ciclo"),
+                mc.meta.clave,
+                mc.meta.nombre,
+                float(mc.metaCumplir or Decimal("0")),
+                float(round(mc.avance_real, 2)),
+                round(float(mc.porcentaje), 2),
+                mc.estado,
+            ]
+            for mc in map(evaluar_progreso, metas_ciclo)
+            if mc.meta.proyecto_id
+        )
+        return exportar_excel(
+            "reporte_proyectos.xlsx",
+            "Proyectos",
+            [
+                "Proyecto",
+                "Estado Proyecto",
+                "Clave Meta",
+                "Nombre Meta",
+                "Meta a Cumplir",
+                "Avance Real",
+                "Porcentaje (%)",
+                "Estado Meta",
+            ],
+            filas,
+            ancho=25,
+        )
+
+    # Detalle de las metas del ciclo agrupado por proyecto
+    metas_por_proyecto = {}
+    for mc in progreso_metas(ciclo):
+        metas_por_proyecto.setdefault(mc.meta.proyecto_id, []).append(mc)
+
     data = []
     total_cumplidas = total_en_progreso = total_rezagadas = 0
 
     for proyecto in proyectos:
-        metas = Meta.objects.filter(proyecto=proyecto)
+        resumen = resumenes.get(proyecto.id)
+        total_metas_validas = resumen.total if resumen else 0
+        metas_cumplidas = resumen.cumplidos if resumen else 0
+        metas_en_progreso = resumen.en_progreso if resumen else 0
+        metas_rezagadas = resumen.rezagados if resumen else 0
 
-        metas_cumplidas = metas_en_progreso = metas_rezagadas = 0
         metas_data = []
-        total_metas_validas = 0
-
-        for meta in metas:
-            mc = MetaCiclo.objects.filter(meta=meta, ciclo=ciclo).first()
-            if not mc:
-                continue
-
-            total_metas_validas += 1
+        for mc in metas_por_proyecto.get(proyecto.id, []):
+            meta = mc.meta
             meta_target = mc.metaCumplir or Decimal("0")
 
-            avances = AvanceMeta.objects.filter(metaCumplir=meta, ciclo=ciclo).order_by(
-                "fecha_registro"
-            )
-
-            if meta.acumulable:
-                ultimo = avances.last()
-                avance_real = (
-                    ultimo.avance if ultimo and ultimo.avance else Decimal("0")
-                )
-            else:
-                avance_real = avances.aggregate(suma=Sum("avance"))["suma"] or Decimal(
-                    "0"
-                )
-
-            if meta_target == 0:
-                porcentaje_real = 0.0
-            else:
-                porcentaje_real = float((avance_real / meta_target) * 100)
-                porcentaje_real = round(porcentaje_real, 2)
-
-            if porcentaje_real >= 100:
-                estado_meta = "Cumplida"
-                metas_cumplidas += 1
-            elif porcentaje_real > 0:
-                estado_meta = "En progreso"
-                metas_en_progreso += 1
-            else:
-                estado_meta = "Rezagada"
-                metas_rezagadas += 1
-
             metas_data.append(
                 {
                     "clave": meta.clave,
                     "nombre": meta.nombre,
                     "meta_target": float(meta_target),
-                    "avance_real": float(round(avance_real, 2)),
-                    "porcentaje_real": porcentaje_real,
-                    "estado": estado_meta,
+                    "avance_real": float(round(mc.avance_real, 2)),
+                    "porcentaje_real": round(float(mc.porcentaje), 2),
+                    "estado": mc.estado,
                 }
             )
 
-        if total_metas_validas == 0:
-            estado_proyecto = "Sin metas en este ciclo"
-        elif metas_cumplidas == total_metas_validas:
-            estado_proyecto = "Cumplido"
+        estado_proyecto = estado_resumen_proyecto(resumen)
+        if estado_proyecto == "Cumplido":
             proyectos_cumplidos += 1
-        elif metas_en_progreso > 0:
-            estado_proyecto = "En progreso"
+        elif estado_proyecto == "En progreso":
             proyectos_en_progreso += 1
-        else:
-            estado_proyecto = "Rezago"
+        elif estado_proyecto == "Rezago":
             proyectos_rezagados += 1
 
         total_cumplidas += metas_cumplidas
@@ -364,42 +414,6 @@ def reporte_proyectos(request):
         "Rezago": proyectos_rezagados,
     }
 
-    if "exportar" in request.GET:
-
-        excel_rows = []
-
-        for d in data:
-            for m in d["metas"]:
-                excel_rows.append(
-                    {
-                        "Proyecto": d["proyecto"],
-                        "Estado Proyecto": d["estado"],
-                        "Clave Meta": m["clave"],
-                        "Nombre Meta": m["nombre"],
-                        "Meta a Cumplir": m["meta_target"],
-                        "Avance Real": m["avance_real"],
-                        "Porcentaje (%)": m["porcentaje_real"],
-                        "Estado Meta": m["estado"],
-                    }
-                )
-
-        df = pd.DataFrame(excel_rows)
-
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Proyectos")
-            worksheet = writer.sheets["Proyectos"]
-            worksheet.set_column("A:H", 25)
-
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer.read(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        response["Content-Disposition"] = (
-            'attachment; filename="reporte_proyectos.xlsx"'
-        )
-        return response
     context = {
         "data": data,
         "nombres_proyectos": [d["proyecto"] for d in data],
@@ -424,46 +438,12 @@ def reporte_proyectos(request):
     return render(request, "reportes/reporte_proyectos.html", context)
 
 
-@role_required("ADMIN", "APOYO")
-def reporte_avances_metas(request):
-
-    departamento_id = request.GET.get("departamento")
-    ciclo_id = request.session.get("ciclo_id")
-
-    departamentos = Departamento.objects.all()
-    ciclos = Ciclo.objects.all()
-
-    # === Consulta base ===
-    metas_query = Meta.objects.select_related(
-        "proyecto", "departamento"
-    ).prefetch_related(
-        Prefetch(
-            "avancemeta_set",
-            queryset=(
-                AvanceMeta.objects.filter(ciclo_id=ciclo_id)
-                if ciclo_id
-                else AvanceMeta.objects.all()
-            ),
-            to_attr="avances_filtrados",
-        ),
-        Prefetch(
-            "metas_ciclo",
-            queryset=(
-                MetaCiclo.objects.filter(ciclo_id=ciclo_id)
-                if ciclo_id
-                else MetaCiclo.objects.all()
-            ),
-            to_attr="meta_ciclo_actual",
-        ),
-    )
-
-    # === Filtro por departamento (DE LA META) ===
-    if departamento_id:
-        metas_query = metas_query.filter(departamento_id=departamento_id)
-
-    data = []
-
-    for meta in metas_query:
+def evaluar_avances_metas(metas):
+    """
+    Genera el avance total, porcentaje y estado de cada meta con sus
+    avances y su MetaCiclo del ciclo ya precargados.
+    """
+    for meta in metas:
         # Obtener meta_ciclo correspondiente
         meta_ciclo = None
         if hasattr(meta, "meta_ciclo_actual") and meta.meta_ciclo_actual:
@@ -507,38 +487,99 @@ def reporte_avances_metas(request):
         else:
             estado = "Rezago"
 
-        data.append(
-            {
-                "departamento": meta.departamento.nombre if meta.departamento else "-",
-                "proyecto": meta.proyecto.nombre if meta.proyecto else "-",
-                "clave_meta": meta.clave,
-                "meta": meta.nombre or meta.clave,
-                "linea_base": mostrar(linea_base),
-                "meta_cumplir": mostrar(meta_cumplir),
-                "avance_total": mostrar(avance_total),
-                "porcentaje_avance": porcentaje_avance,
-                "estado": estado,
-                "tipo_meta": "Porcentaje" if usa_porcentaje else "Valor Absoluto",
-                "acumulable": "Sí" if meta.acumulable else "No",
-            }
-        )
+        yield {
+            "departamento": meta.departamento.nombre if meta.departamento else "-",
+            "proyecto": meta.proyecto.nombre if meta.proyecto else "-",
+            "clave_meta": meta.clave,
+            "meta": meta.nombre or meta.clave,
+            "linea_base": mostrar(linea_base),
+            "meta_cumplir": mostrar(meta_cumplir),
+            "avance_total": mostrar(avance_total),
+            "porcentaje_avance": porcentaje_avance,
+            "estado": estado,
+            "tipo_meta": "Porcentaje" if usa_porcentaje else "Valor Absoluto",
+            "acumulable": "Sí" if meta.acumulable else "No",
+        }
+
+
+def consulta_avances_metas(departamento_id, ciclo_id):
+    """Metas con sus avances y MetaCiclo del ciclo precargados."""
+    # === Consulta base ===
+    metas_query = Meta.objects.select_related(
+        "proyecto", "departamento"
+    ).prefetch_related(
+        Prefetch(
+            "avancemeta_set",
+            queryset=(
+                AvanceMeta.objects.filter(ciclo_id=ciclo_id)
+                if ciclo_id
+                else AvanceMeta.objects.all()
+            ),
+            to_attr="avances_filtrados",
+        ),
+        Prefetch(
+            "metas_ciclo",
+            queryset=(
+                MetaCiclo.objects.filter(ciclo_id=ciclo_id)
+                if ciclo_id
+                else MetaCiclo.objects.all()
+            ),
+            to_attr="meta_ciclo_actual",
+        ),
+    )
+
+    # === Filtro por departamento (DE LA META) ===
+    if departamento_id:
+        metas_query = metas_query.filter(departamento_id=departamento_id)
+
+    return metas_query
+
+
+def generar_avances_metas(trabajo, archivo):
+    """Genera el Excel de avances de metas de un TrabajoReporte."""
+    columnas = [
+        "departamento",
+        "proyecto",
+        "clave_meta",
+        "meta",
+        "linea_base",
+        "meta_cumplir",
+        "avance_total",
+        "porcentaje_avance",
+        "estado",
+        "tipo_meta",
+        "acumulable",
+    ]
+    metas = consulta_avances_metas(
+        trabajo.parametros.get("departamento"), trabajo.parametros.get("ciclo")
+    )
+    filas = (
+        [fila[columna] for columna in columnas]
+        for fila in evaluar_avances_metas(metas.iterator(chunk_size=TAMANO_BLOQUE))
+    )
+    escribir_excel(archivo, "Avances Metas", columnas, filas)
+    return "reporte_avances_metas.xlsx"
+
+
+@role_required("ADMIN", "APOYO")
+def reporte_avances_metas(request):
+
+    departamento_id = request.GET.get("departamento")
+    ciclo_id = request.session.get("ciclo_id")
+
+    departamentos = Departamento.objects.all()
+    ciclos = Ciclo.objects.all()
 
-    # === Exportar a Excel ===
+    # === Exportar a Excel (en segundo plano) ===
     if "exportar" in request.GET:
-        df = pd.DataFrame(data)
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            df.to_excel(writer, sheet_name="Avances Metas", index=False)
-        buffer.seek(0)
-
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        response["Content-Disposition"] = (
-            'attachment; filename="reporte_avances_metas.xlsx"'
+        return solicitar_exportacion(
+            request,
+            TrabajoReporte.AVANCES_METAS,
+            {"departamento": departamento_id, "ciclo": ciclo_id},
         )
-        return response
+
+    metas_query = consulta_avances_metas(departamento_id, ciclo_id)
+    data = list(evaluar_avances_metas(metas_query))
 
     context = {
         "data": data,
@@ -553,28 +594,11 @@ def reporte_avances_metas(request):
     return render(request, "reportes/reporte_avances_metas.html", context)
 
 
-@role_required("ADMIN", "APOYO")
-def reporte_riesgos(request):
+def evaluar_riesgos(riesgos):
     """
-    Reporte general de riesgos por actividad y meta.
-    Filtrado por ciclo activo y exportable a Excel.
+    Genera el valor, nivel y mitigaciones de cada riesgo (con mitigacion_set
+    precargado).
     """
-
-    ciclo_id = request.session.get("ciclo_id")
-
-    # === Query base ===
-    riesgos = (
-        Riesgo.objects.select_related("actividad", "actividad__meta")
-        .prefetch_related("mitigacion_set")
-        .order_by("actividad__meta__nombre", "actividad__nombre")
-    )
-
-    if ciclo_id:
-        riesgos = riesgos.filter(actividad__ciclo_id=ciclo_id)
-
-    data = []
-    niveles = {"Bajo": 0, "Medio": 0, "Alto": 0, "Crítico": 0}
-
     for r in riesgos:
 
         meta_nombre = (
@@ -602,66 +626,91 @@ def reporte_riesgos(request):
             nivel_riesgo = "Crítico"
             color = "dark"
 
-        niveles[nivel_riesgo] += 1
+        # === Mitigaciones (ya precargadas) ===
+        mitigaciones = list(r.mitigacion_set.all())
+        ultima = max(mitigaciones, key=lambda m: m.id, default=None)
+
+        yield {
+            "meta": meta_nombre,
+            "actividad": actividad_nombre,
+            "enunciado": r.enunciado,
+            "probabilidad": probabilidad,
+            "impacto": impacto,
+            "valor_riesgo": valor_riesgo,
+            "nivel_riesgo": nivel_riesgo,
+            "color": color,
+            "tiene_mitigaciones": bool(mitigaciones),
+            "total_mitigaciones": len(mitigaciones),
+            "ultima_mitigacion": ultima.accion if ultima else "Sin acciones",
+        }
 
-        # === Mitigaciones ===
-        mitigaciones = r.mitigacion_set.all()
 
-        ultima = mitigaciones.order_by(
-            "-id"
-        ).first()  # seguridad si no hay orden definido
+@role_required("ADMIN", "APOYO")
+def reporte_riesgos(request):
+    """
+    Reporte general de riesgos por actividad y meta.
+    Filtrado por ciclo activo y exportable a Excel.
+    """
 
-        data.append(
-            {
-                "meta": meta_nombre,
-                "actividad": actividad_nombre,
-                "enunciado": r.enunciado,
-                "probabilidad": probabilidad,
-                "impacto": impacto,
-                "valor_riesgo": valor_riesgo,
-                "nivel_riesgo": nivel_riesgo,
-                "color": color,
-                "tiene_mitigaciones": mitigaciones.exists(),
-                "total_mitigaciones": mitigaciones.count(),
-                "ultima_mitigacion": ultima.accion if ultima else "Sin acciones",
-            }
+    ciclo_id = request.session.get("ciclo_id")
+
+    # === Query base ===
+    # Ordenados Crítico → Bajo desde la consulta para poder exportar por bloques
+    riesgos = (
+        Riesgo.objects.select_related("actividad", "actividad__meta")
+        .prefetch_related("mitigacion_set")
+        .annotate(
+            orden_nivel=Case(
+                When(riesgo__lte=25, then=Value(1)),
+                When(riesgo__lte=50, then=Value(2)),
+                When(riesgo__lte=90, then=Value(3)),
+                default=Value(4),
+            )
         )
+        .order_by("-orden_nivel", "actividad__meta__nombre", "actividad__nombre")
+    )
 
-    # === Ordenar Crítico → Bajo ===
-    orden = {"Crítico": 4, "Alto": 3, "Medio": 2, "Bajo": 1}
-    data.sort(key=lambda x: orden[x["nivel_riesgo"]], reverse=True)
+    if ciclo_id:
+        riesgos = riesgos.filter(actividad__ciclo_id=ciclo_id)
 
     # === Excel ===
     if "exportar" in request.GET:
-        export = [
-            {
-                "Meta": d["meta"],
-                "Actividad": d["actividad"],
-                "Riesgo": d["enunciado"],
-                "Probabilidad": d["probabilidad"],
-                "Impacto": d["impacto"],
-                "Valor Riesgo": d["valor_riesgo"],
-                "Nivel": d["nivel_riesgo"],
-                "Mitigaciones": d["total_mitigaciones"],
-                "Última Acción": d["ultima_mitigacion"],
-            }
-            for d in data
-        ]
-
-        df = pd.DataFrame(export)
-        buffer = io.BytesIO()
-
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Riesgos")
-            sheet = writer.sheets["Riesgos"]
-            sheet.set_column("A:I", 25)
-
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filas = (
+            [
+                d["meta"],
+                d["actividad"],
+                d["enunciado"],
+                d["probabilidad"],
+                d["impacto"],
+                d["valor_riesgo"],
+                d["nivel_riesgo"],
+                d["total_mitigaciones"],
+                d["ultima_mitigacion"],
+            ]
+            for d in evaluar_riesgos(riesgos.iterator(chunk_size=TAMANO_BLOQUE))
+        )
+        return exportar_excel(
+            "reporte_riesgos.xlsx",
+            "Riesgos",
+            [
+                "Meta",
+                "Actividad",
+                "Riesgo",
+                "Probabilidad",
+                "Impacto",
+                "Valor Riesgo",
+                "Nivel",
+                "Mitigaciones",
+                "Última Acción",
+            ],
+            filas,
+            ancho=25,
         )
-        response["Content-Disposition"] = 'attachment; filename="reporte_riesgos.xlsx"'
-        return response
+
+    data = list(evaluar_riesgos(riesgos))
+    niveles = {"Bajo": 0, "Medio": 0, "Alto": 0, "Crítico": 0}
+    for d in data:
+        niveles[d["nivel_riesgo"]] += 1
 
     # === Contexto ===
     context = {
@@ -669,7 +718,7 @@ def reporte_riesgos(request):
         "hay_datos": len(data) > 0,
         "niveles_labels": list(niveles.keys()),
         "niveles_values": list(niveles.values()),
-        "total_riesgos": riesgos.count(),
+        "total_riesgos": len(data),
         "riesgos_bajos": niveles["Bajo"],
         "riesgos_medios": niveles["Medio"],
         "riesgos_altos": niveles["Alto"],
@@ -679,69 +728,11 @@ def reporte_riesgos(request):
     return render(request, "reportes/reporte_riesgos.html", context)
 
 
-@role_required("DOCENTE")
-def reporte_general_docente(request):
+def evaluar_metas_docente(metas):
     """
-    Reporte para docentes que muestra avances de metas (AvanceMeta)
-    y estado basado en actividades, optimizado para cálculo correcto
+    Genera avance, estado por avances y estado por actividades de cada meta
+    del docente con su MetaCiclo, avances y actividades del ciclo precargados.
     """
-    from decimal import Decimal
-    from django.db.models import Prefetch, Sum
-
-    user = request.user
-    departamento = user.departamento
-    ciclo_id = request.session.get("ciclo_id")
-    ciclo = Ciclo.objects.filter(id=ciclo_id).first()
-
-    if not ciclo:
-        return render(
-            request,
-            "reportes/reporte_docente.html",
-            {
-                "error": "No hay ciclo activo seleccionado",
-                "metas": [],
-                "total_metas": 0,
-            },
-        )
-
-    # === CONSULTAS OPTIMIZADAS ===
-    metas_ciclo_prefetch = Prefetch(
-        "metas_ciclo",
-        queryset=MetaCiclo.objects.filter(ciclo=ciclo),
-        to_attr="meta_ciclo_actual",
-    )
-
-    avances_prefetch = Prefetch(
-        "avancemeta_set",
-        queryset=AvanceMeta.objects.filter(ciclo=ciclo).order_by("fecha_registro"),
-        to_attr="avances_ciclo_actual",
-    )
-
-    actividades_prefetch = Prefetch(
-        "actividad_set",
-        queryset=Actividad.objects.filter(ciclo=ciclo).select_related("responsable"),
-        to_attr="actividades_ciclo_actual",
-    )
-
-    # === CONSULTA PRINCIPAL OPTIMIZADA ===
-    metas = (
-        Meta.objects.filter(
-            departamento=departamento,
-            activa=True,
-            metas_ciclo__ciclo=ciclo,  # Solo metas que participan en este ciclo
-        )
-        .select_related("proyecto")
-        .prefetch_related(metas_ciclo_prefetch, avances_prefetch, actividades_prefetch)
-        .distinct()  # Evitar duplicados por el join con metas_ciclo
-        .order_by("clave")
-    )
-
-    resultados = []
-    # Stats basadas en AVANCES de metas
-    stats_avances = {"completadas": 0, "en_progreso": 0, "rezagadas": 0}
-    # Stats basadas en ACTIVIDADES
-    stats_actividades = {"completadas": 0, "en_progreso": 0, "rezagadas": 0}
-
     for meta in metas:
         # === OBTENER META CICLO ACTUAL ===
         meta_ciclo = None
@@ -785,16 +776,12 @@ def reporte_general_docente(request):
         # === ESTADO DE LA META SEGÚN AVANCES ===
         if meta_cumplir == 0:
             estado_avance = "Sin meta"
-            stats_avances["rezagadas"] += 1
         elif porcentaje_avance >= 100:
             estado_avance = "Cumplida"
-            stats_avances["completadas"] += 1
         elif porcentaje_avance > 0:
             estado_avance = "En progreso"
-            stats_avances["en_progreso"] += 1
         else:
             estado_avance = "Rezagada"
-            stats_avances["rezagadas"] += 1
 
         # === CÁLCULO DE ACTIVIDADES ===
         actividades = getattr(meta, "actividades_ciclo_actual", [])
@@ -812,16 +799,12 @@ def reporte_general_docente(request):
         # === ESTADO SEGÚN ACTIVIDADES ===
         if total_acts == 0:
             estado_actividades = "Sin actividades"
-            stats_actividades["rezagadas"] += 1
         elif completadas == total_acts:
             estado_actividades = "Cumplida"
-            stats_actividades["completadas"] += 1
         elif completadas == 0:
             estado_actividades = "Rezagada"
-            stats_actividades["rezagadas"] += 1
         else:
             estado_actividades = "En progreso"
-            stats_actividades["en_progreso"] += 1
 
         # === FORMATEO PARA DISPLAY ===
         if meta.porcentages:
@@ -840,100 +823,172 @@ def reporte_general_docente(request):
             meta_cumplir_display = f"{meta_cumplir.quantize(Decimal('0.00'))}"
 
         # === CONSTRUIR RESULTADO ===
-        resultados.append(
+        yield {
+            "id": meta.id,
+            "clave": meta.clave,
+            "nombre": meta.nombre,
+            "indicador": meta.indicador,
+            "linea_base": linea_base_display,
+            "meta_cumplir": meta_cumplir_display,
+            "avance_real": avance_display,
+            "avance_real_raw": float(avance_real.quantize(Decimal("0.00"))),
+            "porcentaje_avance": float(porcentaje_avance),
+            "proyecto": meta.proyecto.nombre if meta.proyecto else "N/A",
+            # Estado principal: basado en AVANCES
+            "estado": estado_avance,
+            "estado_avance": estado_avance,  # Para claridad
+            "estado_actividades": estado_actividades,  # Estado por actividades
+            "cumplimiento_actividades": round(cumplimiento_actividades, 2),
+            "restante_actividades": round(100 - cumplimiento_actividades, 2),
+            "total_actividades": total_acts,
+            "actividades_cumplidas": completadas,
+            "categoria": "Acumulable" if meta.acumulable else "Incremental",
+            "tipo_meta": "Porcentual" if meta.porcentages else "Numérica",
+            "actividades": [
+                {
+                    "nombre": act.nombre or "Sin nombre",
+                    "descripcion": act.descripcion,
+                    "fecha_inicio": (
+                        act.fecha_inicio.strftime("%d/%m/%Y")
+                        if act.fecha_inicio
+                        else "Sin fecha"
+                    ),
+                    "fecha_fin": (
+                        act.fecha_fin.strftime("%d/%m/%Y")
+                        if act.fecha_fin
+                        else "Sin fecha"
+                    ),
+                    "estado": act.estado,
+                    "responsable": (
+                        f"{act.responsable.first_name} {act.responsable.last_name}".strip()
+                        if act.responsable and act.responsable.first_name
+                        else getattr(act.responsable, "username", "Sin asignar")
+                    ),
+                }
+                for act in actividades
+            ],
+        }
+
+
+@role_required("DOCENTE")
+def reporte_general_docente(request):
+    """
+    Reporte para docentes que muestra avances de metas (AvanceMeta)
+    y estado basado en actividades, optimizado para cálculo correcto
+    """
+    user = request.user
+    departamento = user.departamento
+    ciclo_id = request.session.get("ciclo_id")
+    ciclo = Ciclo.objects.filter(id=ciclo_id).first()
+
+    if not ciclo:
+        return render(
+            request,
+            "reportes/reporte_docente.html",
             {
-                "id": meta.id,
-                "clave": meta.clave,
-                "nombre": meta.nombre,
-                "indicador": meta.indicador,
-                "linea_base": linea_base_display,
-                "meta_cumplir": meta_cumplir_display,
-                "avance_real": avance_display,
-                "avance_real_raw": float(avance_real.quantize(Decimal("0.00"))),
-                "porcentaje_avance": float(porcentaje_avance),
-                "proyecto": meta.proyecto.nombre if meta.proyecto else "N/A",
-                # Estado principal: basado en AVANCES
-                "estado": estado_avance,
-                "estado_avance": estado_avance,  # Para claridad
-                "estado_actividades": estado_actividades,  # Estado por actividades
-                "cumplimiento_actividades": round(cumplimiento_actividades, 2),
-                "restante_actividades": round(100 - cumplimiento_actividades, 2),
-                "total_actividades": total_acts,
-                "actividades_cumplidas": completadas,
-                "categoria": "Acumulable" if meta.acumulable else "Incremental",
-                "tipo_meta": "Porcentual" if meta.porcentages else "Numérica",
-                "actividades": [
-                    {
-                        "nombre": act.nombre or "Sin nombre",
-                        "descripcion": act.descripcion,
-                        "fecha_inicio": (
-                            act.fecha_inicio.strftime("%d/%m/%Y")
-                            if act.fecha_inicio
-                            else "Sin fecha"
-                        ),
-                        "fecha_fin": (
-                            act.fecha_fin.strftime("%d/%m/%Y")
-                            if act.fecha_fin
-                            else "Sin fecha"
-                        ),
-                        "estado": act.estado,
-                        "responsable": (
-                            f"{act.responsable.first_name} {act.responsable.last_name}".strip()
-                            if act.responsable and act.responsable.first_name
-                            else getattr(act.responsable, "username", "Sin asignar")
-                        ),
-                    }
-                    for act in actividades
-                ],
-            }
+                "error": "No hay ciclo activo seleccionado",
+                "metas": [],
+                "total_metas": 0,
+            },
         )
 
-    total_metas = len(resultados)
+    # === CONSULTAS OPTIMIZADAS ===
+    metas_ciclo_prefetch = Prefetch(
+        "metas_ciclo",
+        queryset=MetaCiclo.objects.filter(ciclo=ciclo),
+        to_attr="meta_ciclo_actual",
+    )
 
-    # === EXPORTACIÓN A EXCEL ===
-    if "exportar" in request.GET and resultados:
-        excel_data = []
-        for r in resultados:
-            excel_data.append(
-                {
-                    "Clave": r["clave"],
-                    "Nombre": r["nombre"],
-                    "Proyecto": r["proyecto"],
-                    "Indicador": r["indicador"],
-                    "Categoría": r["categoria"],
-                    "Tipo Meta": r["tipo_meta"],
-                    "Línea Base": r["linea_base"],
-                    "Meta a Cumplir": r["meta_cumplir"],
-                    "Avance Real": r["avance_real"],
-                    "Porcentaje Avance (%)": r["porcentaje_avance"],
-                    "Estado (Avances)": r["estado_avance"],
-                    "Estado (Actividades)": r["estado_actividades"],
-                    "Cumplimiento Actividades (%)": r["cumplimiento_actividades"],
-                    "Total Actividades": r["total_actividades"],
-                    "Actividades Cumplidas": r["actividades_cumplidas"],
-                }
-            )
+    avances_prefetch = Prefetch(
+        "avancemeta_set",
+        queryset=AvanceMeta.objects.filter(ciclo=ciclo).order_by("fecha_registro"),
+        to_attr="avances_ciclo_actual",
+    )
 
-        df = pd.DataFrame(excel_data)
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Metas Docente")
-            worksheet = writer.sheets["Metas Docente"]
-
-            # Formato de columnas automático
-            for idx, col in enumerate(df.columns):
-                max_len = max(df[col].astype(str).str.len().max(), len(col)) + 2
-                worksheet.set_column(idx, idx, min(max_len, 25))
-
-        buffer.seek(0)
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    actividades_prefetch = Prefetch(
+        "actividad_set",
+        queryset=Actividad.objects.filter(ciclo=ciclo).select_related("responsable"),
+        to_attr="actividades_ciclo_actual",
+    )
+
+    # === CONSULTA PRINCIPAL OPTIMIZADA ===
+    metas = (
+        Meta.objects.filter(
+            departamento=departamento,
+            activa=True,
+            metas_ciclo__ciclo=ciclo,  # Solo metas que participan en este ciclo
+        )
+        .select_related("proyecto")
+        .prefetch_related(metas_ciclo_prefetch, avances_prefetch, actividades_prefetch)
+        .distinct()  # Evitar duplicados por el join con metas_ciclo
+        .order_by("clave")
+    )
+
+    # === EXPORTACIÓN A EXCEL ===
+    if "exportar" in request.GET and metas.exists():
+        filas = (
+            [
+                r["clave"],
+                r["nombre"],
+                r["proyecto"],
+                r["indicador"],
+                r["categoria"],
+                r["tipo_meta"],
+                r["linea_base"],
+                r["meta_cumplir"],
+                r["avance_real"],
+                r["porcentaje_avance"],
+                r["estado_avance"],
+                r["estado_actividades"],
+                r["cumplimiento_actividades"],
+                r["total_actividades"],
+                r["actividades_cumplidas"],
+            ]
+            for r in evaluar_metas_docente(metas.iterator(chunk_size=TAMANO_BLOQUE))
         )
-        response["Content-Disposition"] = (
-            f'attachment; filename="reporte_docente_{user.username}_{ciclo.nombre.replace(" ", "_")}.xlsx"'
+        # Formato de columnas automático
+        return exportar_excel(
+            f'reporte_docente_{user.username}_{ciclo.nombre.replace(" ", "_")}.xlsx',
+            "Metas Docente",
+            [
+                "Clave",
+                "Nombre",
+                "Proyecto",
+                "Indicador",
+                "Categoría",
+                "Tipo Meta",
+                "Línea Base",
+                "Meta a Cumplir",
+                "Avance Real",
+                "Porcentaje Avance (%)",
+                "Estado (Avances)",
+                "Estado (Actividades)",
+                "Cumplimiento Actividades (%)",
+                "Total Actividades",
+                "Actividades Cumplidas",
+            ],
+            filas,
+            autoajustar=True,
         )
-        return response
+
+    resultados = list(evaluar_metas_docente(metas))
+    total_metas = len(resultados)
+
+    # Stats basadas en AVANCES de metas
+    stats_avances = {"completadas": 0, "en_progreso": 0, "rezagadas": 0}
+    # Stats basadas en ACTIVIDADES
+    stats_actividades = {"completadas": 0, "en_progreso": 0, "rezagadas": 0}
+    for r in resultados:
+        for stats, estado in (
+            (stats_avances, r["estado_avance"]),
+            (stats_actividades, r["estado_actividades"]),
+        ):
+            if estado == "Cumplida":
+                stats["completadas"] += 1
+            elif estado == "En progreso":
+                stats["en_progreso"] += 1
+            else:
+                stats["rezagadas"] += 1
 
     # === RESUMEN GENERAL (basado en AVANCES) ===
     if total_metas == 0:
@@ -994,3 +1049,74 @@ def reporte_general_docente(request):
             "stats_actividades": stats_actividades,
         },
     )
+
+
+# ========== TRABAJOS EN SEGUNDO PLANO ==========
+def solicitar_exportacion(request, tipo, parametros):
+    """
+    Encola (o reutiliza) el trabajo del reporte y lleva a la página de
+    seguimiento. Con ?formato=json devuelve el id y las URLs del trabajo.
+    """
+    trabajo = solicitar_trabajo(tipo, parametros, request.user)
+    if request.GET.get("formato") == "json":
+        return JsonResponse(datos_trabajo(trabajo), status=202)
+    return redirect("trabajo_reporte", trabajo_id=trabajo.id)
+
+
+def datos_trabajo(trabajo):
+    return {
+        "id": str(trabajo.id),
+        "tipo": trabajo.tipo,
+        "estado": trabajo.estado,
+        "error": trabajo.error,
+        "sin_worker": sin_worker(trabajo),
+        "url_estado": reverse("estado_trabajo_reporte", args=[trabajo.id]),
+        "url_descarga": (
+            reverse("descargar_trabajo_reporte", args=[trabajo.id])
+            if trabajo.estado == TrabajoReporte.TERMINADO
+            else None
+        ),
+    }
+
+
+def obtener_trabajo(request, trabajo_id):
+    """
+    Trabajo visible para el usuario: ADMIN y APOYO ven todos; los demás,
+    los que solicitaron o los generados con su mismo alcance.
+    """
+    trabajo = get_object_or_404(TrabajoReporte, id=trabajo_id)
+    user = request.user
+    if user.role not in ("ADMIN", "APOYO") and not (
+        trabajo.solicitante_id == user.id
+        or trabajo.parametros.get("responsable") == user.id
+    ):
+        raise Http404
+    return trabajo
+
+
+@role_required("ADMIN", "APOYO", "DOCENTE")
+def trabajo_reporte(request, trabajo_id):
+    trabajo = obtener_trabajo(request, trabajo_id)
+    return render(
+        request,
+        "reportes/trabajo_reporte.html",
+        {"trabajo": trabajo, "datos": datos_trabajo(trabajo)},
+    )
+
+
+@role_required("ADMIN", "APOYO", "DOCENTE")
+def estado_trabajo_reporte(request, trabajo_id):
+    trabajo = obtener_trabajo(request, trabajo_id)
+    return JsonResponse(datos_trabajo(trabajo))
+
+
+@role_required("ADMIN", "APOYO", "DOCENTE")
+def descargar_trabajo_reporte(request, trabajo_id):
+    trabajo = obtener_trabajo(request, trabajo_id)
+    if trabajo.estado != TrabajoReporte.TERMINADO or not trabajo.archivo:
+        raise Http404("El reporte todavía no está disponible")
+    return FileResponse(
+        trabajo.archivo.open("rb"),
+        as_attachment=True,
+        filename=trabajo.nombre_archivo,
+    )
@@ -1,8 +1,6 @@
 import os
 from pathlib import Path
 from decouple import config
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
 
 SITE_NAME = "SADI"
 DOMAIN = "sadi.surguanajuato.tecnm.mx"
@@ -59,6 +57,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Antes que los demás para contar también sus consultas (sesión, usuario)
+    "core.middleware.InstrumentacionSQLMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -107,16 +107,39 @@ TEMPLATES = [
     },
 ]
 
+# Conexiones a PostgreSQL. Por defecto cada proceso conserva su conexión
+# DB_CONN_MAX_AGE segundos entre peticiones (0: una conexión por petición) y
+# la verifica antes de reutilizarla (DB_CONN_HEALTH_CHECKS). Con DB_POOL las
+# conexiones salen de un pool de psycopg 3 (requiere psycopg[pool] en lugar
+# de psycopg2) de DB_POOL_MIN a DB_POOL_MAX conexiones por proceso, con
+# espera máxima DB_POOL_TIMEOUT segundos. El backend core.db mide las
+# conexiones (ver core/conexiones.py y "python manage.py medir_conexiones")
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "core.db",
         "NAME": config("DB_NAME"),
         "USER": config("DB_USER"),
         "PASSWORD": config("DB_PASSWORD"),
         "HOST": config("DB_HOST"),
         "PORT": config("DB_PORT"),
+        # El pool ya reutiliza las conexiones: Django no admite ambos
+        "CONN_MAX_AGE": (
+            0 if DB_POOL else config("DB_CONN_MAX_AGE", default=60, cast=int)
+        ),
+        "CONN_HEALTH_CHECKS": config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
     }
 }
+if DB_POOL:
+    # Con CONN_HEALTH_CHECKS el pool verifica cada conexión al entregarla
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": config("DB_POOL_MIN", default=2, cast=int),
+            "max_size": config("DB_POOL_MAX", default=10, cast=int),
+            "timeout": config("DB_POOL_TIMEOUT", default=10, cast=float),
+        }
+    }
 
 JAZZMIN_SETTINGS = {
     "site_title": "SADI Admin",
@@ -134,6 +157,70 @@ JAZZMIN_UI_TWEAKS = {
     "brand_colour": "navbar-primary",
 }
 
+# Caché compartida por todos los procesos: las versiones de los datos
+# (core/cache.py) invalidan el dashboard, el estado del sistema, los
+# trabajos de reportes y las respuestas del asistente en todos los workers,
+# así que una caché por proceso (LocMemCache) deja datos viejos en los demás
+# (ver el check core.W001). Por defecto es DatabaseCache (la tabla se crea
+# con la migración core 0003 o "python manage.py createcachetable"), que no
+# requiere otro servicio pero cada lectura es una consulta a esa tabla: el
+# dashboard en caché sigue haciendo consultas (versión de los datos y valor
+# guardado, además de las de sesión y usuario). Para que un acierto no toque
+# la base de datos se recomienda Redis:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y
+# CACHE_LOCATION=redis://...
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.db.DatabaseCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="sadi_cache"),
+    }
+}
+# Consultas SQL por petición (core/middleware.py): una línea JSON por
+# petición en logs/sql.log y métricas por endpoint y hora en el admin
+# (Core > Métricas SQL). Una misma forma de SQL ejecutada más de
+# SQL_N_MAS_1_UMBRAL veces se marca como posible N+1. Cada proceso guarda sus
+# métricas en la base de datos cada SQL_METRICAS_INTERVALO segundos
+SQL_INSTRUMENTACION = config("SQL_INSTRUMENTACION", default=True, cast=bool)
+SQL_N_MAS_1_UMBRAL = config("SQL_N_MAS_1_UMBRAL", default=5, cast=int)
+SQL_METRICAS_INTERVALO = config("SQL_METRICAS_INTERVALO", default=60, cast=int)
+# Horas que abarca por defecto la página de métricas SQL del admin
+SQL_METRICAS_HORAS = config("SQL_METRICAS_HORAS", default=24, cast=int)
+# Cada proceso acumula los aciertos y fallos de sus cachés y los suma a los
+# contadores compartidos cada CACHE_ESTADISTICAS_INTERVALO segundos
+CACHE_ESTADISTICAS_INTERVALO = config(
+    "CACHE_ESTADISTICAS_INTERVALO", default=60, cast=int
+)
+# Segundos que se conserva el dashboard calculado (se invalida antes si
+# cambian los datos)
+DASHBOARD_CACHE_TIMEOUT = config("DASHBOARD_CACHE_TIMEOUT", default=900, cast=int)
+# Segundos que cada proceso reutiliza el estado del sistema de los context
+# processors sin ninguna consulta. Después lee la versión del sistema en la
+# caché compartida y lo recalcula solo si cambió: los cambios hechos en otro
+# proceso se ven a más tardar en este tiempo
+ESTADO_SISTEMA_TIMEOUT = config("ESTADO_SISTEMA_TIMEOUT", default=60, cast=int)
+
+# Reportes pesados (Excel de metas/avances y PDF del programa de trabajo): por
+# defecto se generan dentro de la petición. Con REPORTES_EN_SEGUNDO_PLANO=True
+# los genera el worker "python manage.py procesar_reportes", que debe estar
+# corriendo: si un trabajo sigue pendiente después de REPORTES_ESPERA_WORKER
+# segundos, la página del trabajo avisa que no hay worker
+REPORTES_EN_SEGUNDO_PLANO = config(
+    "REPORTES_EN_SEGUNDO_PLANO", default=False, cast=bool
+)
+REPORTES_ESPERA_WORKER = config("REPORTES_ESPERA_WORKER", default=60, cast=int)
+REPORTES_PROCESOS = config("REPORTES_PROCESOS", default=2, cast=int)
+REPORTES_CONSERVAR_DIAS = config("REPORTES_CONSERVAR_DIAS", default=7, cast=int)
+# Segundos que un trabajo puede seguir en proceso: pasado este tiempo se da por
+# interrumpido (petición o worker detenidos a media generación), no se reutiliza
+# y el worker lo vuelve a la cola al arrancar
+REPORTES_TIMEOUT = config("REPORTES_TIMEOUT", default=900, cast=int)
+# Motor del PDF del programa de trabajo: "xhtml2pdf" (plantilla HTML),
+# "reportlab" (dibujo directo, más rápido) o "auto" (reportlab solo para el
+# documento de todos los departamentos)
+PROGRAMA_TRABAJO_PDF_MOTOR = config("PROGRAMA_TRABAJO_PDF_MOTOR", default="xhtml2pdf")
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -155,6 +242,12 @@ LOGGING = {
             "class": "logging.StreamHandler",
             "formatter": "verbose",
         },
+        "sql": {
+            "level": "INFO",
+            "class": "logging.FileHandler",
+            "filename": str(LOG_DIR / "sql.log"),
+            "formatter": "verbose",
+        },
     },
     "loggers": {
         "django": {
@@ -167,34 +260,70 @@ LOGGING = {
             "level": "DEBUG",
             "propagate": True,
         },
+        "core.sql": {
+            "handlers": ["sql"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
+# torch y transformers no se importan aquí: solo los carga el servicio MCP
+# (mcp.mcp_service) cuando se usa por primera vez, así los workers web, los
+# comandos y las pruebas arrancan sin el stack del modelo
 MCP_CONFIG = {
     "MODEL_NAME": "TinyLlama/TinyLlama-1.1B-Chat-v1.0",  # Nombre completo del modelo
     "MODEL_PATH": "/home/sadi/.cache/huggingface/hub/",
     "MAX_LENGTH": 512,
     "TEMPERATURE": 0.7,
-    "USE_GPU": torch.cuda.is_available(),
+    # Servidor de inferencia ("python manage.py servidor_mcp"): un solo proceso
+    # con el modelo cargado atiende a todos los workers web. Con SERVER_URL
+    # vacío el modelo se carga dentro de cada worker (desarrollo)
+    "SERVER_URL": config("MCP_SERVER_URL", default="http://127.0.0.1:8765"),
+    # Peticiones que pueden esperar turno; con la cola llena se responde 503
+    "QUEUE_SIZE": config("MCP_QUEUE_SIZE", default=8, cast=int),
+    # Segundos máximos por petición (espera en cola + generación)
+    "TIMEOUT": config("MCP_TIMEOUT", default=60, cast=int),
+    # Micro-lotes: las peticiones que llegan dentro de BATCH_WAIT_MS se
+    # generan juntas, hasta BATCH_SIZE por lote
+    "BATCH_SIZE": config("MCP_BATCH_SIZE", default=4, cast=int),
+    "BATCH_WAIT_MS": config("MCP_BATCH_WAIT_MS", default=50, cast=int),
+    # Precisión de la inferencia en CPU: "float32", "int8" (cuantización
+    # dinámica de las capas Linear) o "bfloat16" (si el CPU lo soporta; si no,
+    # float32). Comparar con "python manage.py medir_precision"
+    "PRECISION": config("MCP_PRECISION", default="float32"),
+    # Pesos en model_cache/compartido con el dtype de la precisión: se cargan
+    # por mmap y los procesos comparten sus páginas en lugar de tener cada uno
+    # una copia (ver "python manage.py reporte_memoria")
+    "SHARED_WEIGHTS": config("MCP_SHARED_WEIGHTS", default=True, cast=bool),
+    # Caché de respuestas por proceso (mcp/cache.py): máximo de respuestas
+    # (0 la desactiva) y segundos que se conservan. Se invalidan antes si
+    # cambian los modelos de los que dependen
+    "RESPONSE_CACHE_SIZE": config("MCP_RESPONSE_CACHE_SIZE", default=256, cast=int),
+    "RESPONSE_CACHE_TTL": config("MCP_RESPONSE_CACHE_TTL", default=600, cast=int),
+    # Índice BM25 de metas, proyectos, actividades, riesgos y departamentos
+    # (mcp/indice.py): registros más relevantes que se pasan como contexto y
+    # archivo en el que se guarda entre reinicios
+    "CONTEXT_TOP_K": config("MCP_CONTEXT_TOP_K", default=5, cast=int),
+    # Tokens máximos del contexto en el prompt (mcp/contexto.py) y de la
+    # respuesta generada: con ambos acotados el tiempo de generación no
+    # depende del tamaño de las tablas
+    "CONTEXT_TOKENS": config("MCP_CONTEXT_TOKENS", default=768, cast=int),
+    "MAX_NEW_TOKENS": config("MCP_MAX_NEW_TOKENS", default=300, cast=int),
+    # Caché KV del preámbulo fijo de cada plantilla del prompt, calculado al
+    # cargar el modelo (ver "python manage.py medir_prefijo")
+    "PREFIX_CACHE": config("MCP_PREFIX_CACHE", default=True, cast=bool),
+    # Sin servidor de inferencia (SERVER_URL vacío): cada worker web carga y
+    # calienta el modelo en un hilo al arrancar (sadi/wsgi.py) en lugar de
+    # hacerlo dentro de la primera solicitud. /mcp/api/listo/ responde 200
+    # cuando el modelo está listo
+    "PRELOAD": config("MCP_PRELOAD", default=True, cast=bool),
+    "INDEX_PATH": config(
+        "MCP_INDEX_PATH", default=str(BASE_DIR / "model_cache" / "indice_mcp.json")
+    ),
 }
 
 
-def get_llm_model():
-    """Función para cargar el modelo de lenguaje (mantener al final del archivo)"""
-    try:
-        model_name = MCP_CONFIG["MODEL_NAME"]
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16 if MCP_CONFIG["USE_GPU"] else torch.float32,
-            device_map="auto" if MCP_CONFIG["USE_GPU"] else None,
-        )
-        return model, tokenizer
-    except Exception as e:
-        print(f"Error cargando el modelo: {e}")
-        return None, None
-
-
 AUTH_USER_MODEL = "usuarios.Usuario"
 
 AUTHENTICATION_BACKENDS = (
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sadi.settings')
 
 application = get_wsgi_application()
+
+# Sin servidor de inferencia, el modelo MCP se carga y calienta en segundo
+# plano al arrancar el worker (con gunicorn, sin --preload: el hilo no
+# sobrevive al fork)
+from django.conf import settings
+
+if settings.MCP_CONFIG['PRELOAD'] and not settings.MCP_CONFIG['SERVER_URL']:
+    from mcp.mcp_service import mcp_service
+
+    mcp_service.iniciar_precarga()